@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import math
+from typing import TYPE_CHECKING
+
+import numpy as np
+from apify import Actor
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from numpy.typing import NDArray
+
+BLOOM_FILTER_KEY = "item-ids-bloom-filter"
+BLOOM_FILTER_CONTENT_TYPE = "application/octet-stream"
+BLOOM_FILTER_VERSION = 1
+
+INITIAL_CAPACITY = 100_000
+FALSE_POSITIVE_RATE = 0.01
+
+
+def get_hashes(item_ids: Iterable[str]) -> tuple[NDArray[np.uint64], NDArray[np.uint64]]:
+    """Return two 64-bit hashes of every item_id (used for double hashing)."""
+    digests = b"".join(hashlib.blake2b(item_id.encode(), digest_size=16).digest() for item_id in item_ids)
+    h = np.frombuffer(digests, dtype="<u8").reshape(-1, 2)
+    return h[:, 0], h[:, 1] | np.uint64(1)
+
+
+class BloomFilter:
+    """Bloom filter with a fixed capacity and false positive rate, bits are stored in a NumPy array."""
+
+    def __init__(self, capacity: int, fp_rate: float, bits: NDArray[np.uint8] | None = None, count: int = 0) -> None:
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.n_bits = 8 * math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2 / 8)
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.bits = bits if bits is not None else np.zeros(self.n_bits // 8, dtype=np.uint8)
+        self.count = count
+
+    def get_positions(self, h1: NDArray[np.uint64], h2: NDArray[np.uint64]) -> NDArray[np.uint64]:
+        i = np.arange(self.n_hashes, dtype=np.uint64)
+        return (h1[:, None] + i * h2[:, None]) % np.uint64(self.n_bits)
+
+    def add(self, h1: NDArray[np.uint64], h2: NDArray[np.uint64]) -> None:
+        positions = self.get_positions(h1, h2).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3), np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+        self.count += len(h1)
+
+    def contains(self, h1: NDArray[np.uint64], h2: NDArray[np.uint64]) -> NDArray[np.bool_]:
+        positions = self.get_positions(h1, h2)
+        present: NDArray[np.bool_] = ((self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1).all(axis=1)
+        return present
+
+
+class ItemIdsBloomFilter:
+    """Scalable Bloom filter of all item_ids stored in the database.
+
+    When a filter is full, a new filter with double capacity and half the false positive rate is added, so the overall
+    false positive rate stays below 2 * FALSE_POSITIVE_RATE. A false positive only costs a database lookup,
+    item_ids that are not in the filter were never added to the database (by this integration).
+    """
+
+    def __init__(self, filters: list[BloomFilter] | None = None) -> None:
+        self.filters = filters or [BloomFilter(INITIAL_CAPACITY, FALSE_POSITIVE_RATE)]
+
+    def __len__(self) -> int:
+        return sum(f.count for f in self.filters)
+
+    def contains_many(self, item_ids: list[str]) -> NDArray[np.bool_]:
+        """Return a mask of item_ids that might be in the database."""
+        if not item_ids:
+            return np.zeros(0, dtype=bool)
+        h1, h2 = get_hashes(item_ids)
+        mask = np.zeros(len(item_ids), dtype=bool)
+        for f in self.filters:
+            mask |= f.contains(h1, h2)
+        return mask
+
+    def add_many(self, item_ids: list[str]) -> None:
+        """Add item_ids, item_ids that are (might be) already present are skipped so they do not use up the capacity."""
+        item_ids = list(dict.fromkeys(item_ids))
+        new = [item_id for item_id, present in zip(item_ids, self.contains_many(item_ids)) if not present]
+        while new:
+            current = self.filters[-1]
+            if current.count >= current.capacity:
+                current = BloomFilter(current.capacity * 2, current.fp_rate / 2)
+                self.filters.append(current)
+            batch, new = new[: current.capacity - current.count], new[current.capacity - current.count :]
+            current.add(*get_hashes(batch))
+
+    def to_bytes(self) -> bytes:
+        meta = np.array([[f.capacity, f.count] for f in self.filters], dtype=np.int64)
+        fp_rates = np.array([f.fp_rate for f in self.filters])
+        buffer = io.BytesIO()
+        bits = {f"bits_{i}": f.bits for i, f in enumerate(self.filters)}
+        np.savez_compressed(buffer, version=np.array(BLOOM_FILTER_VERSION), meta=meta, fp_rates=fp_rates, **bits)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> ItemIdsBloomFilter:
+        with np.load(io.BytesIO(data)) as npz:
+            if int(npz["version"]) != BLOOM_FILTER_VERSION:
+                raise ValueError(f"Unsupported Bloom filter version {int(npz['version'])}, expected {BLOOM_FILTER_VERSION}")
+            return cls(
+                [
+                    BloomFilter(int(capacity), float(fp_rate), bits=npz[f"bits_{i}"], count=int(count))
+                    for i, ((capacity, count), fp_rate) in enumerate(zip(npz["meta"], npz["fp_rates"]))
+                ]
+            )
+
+    @classmethod
+    async def load(cls, kv_store_name: str) -> ItemIdsBloomFilter | None:
+        """Load the filter from the named key-value store. Return None if it does not exist yet."""
+        kv_store = await Actor.open_key_value_store(name=kv_store_name)
+        data = await kv_store.get_value(BLOOM_FILTER_KEY)
+        return cls.from_bytes(data) if data else None
+
+    async def save(self, kv_store_name: str) -> None:
+        kv_store = await Actor.open_key_value_store(name=kv_store_name)
+        await kv_store.set_value(BLOOM_FILTER_KEY, self.to_bytes(), content_type=BLOOM_FILTER_CONTENT_TYPE)
+        Actor.log.info("Saved Bloom filter with %s item_ids (%s filters) to the key-value store: %s", len(self), len(self.filters), kv_store_name)
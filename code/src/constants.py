@@ -4,6 +4,16 @@ VCR_HEADERS_EXCLUDE = ["Authorization", "Api-Key"]
 
 DAY_IN_SECONDS = 24 * 3600
 
+# Delta updates: default number of concurrent item_ids lookups and timeout of a single lookup
+DELTA_UPDATES_CONCURRENCY = 8
+DELTA_UPDATES_REQUEST_TIMEOUT_SECS = 300
+
+# Scan metadata of all database objects instead of lookups by item_id when crawled items cover at least this fraction of the database
+DELTA_UPDATES_FULL_SCAN_MIN_COVERAGE = 0.5
+
+# Pinecone: default number of namespaces updated in parallel when documents are routed to namespaces by a metadata field
+PINECONE_NAMESPACE_CONCURRENCY = 4
+
 
 class SupportedVectorStores(str, enum.Enum):
     chroma = "chroma"
@@ -17,5 +27,6 @@ class SupportedVectorStores(str, enum.Enum):
 
 class SupportedEmbeddings(str, enum.Enum):
     openai = "OpenAI"
+    azure_openai = "AzureOpenAI"
     cohere = "Cohere"
     fake = "Fake"
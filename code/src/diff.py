@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import hashlib
+from typing import TYPE_CHECKING, Callable
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from langchain_core.documents import Document
+    from numpy.typing import NDArray
+
+# item_ids and checksums are compared as fixed-width binary digests
+DIGEST_SIZE = 16
+DIGEST_DTYPE = f"S{DIGEST_SIZE}"
+
+
+def digest(value: str) -> bytes:
+    return hashlib.blake2b(value.encode(), digest_size=DIGEST_SIZE).digest()
+
+
+def get_document_id(doc: Document) -> str:
+    """Return the database id of a document (OpenSearch returns its own id, other databases chunk_id)."""
+    return str(doc.metadata.get("id") or doc.metadata.get("chunk_id", ""))
+
+
+class ChunkColumns:
+    """Columns of chunks (item_id digest, checksum digest and id) used to compute the delta between crawled data and the database.
+
+    Only the digests (in contiguous buffers) and ids are kept, the documents (with their metadata) can be released.
+    """
+
+    def __init__(self) -> None:
+        self._item_ids = bytearray()
+        self._checksums = bytearray()
+        self.ids: list[str] = []
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Document], get_id: Callable[[Document], str] = get_document_id) -> ChunkColumns:
+        columns = cls()
+        columns.extend(documents, get_id)
+        return columns
+
+    def extend(self, documents: Iterable[Document], get_id: Callable[[Document], str] = get_document_id) -> None:
+        for doc in documents:
+            self._item_ids += digest(doc.metadata["item_id"])
+            self._checksums += digest(doc.metadata["checksum"])
+            self.ids.append(get_id(doc))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def item_ids(self) -> NDArray[np.bytes_]:
+        return np.frombuffer(bytes(self._item_ids), dtype=DIGEST_DTYPE)
+
+    @property
+    def keys(self) -> NDArray[np.bytes_]:
+        """(item_id, checksum) digest pairs as a single fixed-width key."""
+        pairs = np.empty((len(self), 2), dtype=DIGEST_DTYPE)
+        pairs[:, 0] = self.item_ids
+        pairs[:, 1] = np.frombuffer(bytes(self._checksums), dtype=DIGEST_DTYPE)
+        return pairs.view(f"S{2 * DIGEST_SIZE}").ravel()
+
+
+def compute_diff(crawled: ChunkColumns, db: ChunkColumns) -> tuple[NDArray[np.bool_], NDArray[np.bool_], NDArray[np.bool_]]:
+    """Compute masks of crawled chunks to add and database chunks to touch (update last_seen_at) and delete.
+
+    A crawled chunk is unchanged when the database contains a chunk with the same item_id and checksum,
+    then all database chunks of the item are touched. Otherwise, the crawled chunk is added and all database chunks of the item are deleted.
+    Joins are computed by sorting (np.isin) the fixed-width digests.
+    """
+    crawled_item_ids = crawled.item_ids
+    unchanged = np.isin(crawled.keys, db.keys)
+    db_item_ids = db.item_ids
+    touch = np.isin(db_item_ids, crawled_item_ids[unchanged])
+    delete = np.isin(db_item_ids, crawled_item_ids[~unchanged])
+    return ~unchanged, touch, delete
@@ -1,31 +1,320 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+import asyncio
+import base64
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, TypeVar
 
+import numpy as np
 from apify import Actor
+from langchain_cohere import CohereEmbeddings
+from langchain_core.embeddings import Embeddings
+from langchain_openai.embeddings import AzureOpenAIEmbeddings, OpenAIEmbeddings
 
 from .constants import SupportedEmbeddings
 
 if TYPE_CHECKING:
-    from langchain_core.embeddings import Embeddings
+    from numpy.typing import NDArray
+
+T = TypeVar("T")
+
+# Numpy dtype of the vectors for each Cohere embedding type. Binary types are bit-packed (one byte holds 8 dimensions).
+EMBEDDING_TYPE_DTYPES = {
+    "float": np.float32,
+    "int8": np.int8,
+    "uint8": np.uint8,
+    "binary": np.int8,
+    "ubinary": np.uint8,
+}
+
+
+def decode_base64_embedding(data: str) -> NDArray[np.float32]:
+    """Decode a base64 encoded embedding into a float32 array.
+
+    The array is a read-only view over the decoded bytes (no copy and no Python floats are created).
+    """
+    return np.frombuffer(base64.b64decode(data), dtype="<f4")
+
+
+class OpenAIBase64Embeddings(OpenAIEmbeddings):
+    """OpenAI embeddings requested as base64 and decoded into float32 NumPy arrays.
+
+    Parsing JSON float lists for large batches (1000 texts x 3072 dimensions) is expensive in both CPU and memory.
+    The base64 payload is decoded with `np.frombuffer` and documents' vectors are kept as float32 arrays until the
+    vector store writes them, the database clients serialise the arrays as float vectors (see tests/test_vector_serialization.py).
+    Query embeddings are returned as plain lists, as they are used in query filters and comparisons.
+    """
+
+    def _create(self, inputs: list[Any]) -> list[NDArray[np.float32]]:
+        response = self.client.create(input=inputs, **self._base64_invocation_params)
+        return [decode_base64_embedding(d.embedding) for d in response.data]
+
+    async def _acreate(self, inputs: list[Any]) -> list[NDArray[np.float32]]:
+        response = await self.async_client.create(input=inputs, **self._base64_invocation_params)
+        return [decode_base64_embedding(d.embedding) for d in response.data]
+
+    @property
+    def _base64_invocation_params(self) -> dict[str, Any]:
+        return {**self._invocation_params, "encoding_format": "base64"}
+
+    def _merge_chunked_embeddings(
+        self, num_texts: int, tokens: list, batched: list[NDArray[np.float32]], indices: list[int]
+    ) -> list[NDArray[np.float32] | None]:
+        """Merge embeddings of texts that were split into several chunks (longer than the embedding context).
+
+        Mirrors OpenAIEmbeddings: a token-weighted average, normalized to unit length.
+        """
+        results: list[list[NDArray[np.float32]]] = [[] for _ in range(num_texts)]
+        weights: list[list[int]] = [[] for _ in range(num_texts)]
+        for i, idx in enumerate(indices):
+            if self.skip_empty and len(batched[i]) == 1:
+                continue
+            results[idx].append(batched[i])
+            weights[idx].append(len(tokens[i]))
+
+        embeddings: list[NDArray[np.float32] | None] = []
+        for rows, w in zip(results, weights):
+            if not rows:
+                embeddings.append(None)
+            elif len(rows) == 1:
+                embeddings.append(rows[0])
+            else:
+                average = np.average(np.stack(rows), axis=0, weights=w).astype(np.float32)
+                embeddings.append(average / np.linalg.norm(average))
+        return embeddings
+
+    def embed_documents(self, texts: list[str], chunk_size: int | None = None) -> list[NDArray[np.float32]]:  # type: ignore[override]
+        """Embed documents, return a list of float32 arrays."""
+        chunk_size_ = chunk_size or self.chunk_size
+        if not self.check_embedding_ctx_length:
+            embeddings: list[NDArray[np.float32]] = []
+            for i in range(0, len(texts), chunk_size_):
+                embeddings.extend(self._create(texts[i : i + chunk_size_]))
+            return embeddings
+
+        _iter, tokens, indices = self._tokenize(texts, chunk_size_)
+        batched: list[NDArray[np.float32]] = []
+        for i in _iter:
+            batched.extend(self._create(tokens[i : i + chunk_size_]))
+
+        merged = self._merge_chunked_embeddings(len(texts), tokens, batched, indices)
+        empty: list[NDArray[np.float32]] = []
+        if any(e is None for e in merged):
+            empty = self._create([""])
+        return [e if e is not None else empty[0] for e in merged]
+
+    async def aembed_documents(self, texts: list[str], chunk_size: int | None = None) -> list[NDArray[np.float32]]:  # type: ignore[override]
+        """Embed documents asynchronously, return a list of float32 arrays."""
+        chunk_size_ = chunk_size or self.chunk_size
+        if not self.check_embedding_ctx_length:
+            embeddings: list[NDArray[np.float32]] = []
+            for i in range(0, len(texts), chunk_size_):
+                embeddings.extend(await self._acreate(texts[i : i + chunk_size_]))
+            return embeddings
+
+        _iter, tokens, indices = self._tokenize(texts, chunk_size_)
+        batched: list[NDArray[np.float32]] = []
+        for i in _iter:
+            batched.extend(await self._acreate(tokens[i : i + chunk_size_]))
+
+        merged = self._merge_chunked_embeddings(len(texts), tokens, batched, indices)
+        empty: list[NDArray[np.float32]] = []
+        if any(e is None for e in merged):
+            empty = await self._acreate([""])
+        return [e if e is not None else empty[0] for e in merged]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0].tolist()  # type: ignore[no-any-return]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0].tolist()  # type: ignore[no-any-return]
+
+
+class AzureOpenAIBase64Embeddings(OpenAIBase64Embeddings, AzureOpenAIEmbeddings):
+    """Azure OpenAI embeddings requested as base64 and decoded into float32 NumPy arrays (see OpenAIBase64Embeddings)."""
+
+
+class CohereCompressedEmbeddings(CohereEmbeddings):
+    """Cohere embeddings returned in a compressed type (int8, uint8, binary or ubinary).
+
+    Compressed embeddings are 4 (int8/uint8) to 32 (binary/ubinary) times smaller than float embeddings.
+    Vectors are kept as NumPy arrays with the native dtype, so vector stores that support int8 or binary vectors
+    store them as such. Binary types are bit-packed, a vector has `dimensions / 8` elements.
+    """
+
+    @property
+    def embedding_type(self) -> str:
+        return self.embedding_types[0]
+
+    def _to_arrays(self, response: Any) -> list[NDArray]:
+        if not (e := getattr(response.embeddings, self.embedding_type, None)):
+            return []
+        return list(np.asarray(e, dtype=EMBEDDING_TYPE_DTYPES[self.embedding_type]))
+
+    def embed(self, texts: list[str], *, input_type: Any = None) -> list[NDArray]:  # type: ignore[override]
+        response = self.embed_with_retry(
+            model=self.model, texts=texts, input_type=input_type, truncate=self.truncate, embedding_types=[self.embedding_type]
+        )
+        return self._to_arrays(response)
+
+    async def aembed(self, texts: list[str], *, input_type: Any = None) -> list[NDArray]:  # type: ignore[override]
+        response = await self.aembed_with_retry(
+            model=self.model, texts=texts, input_type=input_type, truncate=self.truncate, embedding_types=[self.embedding_type]
+        )
+        return self._to_arrays(response)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed([text], input_type="search_query")[0].tolist()  # type: ignore[no-any-return]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed([text], input_type="search_query"))[0].tolist()  # type: ignore[no-any-return]
+
+
+POOL_BATCH_SIZE = 500  # Number of texts sent to a pool member in a single request
+POOL_COOLDOWN_SECS = 60  # For how long a failed pool member is used only as a last resort
+
+
+class EmbeddingsPool(Embeddings):
+    """Spread embedding requests over several API keys or deployments of the same model and fail over on errors.
+
+    Texts are split into batches, each batch is sent to a member picked at random proportionally to its weight
+    (e.g. its rate limit). Batches run concurrently, one worker per member. A member that fails is put at the end
+    of the queue for `cooldown_secs` and the batch is retried on the other members. The call fails when all members fail.
+
+    All members must produce the same vectors, hence they must use the same model, dimensions and embedding type.
+    """
+
+    def __init__(self, members: list[tuple[Embeddings, float]], batch_size: int = POOL_BATCH_SIZE, cooldown_secs: float = POOL_COOLDOWN_SECS) -> None:
+        if not (members := [(m, w) for m, w in members if w > 0]):
+            raise ValueError("Embeddings pool requires at least one member with a positive weight")
+
+        signatures = {self.get_model_signature(m) for m, _ in members}
+        if len(signatures) > 1:
+            raise ValueError(f"All embeddings in the pool must use the same model, dimensions and embedding type, got: {signatures}")
+
+        self.members = [m for m, _ in members]
+        self.weights = [float(w) for _, w in members]
+        self.batch_size = batch_size
+        self.cooldown_secs = cooldown_secs
+        self._unavailable_until = [0.0] * len(self.members)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_model_signature(embeddings: Embeddings) -> tuple:
+        """Return the attributes that determine the vectors produced by the embeddings."""
+        return (
+            getattr(embeddings, "model", None),
+            getattr(embeddings, "dimensions", None),
+            getattr(embeddings, "embedding_type", "float"),
+        )
+
+    @property
+    def embedding_type(self) -> str:
+        return getattr(self.members[0], "embedding_type", "float")
+
+    def get_members_order(self) -> list[int]:
+        """Return the order in which members are tried for a single request.
+
+        Available members are ordered by a weighted random shuffle (Efraimidis-Spirakis), members in cooldown go last.
+        """
+        now = time.monotonic()
+        with self._lock:
+            cooling = sorted((i for i, t in enumerate(self._unavailable_until) if t > now), key=lambda i: self._unavailable_until[i])
+        available = [i for i in range(len(self.members)) if i not in cooling]
+        available.sort(key=lambda i: random.random() ** (1 / self.weights[i]), reverse=True)
+        return available + cooling
+
+    def _mark_failed(self, i: int, error: Exception) -> None:
+        Actor.log.warning("Embeddings pool member %s failed, trying another member. Error: %s", i, error)
+        with self._lock:
+            self._unavailable_until[i] = time.monotonic() + self.cooldown_secs
+
+    def _with_failover(self, call: Callable[[Embeddings], T]) -> T:
+        error: Exception | None = None
+        for i in self.get_members_order():
+            try:
+                return call(self.members[i])
+            except Exception as e:  # noqa: PERF203
+                error = e
+                self._mark_failed(i, e)
+        raise RuntimeError(f"All embeddings pool members failed. Last error: {error}") from error
+
+    async def _awith_failover(self, call: Callable[[Embeddings], Awaitable[T]]) -> T:
+        error: Exception | None = None
+        for i in self.get_members_order():
+            try:
+                return await call(self.members[i])
+            except Exception as e:  # noqa: PERF203
+                error = e
+                self._mark_failed(i, e)
+        raise RuntimeError(f"All embeddings pool members failed. Last error: {error}") from error
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        return self._with_failover(lambda m: m.embed_documents(texts))
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        batches = [texts[i : i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) <= 1:
+            return self._embed_batch(texts)
+
+        with ThreadPoolExecutor(max_workers=len(self.members)) as executor:
+            return [e for res in executor.map(self._embed_batch, batches) for e in res]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        batches = [texts[i : i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        semaphore = asyncio.Semaphore(len(self.members))
+
+        async def _embed(batch: list[str]) -> list[list[float]]:
+            async with semaphore:
+                return await self._awith_failover(lambda m: m.aembed_documents(batch))
+
+        results = await asyncio.gather(*[_embed(b) for b in batches])
+        return [e for res in results for e in res]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._with_failover(lambda m: m.embed_query(text))
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self._awith_failover(lambda m: m.aembed_query(text))
+
+
+async def get_embeddings_pool(embeddings: Embeddings, pool: list[dict], config: dict | None = None) -> EmbeddingsPool:
+    """Create an embeddings pool from the main embeddings (weight 1) and additional pool members.
+
+    Each pool member is a dict with `provider`, `apiKey`, optional `config` (defaults to the main config) and optional `weight`.
+    """
+    members: list[tuple[Embeddings, float]] = [(embeddings, 1.0)]
+    for member in pool:
+        member_config = {k: v for k, v in (member.get("config") or config or {}).items() if k not in ("openai_api_key", "cohere_api_key")}
+        members.append((await get_embedding_provider(member["provider"], member.get("apiKey"), member_config), member.get("weight", 1.0)))
+    return EmbeddingsPool(members)
 
 
 async def get_embedding_provider(embeddings_name: str, api_key: str | None = None, config: dict | None = None) -> Embeddings:
     """Return the embeddings based on the user preference."""
 
     if embeddings_name == SupportedEmbeddings.openai:
-        from langchain_openai.embeddings import OpenAIEmbeddings
+        config = config or {}
+        config["openai_api_key"] = api_key
+        return OpenAIBase64Embeddings(**config)
 
+    if embeddings_name == SupportedEmbeddings.azure_openai:
         config = config or {}
         config["openai_api_key"] = api_key
-        return config and OpenAIEmbeddings(**config) or OpenAIEmbeddings()
+        return AzureOpenAIBase64Embeddings(**config)
 
     if embeddings_name == SupportedEmbeddings.cohere:
-        from langchain_cohere import CohereEmbeddings
-
         config = config or {}
         config["cohere_api_key"] = api_key
-        return CohereEmbeddings(**config)
+        embedding_types = config.get("embedding_types") or ["float"]
+        if embedding_types == ["float"]:
+            return CohereEmbeddings(**config)
+        if len(embedding_types) != 1 or embedding_types[0] not in EMBEDDING_TYPE_DTYPES:
+            raise ValueError(f"Cohere embedding_types must contain exactly one of {list(EMBEDDING_TYPE_DTYPES)}, got: {embedding_types}")
+        return CohereCompressedEmbeddings(**config)
 
     if embeddings_name == SupportedEmbeddings.fake:
         from langchain_core.embeddings import FakeEmbeddings
@@ -0,0 +1,106 @@
+# type: ignore
+"""
+Benchmark of the delta comparison between crawled data and the database (no database is needed).
+
+Compares the columnar diff engine (src/diff.py) with the previous per-document loop over Documents grouped by item_id.
+The database contains N chunks (10 chunks per item), 80% of the crawled items are unchanged, 10% changed and 10% are new.
+Each engine runs in a separate process to measure its peak memory (max RSS).
+
+Run as a module:
+    python -m src.examples.2026-10-19-delta-diff-benchmark --chunks 1000000 10000000
+    python -m src.examples.2026-10-19-delta-diff-benchmark --chunks 1000000 --legacy
+
+Results (Python 3.11, x86_64, 5 GB RAM; the previous implementation is not run at 10M chunks as it does not fit in memory):
+
+    engine      chunks     build [s]  diff [s]  max RSS [MB]
+    columnar    1000000        5.4      1.0          388
+    legacy      1000000        8.3      3.8         1299
+    columnar   10000000       57.5     13.0         3656
+
+Build time is dominated by generating the documents (and hashing them for the columnar engine).
+"""
+
+import argparse
+import multiprocessing
+import resource
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+import numpy as np
+
+from ..diff import ChunkColumns, compute_diff
+
+CHUNKS_PER_ITEM = 10
+
+
+def generate_chunks(n_chunks: int, crawled: bool):
+    """Generate lightweight documents. Crawled data: items 0-79% unchanged, 80-89% changed, 90-99% new."""
+    n_items = n_chunks // CHUNKS_PER_ITEM
+    for i in range(n_items):
+        item = i + n_items // 10 if crawled else i
+        checksum = "changed" if crawled and n_items * 0.8 <= item < n_items * 0.9 else "c"
+        for j in range(CHUNKS_PER_ITEM):
+            chunk_id = f"{'new' if crawled else 'db'}-{item}-{j}"
+            yield SimpleNamespace(metadata={"item_id": f"item-{item}", "chunk_id": chunk_id, "checksum": f"{checksum}-{item}"})
+
+
+def run_columnar(n_chunks: int) -> tuple[float, float, tuple[int, int, int]]:
+    start = time.perf_counter()
+    db = ChunkColumns.from_documents(generate_chunks(n_chunks, crawled=False))
+    crawled = ChunkColumns.from_documents(generate_chunks(n_chunks, crawled=True))
+    built = time.perf_counter()
+    add, touch, delete = compute_diff(crawled, db)
+    ids_touch = [db.ids[i] for i in np.flatnonzero(touch)]
+    ids_delete = [db.ids[i] for i in np.flatnonzero(delete)]
+    end = time.perf_counter()
+    return built - start, end - built, (int(add.sum()), len(ids_touch), len(ids_delete))
+
+
+def run_legacy(n_chunks: int) -> tuple[float, float, tuple[int, int, int]]:
+    start = time.perf_counter()
+    crawled_db = defaultdict(list)
+    for doc in generate_chunks(n_chunks, crawled=False):
+        crawled_db[doc.metadata["item_id"]].append(doc)
+    data = list(generate_chunks(n_chunks, crawled=True))
+    built = time.perf_counter()
+
+    data_add, ids_delete, ids_update_last_seen = [], set(), set()
+    for d in data:
+        if res := crawled_db.get(d.metadata["item_id"]):
+            if d.metadata["checksum"] in {r.metadata["checksum"] for r in res}:
+                ids_update_last_seen.update({r.metadata.get("id") or r.metadata.get("chunk_id", ""): r for r in res})
+            else:
+                ids_delete.update({r.metadata.get("id") or r.metadata.get("chunk_id", ""): r for r in res})
+                data_add.append(d)
+        else:
+            data_add.append(d)
+    end = time.perf_counter()
+    return built - start, end - built, (len(data_add), len(ids_update_last_seen), len(ids_delete))
+
+
+def _run(engine: str, n_chunks: int, queue: multiprocessing.Queue) -> None:
+    build, diff, counts = (run_columnar if engine == "columnar" else run_legacy)(n_chunks)
+    queue.put((build, diff, counts, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--legacy", action="store_true", help="Run also the previous per-document implementation")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("fork")
+    print(f"{'engine':<10}{'chunks':>10}{'build [s]':>12}{'diff [s]':>10}{'max RSS [MB]':>14}  (add, touch, delete)")
+    for n_chunks in args.chunks:
+        for engine in ["columnar", "legacy"] if args.legacy else ["columnar"]:
+            queue = ctx.Queue()
+            process = ctx.Process(target=_run, args=(engine, n_chunks, queue))
+            process.start()
+            build, diff, counts, max_rss = queue.get()
+            process.join()
+            print(f"{engine:<10}{n_chunks:>10}{build:>12.1f}{diff:>10.1f}{max_rss:>14}  {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# type: ignore
+"""
+Benchmark of the last_seen_at update (touch) throughput across databases.
+
+Inserts N objects (with deterministic fake embeddings, no embedding API is called), then updates last_seen_at of all objects
+in batches of the delta updates pipeline (pipeline.TOUCH_BATCH_SIZE) for every touch concurrency and reports objects per second.
+The objects are deleted at the end. Connection settings are read from the same environment variables as the integration tests (.env).
+
+Run as a module (the collection/index is created if the database supports it, Pinecone index must exist):
+    python -m src.examples.2026-10-19-touch-benchmark --databases qdrant pgvector weaviate --objects 10000 --concurrency 1 8 32
+
+The throughput depends mostly on the deployment (region, tier, latency), hence no reference results are included.
+Pinecone and Weaviate update objects one by one and profit most from touch_concurrency, Milvus (2.6+) uses a partial upsert,
+Qdrant and pgvector update all ids of a batch by a single request.
+"""
+
+import argparse
+import os
+import time
+import uuid
+
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from ..models import (
+    ChromaIntegration,
+    MilvusIntegration,
+    OpensearchIntegration,
+    PgvectorIntegration,
+    PineconeIntegration,
+    QdrantIntegration,
+    WeaviateIntegration,
+)
+from ..pipeline import TOUCH_BATCH_SIZE
+
+INSERT_BATCH_SIZE = 500
+
+
+def create_database(name: str, collection: str, embeddings: DeterministicFakeEmbedding):
+    common = {"embeddingsProvider": "Fake", "datasetFields": ["text"]}
+    if name == "chroma":
+        from ..vector_stores.chroma import ChromaDatabase
+
+        return ChromaDatabase(
+            ChromaIntegration(
+                chromaCollectionName=collection,
+                chromaClientHost=os.getenv("CHROMA_CLIENT_HOST", "localhost"),
+                chromaClientPort=int(os.getenv("CHROMA_CLIENT_PORT", "8000")),
+                chromaApiToken=os.getenv("CHROMA_API_TOKEN"),
+                **common,
+            ),
+            embeddings,
+        )
+    if name == "milvus":
+        from ..vector_stores.milvus import MilvusDatabase
+
+        return MilvusDatabase(
+            MilvusIntegration(milvusUri=os.getenv("MILVUS_URI"), milvusToken=os.getenv("MILVUS_TOKEN"), milvusCollectionName=collection, **common),
+            embeddings,
+        )
+    if name == "opensearch":
+        from ..vector_stores.opensearch import OpenSearchDatabase
+
+        return OpenSearchDatabase(
+            OpensearchIntegration(openSearchUrl=os.getenv("OPENSEARCH_URL"), openSearchIndexName=collection, autoCreateIndex=True, **common),
+            embeddings,
+        )
+    if name == "pgvector":
+        from ..vector_stores.pgvector import PGVectorDatabase
+
+        return PGVectorDatabase(
+            PgvectorIntegration(postgresSqlConnectionStr=os.getenv("POSTGRESQL_CONNECTION_STR"), postgresCollectionName=collection, **common),
+            embeddings,
+        )
+    if name == "pinecone":
+        from ..vector_stores.pinecone import PineconeDatabase
+
+        return PineconeDatabase(
+            PineconeIntegration(pineconeApiKey=os.getenv("PINECONE_API_KEY"), pineconeIndexName=os.getenv("PINECONE_INDEX_NAME", collection), **common),
+            embeddings,
+        )
+    if name == "qdrant":
+        from ..vector_stores.qdrant import QdrantDatabase
+
+        return QdrantDatabase(
+            QdrantIntegration(
+                qdrantUrl=os.getenv("QDRANT_URL"), qdrantApiKey=os.getenv("QDRANT_API_KEY"), qdrantCollectionName=collection, **common
+            ),
+            embeddings,
+        )
+    if name == "weaviate":
+        from ..vector_stores.weaviate import WeaviateDatabase
+
+        return WeaviateDatabase(
+            WeaviateIntegration(
+                weaviateUrl=os.getenv("WEAVIATE_URL"), weaviateApiKey=os.getenv("WEAVIATE_API_KEY"), weaviateCollectionName=collection, **common
+            ),
+            embeddings,
+        )
+    raise ValueError(f"Unknown database: {name}")
+
+
+def generate_documents(n_objects: int) -> list[Document]:
+    # Qdrant and Weaviate require UUIDs as ids
+    ids = [str(uuid.UUID(int=i + 1)) for i in range(n_objects)]
+    return [
+        Document(page_content=f"text {i}", metadata={"item_id": f"item-{i}", "chunk_id": _id, "checksum": "c", "last_seen_at": 0})
+        for i, _id in enumerate(ids)
+    ]
+
+
+def run(name: str, collection: str, n_objects: int, concurrencies: list[int], dimension: int) -> None:
+    db = create_database(name, collection, DeterministicFakeEmbedding(size=dimension))
+    documents = generate_documents(n_objects)
+    ids = [d.metadata["chunk_id"] for d in documents]
+    for i in range(0, n_objects, INSERT_BATCH_SIZE):
+        batch = documents[i : i + INSERT_BATCH_SIZE]
+        db.add_documents(batch, ids=[d.metadata["chunk_id"] for d in batch])
+
+    try:
+        for concurrency in concurrencies:
+            db.touch_concurrency = concurrency
+            start = time.perf_counter()
+            for i in range(0, n_objects, TOUCH_BATCH_SIZE):
+                db.update_last_seen_at(ids[i : i + TOUCH_BATCH_SIZE], last_seen_at=int(time.time()))
+            elapsed = time.perf_counter() - start
+            print(f"{name:<12}{n_objects:>10}{concurrency:>13}{elapsed:>10.1f}{n_objects / elapsed:>14.0f}")
+    finally:
+        for i in range(0, n_objects, INSERT_BATCH_SIZE):
+            db.delete(ids=ids[i : i + INSERT_BATCH_SIZE])
+        if hasattr(db, "close"):
+            db.close()
+
+
+def main() -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--databases", nargs="+", default=["chroma", "milvus", "opensearch", "pgvector", "pinecone", "qdrant", "weaviate"])
+    parser.add_argument("--objects", type=int, default=10_000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--collection", default="apifytouchbenchmark")
+    parser.add_argument("--dimension", type=int, default=1536, help="Must match the dimension of an existing index (Pinecone)")
+    args = parser.parse_args()
+
+    print(f"{'database':<12}{'objects':>10}{'concurrency':>13}{'time [s]':>10}{'objects/s':>14}")
+    for name in args.databases:
+        run(name, args.collection, args.objects, args.concurrency, args.dimension)
+
+
+if __name__ == "__main__":
+    main()
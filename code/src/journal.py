@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import gzip
+import json
+import time
+from typing import Any, NamedTuple
+
+from apify import Actor
+
+JOURNAL_KEY_PREFIX = "delta-journal"
+JOURNAL_VERSION = 1
+JOURNAL_CONTENT_TYPE = "application/gzip"
+
+# Completed batches are saved at most once per interval, batches completed but not saved before a crash are replayed (idempotently)
+JOURNAL_SAVE_INTERVAL_SECS = 5
+
+
+class JournalBatch(NamedTuple):
+    """Planned write of the delta pipeline: ids and item_ids of objects to delete or item_ids of documents to add (chunk_ids are random)."""
+
+    op: str
+    ids: list[str]
+    item_ids: list[str]
+
+
+class DeltaJournal:
+    """Write-ahead journal of the delta pipeline stored in a key-value store.
+
+    The plan (all delete and add batches) is saved before the first write and indices of completed batches are saved as the
+    batches complete. The journal is cleared when all changes are applied, a journal found at the start of a run means
+    the previous run did not finish and its pending batches have to be recovered (see pipeline.recover_from_journal).
+    Updates of last_seen_at are not journaled, they do not affect the consistency of the stored items.
+    """
+
+    def __init__(self, kv_store: Any, key_prefix: str = JOURNAL_KEY_PREFIX) -> None:
+        self.kv_store = kv_store
+        self.key_prefix = key_prefix
+        self.batches: list[JournalBatch] = []
+        self.done: set[int] = set()
+        self.saved_at = 0.0
+
+    @classmethod
+    async def open(cls, kv_store_name: str) -> DeltaJournal:
+        journal = cls(await Actor.open_key_value_store(name=kv_store_name))
+        await journal.load()
+        return journal
+
+    @property
+    def plan_key(self) -> str:
+        return f"{self.key_prefix}-plan"
+
+    @property
+    def done_key(self) -> str:
+        return f"{self.key_prefix}-done"
+
+    @property
+    def pending(self) -> list[JournalBatch]:
+        return [batch for i, batch in enumerate(self.batches) if i not in self.done]
+
+    async def load(self) -> None:
+        """Load the journal of an unfinished run (if any)."""
+        if not (data := await self.kv_store.get_value(self.plan_key)):
+            return
+        plan = json.loads(gzip.decompress(data))
+        if plan.get("version") != JOURNAL_VERSION:
+            raise ValueError(f"Unsupported delta journal version {plan.get('version')}, expected {JOURNAL_VERSION}")
+        self.batches = [JournalBatch(*batch) for batch in plan["batches"]]
+        self.done = set(await self.kv_store.get_value(self.done_key) or [])
+
+    async def begin(self, batches: list[JournalBatch]) -> None:
+        """Save the plan of a run before any change is written."""
+        self.batches, self.done = batches, set()
+        await self.save_done()
+        data = gzip.compress(json.dumps({"version": JOURNAL_VERSION, "batches": batches}, separators=(",", ":")).encode())
+        await self.kv_store.set_value(self.plan_key, data, content_type=JOURNAL_CONTENT_TYPE)
+        Actor.log.info("Delta journal: saved plan of %s batches", len(batches))
+
+    async def mark_done(self, index: int) -> None:
+        self.done.add(index)
+        if time.monotonic() - self.saved_at >= JOURNAL_SAVE_INTERVAL_SECS:
+            await self.save_done()
+
+    async def save_done(self) -> None:
+        self.saved_at = time.monotonic()
+        await self.kv_store.set_value(self.done_key, sorted(self.done))
+
+    async def commit(self) -> None:
+        """Clear the journal after all batches are applied."""
+        await self.kv_store.set_value(self.plan_key, None)
+        await self.kv_store.set_value(self.done_key, None)
+        self.batches, self.done = [], set()
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import hashlib
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+from apify import Actor
+
+from .constants import DAY_IN_SECONDS
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from numpy.typing import NDArray
+
+SEEN_ITEMS_KEY_PREFIX = "seen-items"
+SEEN_ITEMS_VERSION = 1
+SEEN_ITEMS_CONTENT_TYPE = "application/octet-stream"
+
+
+def hash_item_ids(item_ids: Iterable[str]) -> NDArray[np.uint64]:
+    """Return 64-bit digests of item_ids (collisions are negligible for tens of millions of item_ids)."""
+    digests = b"".join(hashlib.blake2b(item_id.encode(), digest_size=8).digest() for item_id in item_ids)
+    return np.frombuffer(digests, dtype="<u8")
+
+
+def get_day(ts: int) -> int:
+    """Return the timestamp of the start of the (UTC) day."""
+    return ts - ts % DAY_IN_SECONDS
+
+
+class SeenItemsStore:
+    """Generations of item_ids seen by runs, used instead of last_seen_at of every object to find expired items.
+
+    Every generation is a sorted array of item_id digests of one day (runs of the same day are merged) stored in a key-value store.
+    Unchanged objects are then not written to the database at all.
+    """
+
+    def __init__(self, kv_store: Any, key_prefix: str = SEEN_ITEMS_KEY_PREFIX) -> None:
+        self.kv_store = kv_store
+        self.key_prefix = key_prefix
+        self.generations: list[int] = []
+
+    @classmethod
+    async def open(cls, kv_store_name: str) -> SeenItemsStore:
+        store = cls(await Actor.open_key_value_store(name=kv_store_name))
+        await store.load_meta()
+        return store
+
+    @property
+    def meta_key(self) -> str:
+        return f"{self.key_prefix}-meta"
+
+    def get_generation_key(self, day: int) -> str:
+        return f"{self.key_prefix}-{day}"
+
+    async def load_meta(self) -> None:
+        if meta := await self.kv_store.get_value(self.meta_key):
+            if meta.get("version") != SEEN_ITEMS_VERSION:
+                raise ValueError(f"Unsupported seen items version {meta.get('version')}, expected {SEEN_ITEMS_VERSION}")
+            self.generations = sorted(meta["generations"])
+
+    async def save_meta(self) -> None:
+        await self.kv_store.set_value(self.meta_key, {"version": SEEN_ITEMS_VERSION, "generations": self.generations})
+
+    async def load_generation(self, day: int) -> NDArray[np.uint64]:
+        data = await self.kv_store.get_value(self.get_generation_key(day))
+        return np.frombuffer(data, dtype="<u8") if data else np.zeros(0, dtype=np.uint64)
+
+    async def record(self, item_ids: Iterable[str], now_ts: int) -> None:
+        """Add item_ids to the generation of the current day."""
+        day = get_day(now_ts)
+        digests = np.unique(hash_item_ids(item_ids))
+        if day in self.generations:
+            digests = np.union1d(await self.load_generation(day), digests)
+        else:
+            self.generations.append(day)
+        await self.kv_store.set_value(self.get_generation_key(day), digests.astype("<u8").tobytes(), content_type=SEEN_ITEMS_CONTENT_TYPE)
+        await self.save_meta()
+        Actor.log.info("Recorded %s item_ids seen on %s (%s generations)", len(digests), day, len(self.generations))
+
+    def covers(self, expired_ts: int) -> bool:
+        """Return True if generations are recorded since expired_ts, otherwise items seen before the first generation would be expired."""
+        return bool(self.generations) and self.generations[0] <= get_day(expired_ts)
+
+    async def get_seen_since(self, expired_ts: int) -> NDArray[np.uint64]:
+        """Return sorted digests of item_ids seen on the day of expired_ts or later."""
+        seen = [await self.load_generation(day) for day in self.generations if day >= get_day(expired_ts)]
+        return np.unique(np.concatenate(seen)) if seen else np.zeros(0, dtype=np.uint64)
+
+    async def delete_older_than(self, expired_ts: int) -> None:
+        """Delete generations that are no longer needed (older than the day of expired_ts)."""
+        old = [day for day in self.generations if day < get_day(expired_ts)]
+        for day in old:
+            await self.kv_store.set_value(self.get_generation_key(day), None)
+        self.generations = [day for day in self.generations if day not in old]
+        await self.save_meta()
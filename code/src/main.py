@@ -1,22 +1,50 @@
 from __future__ import annotations
 
+import asyncio
 from datetime import datetime, timezone
-from typing import TYPE_CHECKING
+from functools import partial
+from typing import TYPE_CHECKING, Any
 
 from apify import Actor
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-from .constants import DAY_IN_SECONDS
-from .emb import get_embedding_provider
+from .bloom import ItemIdsBloomFilter
+from .constants import DAY_IN_SECONDS, DELTA_UPDATES_CONCURRENCY, DELTA_UPDATES_REQUEST_TIMEOUT_SECS, PINECONE_NAMESPACE_CONCURRENCY
+from .emb import get_embedding_provider, get_embeddings_pool
+from .journal import DeltaJournal
+from .liveness import SeenItemsStore
+from .manifest import DeltaManifest
+from .pipeline import recover_from_journal
+from .planner import DRY_RUN_PLAN_KEY, plan_run
 from .utils import add_chunk_id, add_item_checksum, get_dataset_loader
-from .vcs import delete_expired_objects, get_vector_database, update_db_with_crawled_data, upsert_db_with_crawled_data
+from .vcs import (
+    adelete_expired_objects,
+    aget_bloom_filter_from_db,
+    aupdate_db_with_crawled_data,
+    aupdate_db_with_manifest,
+    can_scan_metadata,
+    delete_expired_from_manifest,
+    delete_unseen_items,
+    get_vector_database,
+    migrate_manifest_to_id_prefix,
+    upsert_db_with_crawled_data,
+)
 
 if TYPE_CHECKING:
+    from collections.abc import Coroutine
+
     from langchain_core.documents import Document
     from langchain_core.embeddings import Embeddings
 
     from ._types import ActorInputsDb, VectorDb
 
+# Inputs with key-value stores describing the contents of a single namespace
+NAMESPACE_INCOMPATIBLE_INPUTS = (
+    "deltaUpdatesManifestKeyValueStoreName",
+    "deltaUpdatesJournalKeyValueStoreName",
+    "deltaUpdatesBloomFilterKeyValueStoreName",
+)
+
 
 async def run_actor(actor_input: ActorInputsDb, payload: dict) -> None:
     """Main function to run the actor.
@@ -44,12 +72,12 @@ async def run_actor(actor_input: ActorInputsDb, payload: dict) -> None:
     documents = await load_dataset(actor_input, dataset_id)
     documents = add_item_checksum(documents, actor_input.dataUpdatesPrimaryDatasetFields)  # type: ignore[arg-type]
 
-    if actor_input.performChunking:
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=actor_input.chunkSize, chunk_overlap=actor_input.chunkOverlap)
-        documents = text_splitter.split_documents(documents)
-        Actor.log.info("Documents chunked to %s chunks", len(documents))
+    documents = add_chunk_id(chunk_documents(actor_input, documents))
 
-    documents = add_chunk_id(documents)
+    if actor_input.dryRun:
+        # Do not create a missing collection/index, the dry run must not write to the database
+        auto_create = {key: False for key in ("autoCreateIndex", "qdrantAutoCreateCollection") if hasattr(actor_input, key)}
+        actor_input = actor_input.model_copy(update=auto_create)
 
     try:
         vcs_: VectorDb = await get_vector_database(actor_input, embeddings)
@@ -63,30 +91,14 @@ async def run_actor(actor_input: ActorInputsDb, payload: dict) -> None:
         )
         return
 
+    now_ts = int(datetime.now(timezone.utc).timestamp())
     try:
-        data_update_strategy = hasattr(actor_input, "dataUpdatesStrategy") and actor_input.dataUpdatesStrategy
-        if data_update_strategy == "deltaUpdates":
-            Actor.log.info("Update database with crawled data. Delta updates enabled")
-            update_db_with_crawled_data(vcs_, documents)
-        elif data_update_strategy == "add":
-            vcs_.add_documents(documents)
-            Actor.log.info("Added %s new objects to the vector store", len(documents))
-        elif data_update_strategy == "upsert":
-            upsert_db_with_crawled_data(vcs_, documents)
+        if actor_input.dryRun:
+            await run_dry_run(actor_input, vcs_, embeddings, documents, now_ts)
         else:
-            await Actor.fail(
-                status_message=f"Invalid dataUpdatesStrategy: {data_update_strategy}. "
-                f"Please ensure that the configuration in the Database Settings is correct."
-            )
-
-        if actor_input.deleteExpiredObjects:
-            expired_days = actor_input.expiredObjectDeletionPeriodDays or 0
-            ts_expired = expired_days and int(datetime.now(timezone.utc).timestamp() - expired_days * DAY_IN_SECONDS) or 0
-            Actor.log.info("Delete expired objects in the database: expired_days: %s", expired_days)
-            delete_expired_objects(vcs_, ts_expired)
-
-        await Actor.push_data([doc.dict() for doc in documents])
+            await run_update(actor_input, vcs_, documents, now_ts)
 
+        await vcs_.aclose()
         if hasattr(vcs_, "close"):
             vcs_.close()
 
@@ -102,6 +114,235 @@ async def run_actor(actor_input: ActorInputsDb, payload: dict) -> None:
         await Actor.fail(status_message=f"{msg} {e}", exception=e)
 
 
+async def run_update(actor_input: ActorInputsDb, vcs_: VectorDb, documents: list[Document], now_ts: int) -> None:
+    """Update the database with crawled data, delete expired objects and push the documents to the dataset."""
+
+    await run_pinecone_id_prefix_migration(actor_input, vcs_)
+
+    if namespace_field := getattr(actor_input, "pineconeNamespaceMetadataField", None):
+        await run_pinecone_namespaces(actor_input, vcs_, documents, namespace_field, now_ts)
+    else:
+        manifest = await update_database(actor_input, vcs_, documents, now_ts)
+        await record_seen_items(actor_input, documents, now_ts)
+        if actor_input.deleteExpiredObjects:
+            await run_delete_expired(actor_input, vcs_, manifest, now_ts)
+
+    await asyncio.to_thread(vcs_.flush)
+    await Actor.push_data([doc.dict() for doc in documents])
+
+
+async def update_database(actor_input: ActorInputsDb, vcs_: VectorDb, documents: list[Document], now_ts: int) -> DeltaManifest | None:
+    """Update the database with crawled data using the data update strategy. Return the delta manifest if it is used."""
+
+    data_update_strategy = hasattr(actor_input, "dataUpdatesStrategy") and actor_input.dataUpdatesStrategy
+    if data_update_strategy == "deltaUpdates":
+        Actor.log.info("Update database with crawled data. Delta updates enabled")
+        return await run_delta_updates(actor_input, vcs_, documents, now_ts)
+    # Item_ids are saved to the Bloom filter before they are written, a crash after a partial write must not leave them out
+    if data_update_strategy == "add":
+        await update_bloom_filter(actor_input, documents)
+        await asyncio.to_thread(vcs_.add_documents, documents)
+        Actor.log.info("Added %s new objects to the vector store", len(documents))
+    elif data_update_strategy == "upsert":
+        await update_bloom_filter(actor_input, documents)
+        await asyncio.to_thread(upsert_db_with_crawled_data, vcs_, documents)
+    else:
+        await Actor.fail(
+            status_message=f"Invalid dataUpdatesStrategy: {data_update_strategy}. "
+            f"Please ensure that the configuration in the Database Settings is correct."
+        )
+    return None
+
+
+async def run_pinecone_namespaces(actor_input: ActorInputsDb, vcs_: VectorDb, documents: list[Document], namespace_field: str, now_ts: int) -> None:
+    """Route documents to Pinecone namespaces by a metadata field and update the namespaces in parallel.
+
+    Every namespace is updated (and its expired objects deleted) by a database bound to the namespace sharing the client of vcs_.
+    Only namespaces of the crawled documents are updated, documents without the field go to the namespace of vcs_.
+    """
+
+    if kv_stores := [key for key in NAMESPACE_INCOMPATIBLE_INPUTS if getattr(actor_input, key, None)]:
+        raise ValueError(f"pineconeNamespaceMetadataField cannot be combined with {', '.join(kv_stores)}, they describe a single namespace")
+
+    by_namespace: dict[str | None, list[Document]] = {}
+    for doc in documents:
+        namespace = doc.metadata.get(namespace_field)
+        by_namespace.setdefault(str(namespace) if namespace else vcs_.namespace, []).append(doc)  # type: ignore[union-attr]
+    databases = {namespace: vcs_.with_namespace(namespace) for namespace in by_namespace}  # type: ignore[union-attr]
+    Actor.log.info("Update %s Pinecone namespaces: %s", len(by_namespace), {ns: len(docs) for ns, docs in by_namespace.items()})
+
+    semaphore = asyncio.Semaphore(getattr(actor_input, "pineconeNamespaceConcurrency", None) or PINECONE_NAMESPACE_CONCURRENCY)
+
+    async def _run(coro: Coroutine[Any, Any, Any]) -> None:
+        async with semaphore:
+            await coro
+
+    await asyncio.gather(*[_run(update_database(actor_input, databases[ns], docs, now_ts)) for ns, docs in by_namespace.items()])
+    await record_seen_items(actor_input, documents, now_ts)
+    if actor_input.deleteExpiredObjects:
+        await asyncio.gather(*[_run(run_delete_expired(actor_input, db, None, now_ts)) for db in databases.values()])
+
+
+def chunk_documents(actor_input: ActorInputsDb, documents: list[Document]) -> list[Document]:
+    if not actor_input.performChunking:
+        return documents
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=actor_input.chunkSize, chunk_overlap=actor_input.chunkOverlap)
+    documents = text_splitter.split_documents(documents)
+    Actor.log.info("Documents chunked to %s chunks", len(documents))
+    return documents
+
+
+async def run_dry_run(actor_input: ActorInputsDb, vcs_: VectorDb, embeddings: Embeddings, documents: list[Document], now_ts: int) -> None:
+    """Compare crawled data with the database and save the plan of changes to the key-value store, nothing is embedded or written.
+
+    The delta manifest and the Bloom filter are used for the comparison as in a real run, but they are not saved.
+    """
+
+    ts_expired = 0
+    if actor_input.deleteExpiredObjects and (expired_days := actor_input.expiredObjectDeletionPeriodDays):
+        ts_expired = int(now_ts - expired_days * DAY_IN_SECONDS)
+    seen_items = None
+    if seen_items_kv_store_name := actor_input.seenItemsKeyValueStoreName:
+        seen_items = await SeenItemsStore.open(seen_items_kv_store_name)
+
+    strategy = str(getattr(actor_input, "dataUpdatesStrategy", None) or "deltaUpdates")
+    manifest, bloom_filter = None, None
+    if strategy == "deltaUpdates" and (manifest_kv_store_name := actor_input.deltaUpdatesManifestKeyValueStoreName):
+        manifest = await DeltaManifest.open(manifest_kv_store_name, n_items=len({d.metadata["item_id"] for d in documents}))
+    elif strategy == "deltaUpdates":
+        bloom_filter = await open_bloom_filter(actor_input, vcs_)
+
+    plan = await plan_run(
+        vcs_,
+        documents,
+        strategy,
+        getattr(embeddings, "model", None),
+        timestamp_expired=ts_expired,
+        seen_items=seen_items,
+        manifest=manifest,
+        reconcile=manifest is not None and is_reconciliation_due(actor_input, manifest, now_ts),
+        bloom_filter=bloom_filter,
+    )
+    Actor.log.info("Dry run plan: %s", plan._asdict())
+    await Actor.set_value(DRY_RUN_PLAN_KEY, plan._asdict())
+
+
+async def run_pinecone_id_prefix_migration(actor_input: ActorInputsDb, vcs_: VectorDb) -> None:
+    """Migrate existing Pinecone vectors to prefixed ids (item_id#chunk_id) if enabled, delta updates can then use the id prefix.
+
+    Chunk_ids in the delta manifest (if it is used) are migrated as well, the migration is resumable and the manifest is migrated every time.
+    """
+
+    if not getattr(actor_input, "pineconeMigrateToIdPrefix", False):
+        return
+    if not getattr(actor_input, "usePineconeIdPrefix", False):
+        Actor.log.warning("Pinecone id prefix migration is enabled but usePineconeIdPrefix is not, delta updates will not use the id prefix")
+    Actor.log.info("Migrate Pinecone vectors to id prefix (item_id#chunk_id)")
+    await asyncio.to_thread(vcs_.migrate_to_id_prefix, getattr(actor_input, "pineconeMigrationVectorsPerSecond", None))  # type: ignore[union-attr]
+    if manifest_kv_store_name := actor_input.deltaUpdatesManifestKeyValueStoreName:
+        manifest = await DeltaManifest.open(manifest_kv_store_name)
+        if not manifest.is_empty:
+            await migrate_manifest_to_id_prefix(manifest)
+
+
+async def run_delta_updates(actor_input: ActorInputsDb, vcs_: VectorDb, documents: list[Document], now_ts: int) -> DeltaManifest | None:
+    """Update the database with crawled data using delta updates. Return the delta manifest if it is used."""
+
+    concurrency = actor_input.deltaUpdatesConcurrency or DELTA_UPDATES_CONCURRENCY
+    timeout_secs = actor_input.deltaUpdatesRequestTimeoutSecs or DELTA_UPDATES_REQUEST_TIMEOUT_SECS
+    vcs_.touch_concurrency = actor_input.deltaUpdatesTouchConcurrency or vcs_.touch_concurrency
+    # With seen items, liveness is tracked in the key-value store and unchanged objects are not updated
+    touch = not actor_input.seenItemsKeyValueStoreName
+    manifest = None
+    if manifest_kv_store_name := actor_input.deltaUpdatesManifestKeyValueStoreName:
+        Actor.log.info("Delta updates use the manifest stored in the key-value store: %s", manifest_kv_store_name)
+        manifest = await DeltaManifest.open(manifest_kv_store_name, n_items=len({d.metadata["item_id"] for d in documents}))
+    journal = None
+    if journal_kv_store_name := actor_input.deltaUpdatesJournalKeyValueStoreName:
+        journal = await DeltaJournal.open(journal_kv_store_name)
+        await recover_from_journal(vcs_, journal, manifest)
+
+    if manifest is None:
+        bloom_filter = await open_bloom_filter(actor_input, vcs_)
+        await aupdate_db_with_crawled_data(
+            vcs_,
+            documents,
+            concurrency=concurrency,
+            timeout_secs=timeout_secs,
+            bloom_filter=bloom_filter,
+            touch=touch,
+            journal=journal,
+            # The crawled item_ids are added after the comparison (they would all look present) but before the writes
+            before_write=partial(update_bloom_filter, actor_input, documents, bloom_filter),
+        )
+        return None
+
+    reconcile = is_reconciliation_due(actor_input, manifest, now_ts)
+    await aupdate_db_with_manifest(
+        vcs_, documents, manifest, reconcile=reconcile, concurrency=concurrency, timeout_secs=timeout_secs, touch=touch, journal=journal
+    )
+    return manifest
+
+
+def is_reconciliation_due(actor_input: ActorInputsDb, manifest: DeltaManifest, now_ts: int) -> bool:
+    """Return True if the delta manifest was reconciled with the database longer ago than the reconciliation period."""
+    reconciliation_days = actor_input.deltaUpdatesManifestReconciliationDays or 0
+    return bool(reconciliation_days) and now_ts - manifest.reconciled_at > reconciliation_days * DAY_IN_SECONDS
+
+
+async def open_bloom_filter(actor_input: ActorInputsDb, vcs_: VectorDb) -> ItemIdsBloomFilter | None:
+    """Load the Bloom filter of item_ids in the database. A new filter is created by scanning the database, it has to contain all item_ids."""
+
+    if not (kv_store_name := actor_input.deltaUpdatesBloomFilterKeyValueStoreName):
+        return None
+    if bloom_filter := await ItemIdsBloomFilter.load(kv_store_name):
+        Actor.log.info("Loaded Bloom filter with %s item_ids from the key-value store: %s", len(bloom_filter), kv_store_name)
+        return bloom_filter
+    if not can_scan_metadata(vcs_):
+        Actor.log.warning("The Bloom filter cannot be created, the database does not support a scan of all objects")
+        return None
+    Actor.log.info("Creating a new Bloom filter of item_ids by scanning the database ...")
+    bloom_filter = await aget_bloom_filter_from_db(vcs_)
+    Actor.log.info("Created Bloom filter with %s item_ids", len(bloom_filter))
+    return bloom_filter
+
+
+async def update_bloom_filter(actor_input: ActorInputsDb, documents: list[Document], bloom_filter: ItemIdsBloomFilter | None = None) -> None:
+    """Add crawled item_ids to the Bloom filter (if it is used) and save it, must be called before the item_ids are written.
+
+    Item_ids that are not written in the end are only false positives (an extra lookup), missing item_ids would be duplicated.
+    """
+
+    if not (kv_store_name := actor_input.deltaUpdatesBloomFilterKeyValueStoreName):
+        return
+    if bloom_filter is None and not (bloom_filter := await ItemIdsBloomFilter.load(kv_store_name)):
+        return
+    bloom_filter.add_many([d.metadata["item_id"] for d in documents])
+    await bloom_filter.save(kv_store_name)
+
+
+async def record_seen_items(actor_input: ActorInputsDb, documents: list[Document], now_ts: int) -> None:
+    """Record item_ids seen by this run (if generation-based liveness is used)."""
+
+    if seen_items_kv_store_name := actor_input.seenItemsKeyValueStoreName:
+        seen_items = await SeenItemsStore.open(seen_items_kv_store_name)
+        await seen_items.record((d.metadata["item_id"] for d in documents), now_ts)
+
+
+async def run_delete_expired(actor_input: ActorInputsDb, vcs_: VectorDb, manifest: DeltaManifest | None, now_ts: int) -> None:
+    """Delete expired objects from the database (and from the delta manifest if it is used)."""
+
+    expired_days = actor_input.expiredObjectDeletionPeriodDays or 0
+    ts_expired = expired_days and int(now_ts - expired_days * DAY_IN_SECONDS) or 0
+    Actor.log.info("Delete expired objects in the database: expired_days: %s", expired_days)
+    if seen_items_kv_store_name := actor_input.seenItemsKeyValueStoreName:
+        await delete_unseen_items(vcs_, await SeenItemsStore.open(seen_items_kv_store_name), ts_expired)
+    else:
+        await adelete_expired_objects(vcs_, ts_expired)
+    if manifest:
+        await delete_expired_from_manifest(manifest, ts_expired)
+
+
 async def get_embeddings(actor_input: ActorInputsDb) -> Embeddings:  # type: ignore[return]
     try:
         embed_provider_name = str(actor_input.embeddingsProvider)
@@ -111,6 +352,9 @@ async def get_embeddings(actor_input: ActorInputsDb) -> Embeddings:  # type: ign
             actor_input.embeddingsApiKey,
             actor_input.embeddingsConfig,
         )
+        if pool := getattr(actor_input, "embeddingsPool", None):
+            Actor.log.info("Create embeddings pool with %s additional members", len(pool))
+            embeddings = await get_embeddings_pool(embeddings, pool, actor_input.embeddingsConfig)
     except Exception as e:
         Actor.log.error(e)
         await Actor.fail(status_message=f"Failed to get embeddings: {e}. Ensure that the configuration in the Embeddings Settings is correct.")
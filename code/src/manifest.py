@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import gzip
+import json
+import math
+import zlib
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from apify import Actor
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+MANIFEST_KEY_PREFIX = "delta-manifest"
+MANIFEST_VERSION = 1
+MANIFEST_CONTENT_TYPE = "application/gzip"
+
+# Target number of item_ids in a single shard (a compressed shard is then roughly 1-2 MB)
+ITEMS_PER_SHARD = 10_000
+MIN_SHARDS = 16
+
+
+class ManifestEntry(NamedTuple):
+    """State of a dataset item stored in the database."""
+
+    checksum: str
+    chunk_ids: list[str]
+    last_seen_at: int
+
+
+def get_number_of_shards(n_items: int) -> int:
+    """Return the number of shards (power of two) for the given number of item_ids."""
+    return max(MIN_SHARDS, 1 << math.ceil(math.log2(n_items / ITEMS_PER_SHARD + 1)))
+
+
+def get_shard_index(item_id: str, n_shards: int) -> int:
+    return zlib.crc32(item_id.encode()) % n_shards
+
+
+class DeltaManifest:
+    """Compact mapping item_id -> (checksum, chunk_ids, last_seen_at) of the objects stored in the database.
+
+    The manifest is split into gzip-compressed JSON shards (by a hash of item_id) stored in a key-value store.
+    Shards are loaded lazily when an item_id from the shard is accessed and only modified shards are saved.
+    """
+
+    def __init__(self, kv_store: Any, key_prefix: str = MANIFEST_KEY_PREFIX) -> None:
+        self.kv_store = kv_store
+        self.key_prefix = key_prefix
+        self.n_shards = 0
+        self.reconciled_at = 0
+        self.shards: dict[int, dict[str, list]] = {}
+        self.dirty: set[int] = set()
+
+    @classmethod
+    async def open(cls, kv_store_name: str, n_items: int = 0) -> DeltaManifest:
+        """Open the manifest stored in the named key-value store. A new manifest is sized for n_items."""
+        manifest = cls(await Actor.open_key_value_store(name=kv_store_name))
+        await manifest.load_meta(n_items)
+        return manifest
+
+    @property
+    def meta_key(self) -> str:
+        return f"{self.key_prefix}-meta"
+
+    def get_shard_key(self, index: int) -> str:
+        return f"{self.key_prefix}-{index:05d}"
+
+    async def load_meta(self, n_items: int = 0) -> None:
+        """Load the number of shards and the last reconciliation timestamp. Initialize an empty manifest if it does not exist."""
+        if meta := await self.kv_store.get_value(self.meta_key):
+            if meta.get("version") != MANIFEST_VERSION:
+                raise ValueError(f"Unsupported delta manifest version {meta.get('version')}, expected {MANIFEST_VERSION}")
+            self.n_shards = meta["shards"]
+            self.reconciled_at = meta.get("reconciled_at", 0)
+        else:
+            self.n_shards = get_number_of_shards(n_items)
+            self.shards = {i: {} for i in range(self.n_shards)}
+            self.dirty = set(self.shards)
+
+    @property
+    def is_empty(self) -> bool:
+        """Return True if the manifest was just created (and nothing was added yet)."""
+        return len(self.shards) == self.n_shards and not any(self.shards.values())
+
+    async def load_shard(self, index: int) -> dict[str, list]:
+        if (shard := self.shards.get(index)) is None:
+            data = await self.kv_store.get_value(self.get_shard_key(index))
+            shard = json.loads(gzip.decompress(data)) if data else {}
+            self.shards[index] = shard
+        return shard
+
+    async def get(self, item_id: str) -> ManifestEntry | None:
+        shard = await self.load_shard(get_shard_index(item_id, self.n_shards))
+        return ManifestEntry(*entry) if (entry := shard.get(item_id)) else None
+
+    async def set(self, item_id: str, entry: ManifestEntry) -> None:
+        index = get_shard_index(item_id, self.n_shards)
+        shard = await self.load_shard(index)
+        shard[item_id] = [entry.checksum, entry.chunk_ids, entry.last_seen_at]
+        self.dirty.add(index)
+
+    async def delete(self, item_id: str) -> None:
+        index = get_shard_index(item_id, self.n_shards)
+        shard = await self.load_shard(index)
+        if shard.pop(item_id, None) is not None:
+            self.dirty.add(index)
+
+    async def items(self) -> AsyncIterator[tuple[str, ManifestEntry]]:
+        """Iterate over all entries, loading all shards."""
+        for index in range(self.n_shards):
+            shard = await self.load_shard(index)
+            for item_id, entry in list(shard.items()):
+                yield item_id, ManifestEntry(*entry)
+
+    async def delete_expired(self, expired_ts: int) -> list[str]:
+        """Remove entries not seen since expired_ts. Return the chunk_ids of the removed entries."""
+        expired = [(item_id, entry) async for item_id, entry in self.items() if entry.last_seen_at < expired_ts]
+        for item_id, _ in expired:
+            await self.delete(item_id)
+        return [chunk_id for _, entry in expired for chunk_id in entry.chunk_ids]
+
+    def mark_reconciled(self) -> None:
+        self.reconciled_at = int(datetime.now(timezone.utc).timestamp())
+
+    async def save(self) -> None:
+        """Save modified shards and the metadata to the key-value store."""
+        for index in sorted(self.dirty):
+            data = gzip.compress(json.dumps(self.shards[index], separators=(",", ":")).encode())
+            await self.kv_store.set_value(self.get_shard_key(index), data, content_type=MANIFEST_CONTENT_TYPE)
+        meta = {"version": MANIFEST_VERSION, "shards": self.n_shards, "reconciled_at": self.reconciled_at}
+        await self.kv_store.set_value(self.meta_key, meta)
+        Actor.log.info("Saved %s modified delta manifest shards (out of %s)", len(self.dirty), self.n_shards)
+        self.dirty.clear()
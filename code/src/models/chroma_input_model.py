@@ -1,6 +1,6 @@
 # generated by datamodel-codegen:
 #   filename:  input_schema.json
-#   timestamp: 2025-08-20T08:08:17+00:00
+#   timestamp: 2026-10-19T03:32:40+00:00
 
 from __future__ import annotations
 
@@ -42,6 +42,24 @@ class ChromaIntegration(BaseModel):
         ge=1,
         title='Chroma batch size',
     )
+    chromaEmbeddingBatchSize: Optional[int] = Field(
+        1000,
+        description='Number of documents embedded by a single request to the embeddings provider, independent of the Chroma batch size. Default is 1000.',
+        ge=1,
+        title='Chroma embedding batch size',
+    )
+    chromaBatchConcurrency: Optional[int] = Field(
+        4,
+        description='Number of embedding batches embedded and Chroma batches inserted concurrently by a single add. Set to 1 to embed and insert batches one by one.',
+        ge=1,
+        le=32,
+        title='Maximum number of concurrent embedding and insert requests',
+    )
+    chromaUseAsyncClient: Optional[bool] = Field(
+        False,
+        description='When set to true, database lookups and writes of delta updates and the deletion of expired objects use the async Chroma client and run concurrently on a single event loop instead of worker threads.',
+        title='Use async Chroma client',
+    )
     embeddingsProvider: Literal['OpenAI', 'Cohere'] = Field(
         ...,
         description='Choose the embeddings provider to use for generating embeddings',
@@ -57,6 +75,11 @@ class ChromaIntegration(BaseModel):
         description='Value of the API KEY for the embeddings provider (if required).\n\n For example for OpenAI it is OPENAI_API_KEY, for Cohere it is COHERE_API_KEY)',
         title='Embeddings API KEY (whenever applicable, depends on provider)',
     )
+    embeddingsPool: Optional[List] = Field(
+        None,
+        description='Additional API keys or deployments of the same embedding model. Embedding requests are spread across the main embeddings provider and the pool members proportionally to their `weight` (e.g. their rate limits). When a member fails, the request is retried on the other members.\n\nAll members must use the same model (and dimensions), otherwise the vectors would not be comparable.\n\nExample: `[{"provider": "OpenAI", "apiKey": "sk-...", "weight": 1}, {"provider": "AzureOpenAI", "apiKey": "...", "weight": 2, "config": {"model": "text-embedding-3-small", "azure_deployment": "embeddings", "azure_endpoint": "https://example.openai.azure.com", "api_version": "2024-02-01"}}]`.\n\nThe `config` defaults to the main embeddings configuration. Supported providers: `OpenAI`, `AzureOpenAI`, `Cohere`.',
+        title='Embeddings pool (additional API keys or deployments)',
+    )
     datasetFields: List = Field(
         ...,
         description='This array specifies the dataset fields to be selected and stored in the vector store. Only the fields listed here will be included in the vector store.\n\nFor instance, when using the Website Content Crawler, you might choose to include fields such as `text`, `url`, and `metadata.title` in the vector store.',
@@ -97,6 +120,47 @@ class ChromaIntegration(BaseModel):
         description='This array contains fields that are used to uniquely identify dataset items, which helps to handle content changes across different runs.\n\nFor instance, in a web content crawling scenario, the `url` field could serve as a unique identifier for each item.',
         title='Dataset fields to uniquely identify dataset items (only relevant when `enableDeltaUpdates` is enabled) (deprecated)',
     )
+    deltaUpdatesConcurrency: Optional[int] = Field(
+        8,
+        description='Delta updates look up existing objects in the database in batches of item IDs. This setting limits the number of batches that are requested concurrently.\n\nIncrease it to speed up the comparison for large datasets, decrease it when the database is rate limited.',
+        ge=1,
+        le=64,
+        title='Maximum number of concurrent database lookups (only relevant when dataUpdatesStrategy is `deltaUpdates`)',
+    )
+    deltaUpdatesRequestTimeoutSecs: Optional[int] = Field(
+        300,
+        description='Maximum time to wait for a single batch lookup (including retries). The run fails when a lookup times out or errors out, so that no items are silently treated as new.',
+        ge=1,
+        title='Timeout of a single database lookup (only relevant when dataUpdatesStrategy is `deltaUpdates`)',
+    )
+    deltaUpdatesTouchConcurrency: Optional[int] = Field(
+        8,
+        description='Unchanged objects get their `last_seen_at` updated in batches. This setting limits the number of concurrent update requests of a batch (Pinecone and Weaviate update objects one by one, Chroma and OpenSearch send batches of objects).\n\nDecrease it when the database is rate limited.',
+        ge=1,
+        le=64,
+        title='Maximum number of concurrent last_seen_at updates (only relevant when dataUpdatesStrategy is `deltaUpdates`)',
+    )
+    deltaUpdatesManifestKeyValueStoreName: Optional[str] = Field(
+        None,
+        description='When set, delta updates keep a compact manifest (`item_id` → checksum, chunk IDs, last seen timestamp) in the named key-value store and compare crawled data with the manifest instead of querying the database.\n\nThe manifest is created on the first run from the database. Use a separate key-value store for every database collection/index.',
+        title='Key-value store name for the delta updates manifest (only relevant when dataUpdatesStrategy is `deltaUpdates`)',
+    )
+    deltaUpdatesManifestReconciliationDays: Optional[int] = Field(
+        7,
+        description='Periodically compare crawled data with the database instead of the manifest and rebuild the manifest entries, to catch objects changed or deleted outside of this integration. Set to 0 to disable reconciliation.',
+        ge=0,
+        title='Reconcile the delta updates manifest with the database every specified number of days',
+    )
+    deltaUpdatesBloomFilterKeyValueStoreName: Optional[str] = Field(
+        None,
+        description='Name of a key-value store where a Bloom filter of all item_ids in the database is kept. Only item_ids that might be in the database are looked up, other items are added as new. The filter is created by scanning the database on the first run and updated after each run. Delete the stored filter if objects are added to the database outside of this integration.',
+        title='Key-value store name for the Bloom filter of item_ids (only relevant when dataUpdatesStrategy is `deltaUpdates`)',
+    )
+    deltaUpdatesJournalKeyValueStoreName: Optional[str] = Field(
+        None,
+        description='When set, the planned deletes and adds are saved to a write-ahead journal in the named key-value store before they are written and completed batches are marked as they finish.\n\nIf a run fails in the middle of writing, the next run recovers: pending deletes are repeated and items with pending adds are deleted and added again as new items. Use the same key-value store name for all runs writing to the same collection/index.',
+        title='Key-value store name for the delta updates journal (only relevant when dataUpdatesStrategy is `deltaUpdates`)',
+    )
     deleteExpiredObjects: Optional[bool] = Field(
         True,
         description='When set to true, delete objects from the database that have not been crawled for a specified period.',
@@ -108,6 +172,16 @@ class ChromaIntegration(BaseModel):
         ge=0,
         title='Delete expired objects from the database after a specified number of days',
     )
+    seenItemsKeyValueStoreName: Optional[str] = Field(
+        None,
+        description='When set, the item IDs seen by every run are recorded (one compact generation per day) in the named key-value store and delta updates do not update `last_seen_at` of unchanged objects, so unchanged content costs no database writes.\n\nExpired objects are then items not seen within `expiredObjectDeletionPeriodDays`. No items are expired until the generations cover the whole period. Use a separate key-value store for every database collection/index.',
+        title='Key-value store name for item IDs seen by runs (generation-based expiry)',
+    )
+    dryRun: Optional[bool] = Field(
+        False,
+        description='When set to true, the integration loads, chunks and compares the crawled data with the database and saves a plan to the key-value store (key `DRY_RUN_PLAN`): the number of objects to add, delete, update (last_seen_at) and expire, estimated embedding tokens and cost, and estimated write requests.\n\nNothing is embedded or written to the database. Expired objects are counted by scanning the database metadata, Chroma has no filtered count (only when `deleteExpiredObjects` is enabled).',
+        title='Dry run (plan changes without embedding or writing)',
+    )
     performChunking: Optional[bool] = Field(
         True,
         description='When set to true, the text will be divided into smaller chunks based on the settings provided below. Proper chunking helps optimize retrieval and ensures accurate and efficient responses.',
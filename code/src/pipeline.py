@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from apify import Actor
+
+from .journal import JournalBatch
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable, Iterator
+
+    from langchain_core.documents import Document
+
+    from ._types import VectorDb
+    from .journal import DeltaJournal
+    from .manifest import DeltaManifest
+
+ADD_BATCH_SIZE = 500
+DELETE_BATCH_SIZE = 1_000
+TOUCH_BATCH_SIZE = 1_000
+
+
+class DeltaChanges(NamedTuple):
+    """Result of the delta comparison."""
+
+    data_add: list[Document]
+    ids_update_last_seen: list[str]
+    # item_id -> ids of the database chunks of the item to delete (before the new chunks of the item are added)
+    ids_delete: dict[str, list[str]]
+
+    @property
+    def ids_delete_flat(self) -> list[str]:
+        return [_id for ids in self.ids_delete.values() for _id in ids]
+
+
+def get_async_writers(vector_store: VectorDb) -> tuple[Callable[..., Awaitable[Any]], Callable[..., Awaitable[Any]], Callable[..., Awaitable[Any]]]:
+    """Return delete, add_documents and update_last_seen_at as coroutine functions.
+
+    Databases with an async client write on the event loop, other databases write in worker threads.
+    """
+    if vector_store.use_async_client:
+        return vector_store.adelete, vector_store.aadd_documents, vector_store.aupdate_last_seen_at
+
+    def _in_thread(func: Callable[..., Any]) -> Callable[..., Awaitable[Any]]:
+        async def _run(*args: Any, **kwargs: Any) -> Any:
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+        return _run
+
+    return _in_thread(vector_store.delete), _in_thread(vector_store.add_documents), _in_thread(vector_store.update_last_seen_at)
+
+
+def batch_items(ids_by_item: dict[str, list[str]], size: int) -> Iterator[tuple[list[str], list[str]]]:
+    """Split ids grouped by item_id into batches of about `size` ids, ids of an item are never split. Yield (item_ids, ids)."""
+    item_ids: list[str] = []
+    ids: list[str] = []
+    for item_id, item_chunk_ids in ids_by_item.items():
+        item_ids.append(item_id)
+        ids.extend(item_chunk_ids)
+        if len(ids) >= size:
+            yield item_ids, ids
+            item_ids, ids = [], []
+    if ids:
+        yield item_ids, ids
+
+
+async def apply_changes_pipelined(vector_store: VectorDb, changes: DeltaChanges, journal: DeltaJournal | None = None) -> None:
+    """Delete changed objects, add new objects and update last_seen_at of unchanged objects concurrently in batches.
+
+    Deletes, adds (including embeddings) and touches are limited by vector_store.pipeline_concurrency.
+    New chunks of an item are added only after the old chunks of the item are deleted, other batches do not wait for each other.
+    When a journal is given, delete and add batches are saved to the journal before they are written and marked as they complete.
+    The journal is not cleared, the caller commits it after the changes are recorded (e.g. saved to the delta manifest).
+    """
+    Actor.log.info(
+        "Objects: to add: %s, to update last_seen_at: %s, to delete: %s",
+        len(changes.data_add),
+        len(changes.ids_update_last_seen),
+        len(changes.ids_delete_flat),
+    )
+    limits = {op: asyncio.Semaphore(n) for op, n in vector_store.pipeline_concurrency.items()}
+    done = {"delete": 0, "add": 0, "touch": 0}
+    delete, add_documents, update_last_seen_at = get_async_writers(vector_store)
+
+    async def _run(op: str, n_objects: int, batch: int | None, func: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> None:
+        async with limits[op]:
+            await func(*args, **kwargs)
+        done[op] += n_objects
+        Actor.log.debug("Pipeline %s: %s objects done", op, done[op])
+        if journal and batch is not None:
+            await journal.mark_done(batch)
+
+    async def _add(documents: list[Document], batch: int, wait_for: list[asyncio.Task]) -> None:
+        await asyncio.gather(*wait_for)
+        await _run("add", len(documents), batch, add_documents, documents, ids=[d.metadata["chunk_id"] for d in documents])
+
+    delete_batches = list(batch_items(changes.ids_delete, DELETE_BATCH_SIZE))
+    add_batches = [changes.data_add[i : i + ADD_BATCH_SIZE] for i in range(0, len(changes.data_add), ADD_BATCH_SIZE)]
+    if journal and (delete_batches or add_batches):
+        await journal.begin(
+            [JournalBatch("delete", ids, item_ids) for item_ids, ids in delete_batches]
+            + [JournalBatch("add", [], list({d.metadata["item_id"]: None for d in docs})) for docs in add_batches]
+        )
+
+    tasks: list[asyncio.Task] = []
+    deleted_items: dict[str, asyncio.Task] = {}
+    for batch, (item_ids, ids) in enumerate(delete_batches):
+        task = asyncio.create_task(_run("delete", len(ids), batch, delete, ids))
+        deleted_items.update(dict.fromkeys(item_ids, task))
+        tasks.append(task)
+
+    for i in range(0, len(changes.ids_update_last_seen), TOUCH_BATCH_SIZE):
+        ids = changes.ids_update_last_seen[i : i + TOUCH_BATCH_SIZE]
+        tasks.append(asyncio.create_task(_run("touch", len(ids), None, update_last_seen_at, ids)))
+
+    for batch, documents in enumerate(add_batches, start=len(delete_batches)):
+        wait_for = list({id(t): t for d in documents if (t := deleted_items.get(d.metadata["item_id"]))}.values())
+        tasks.append(asyncio.create_task(_add(documents, batch, wait_for)))
+
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        if journal:
+            await journal.save_done()
+        raise
+
+    Actor.log.info("Deleted %s, added %s and updated last_seen_at of %s objects", done["delete"], done["add"], done["touch"])
+
+
+async def recover_from_journal(vector_store: VectorDb, journal: DeltaJournal, manifest: DeltaManifest | None = None) -> None:
+    """Recover pending batches of an unfinished run, so that every item is either fully stored or absent.
+
+    Pending deletes are replayed and items of pending adds (possibly partially added) are deleted by item_id and from the manifest.
+    With a manifest, items of completed adds are recovered as well, the run might have failed before their chunk_ids were saved
+    to the manifest. The delta comparison then finds them missing and adds them as new items when they are crawled.
+    All operations are idempotent, the journal is cleared last, so a failed recovery is repeated by the next run.
+    """
+    if not journal.batches:
+        return
+    pending = journal.pending
+    Actor.log.warning("Delta journal: the previous run did not finish, recovering %s of %s batches", len(pending), len(journal.batches))
+    for batch in pending:
+        if batch.op == "delete":
+            await asyncio.to_thread(vector_store.delete, batch.ids)
+
+    add_batches = journal.batches if manifest else pending
+    item_ids = list({item_id: None for batch in add_batches if batch.op == "add" for item_id in batch.item_ids})
+    for i in range(0, len(item_ids), vector_store.get_by_item_ids_batch_size):
+        await asyncio.to_thread(vector_store.delete_by_item_ids, item_ids[i : i + vector_store.get_by_item_ids_batch_size])
+    if manifest and item_ids:
+        for item_id in item_ids:
+            await manifest.delete(item_id)
+        await manifest.save()
+    await journal.commit()
+    Actor.log.info("Delta journal: recovered, deleted %s items with pending adds (to be added again)", len(item_ids))
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import asyncio
+import math
+from typing import TYPE_CHECKING, NamedTuple
+
+import numpy as np
+from apify import Actor
+
+from .liveness import hash_item_ids
+from .pipeline import DeltaChanges
+from .vcs import (
+    acompare_crawled_data_with_db,
+    aget_by_item_ids_batches,
+    aget_manifest_entries,
+    can_scan_metadata,
+    get_document_id,
+    get_manifest_changes,
+)
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+    from ._types import VectorDb
+    from .bloom import ItemIdsBloomFilter
+    from .liveness import SeenItemsStore
+    from .manifest import DeltaManifest
+
+DRY_RUN_PLAN_KEY = "DRY_RUN_PLAN"
+
+# Rough number of characters per token of English text, used to estimate embedding tokens without a tokenizer
+CHARS_PER_TOKEN = 4
+
+# Price of embeddings in USD per 1M tokens (list prices, used only for the estimate)
+EMBEDDING_PRICES_PER_1M_TOKENS = {
+    "text-embedding-3-small": 0.02,
+    "text-embedding-3-large": 0.13,
+    "text-embedding-ada-002": 0.10,
+    "embed-english-v3.0": 0.10,
+    "embed-multilingual-v3.0": 0.10,
+    "embed-english-light-v3.0": 0.10,
+    "embed-multilingual-light-v3.0": 0.10,
+    "embed-v4.0": 0.12,
+}
+
+
+class DeltaPlan(NamedTuple):
+    """Summary of the changes a run would make to the database (see plan_run)."""
+
+    strategy: str
+    items: int
+    chunks: int
+    add: int
+    delete: int
+    touch: int
+    expire: int
+    # How expired objects were counted: "count" (filtered count in the database), "scan" (of all metadata) or None (not counted)
+    expire_counted_by: str | None
+    embedding_model: str | None
+    embedding_tokens: int
+    embedding_cost_usd: float | None
+    write_requests: dict[str, int]
+
+
+def estimate_tokens(documents: list[Document]) -> int:
+    return sum(math.ceil(len(d.page_content) / CHARS_PER_TOKEN) for d in documents)
+
+
+def estimate_write_requests(vector_store: VectorDb, n_objects: dict[str, int]) -> dict[str, int]:
+    """Estimate the number of write requests from the number of objects per operation and vector_store.write_batch_sizes."""
+    return {op: math.ceil(n / vector_store.write_batch_sizes[op]) if n else 0 for op, n in n_objects.items()}
+
+
+async def plan_run(
+    vector_store: VectorDb,
+    documents: list[Document],
+    strategy: str,
+    embedding_model: str | None,
+    timestamp_expired: int = 0,
+    seen_items: SeenItemsStore | None = None,
+    *,
+    manifest: DeltaManifest | None = None,
+    reconcile: bool = False,
+    bloom_filter: ItemIdsBloomFilter | None = None,
+) -> DeltaPlan:
+    """Compare crawled data with the database and return the plan of changes and its cost, nothing is embedded or written.
+
+    Delta updates are compared the same way a real run does: with the delta manifest (unless it is new or reconciled),
+    otherwise with the database, looking up only item_ids in the Bloom filter. Neither the manifest nor the Bloom filter is modified.
+    Expired objects are counted (only when timestamp_expired is set) by a filtered count in the database, with seen items
+    or without a filtered count (Chroma, Pinecone) by a scan of the database metadata.
+    """
+    changes = DeltaChanges(documents, [], {})
+    if strategy == "deltaUpdates" and manifest and not (reconcile or manifest.is_empty):
+        changes = get_manifest_changes(documents, await aget_manifest_entries(manifest, documents))
+    elif strategy == "deltaUpdates":
+        changes = await acompare_crawled_data_with_db(vector_store, documents, bloom_filter=None if manifest else bloom_filter)
+    elif strategy == "upsert":
+        changes = await acompare_crawled_data_with_db(vector_store, documents)
+    if strategy == "upsert":
+        # Upsert deletes all database objects of the crawled items (changed and unchanged) and adds all crawled objects
+        changes = DeltaChanges(documents, [], {"*": changes.ids_delete_flat + changes.ids_update_last_seen})
+    n_delete = len(changes.ids_delete_flat)
+    n_touch = 0 if seen_items else len(changes.ids_update_last_seen)
+
+    n_expire, expire_counted_by = 0, None
+    seen = await get_seen(seen_items, timestamp_expired) if timestamp_expired else None
+    if timestamp_expired and (seen is None or len(seen)):
+        n_expire, expire_counted_by = await acount_expired(vector_store, documents, changes, timestamp_expired, seen)
+
+    tokens = estimate_tokens(changes.data_add)
+    price = EMBEDDING_PRICES_PER_1M_TOKENS.get(embedding_model or "")
+    return DeltaPlan(
+        strategy=strategy,
+        items=len({d.metadata["item_id"] for d in documents}),
+        chunks=len(documents),
+        add=len(changes.data_add),
+        delete=n_delete,
+        touch=n_touch,
+        expire=n_expire,
+        expire_counted_by=expire_counted_by,
+        embedding_model=embedding_model,
+        embedding_tokens=tokens,
+        embedding_cost_usd=round(tokens / 1_000_000 * price, 4) if price is not None else None,
+        write_requests=estimate_write_requests(vector_store, {"add": len(changes.data_add), "delete": n_delete + n_expire, "touch": n_touch}),
+    )
+
+
+async def get_seen(seen_items: SeenItemsStore | None, timestamp_expired: int) -> np.ndarray | None:
+    """Return digests of item_ids seen since timestamp_expired, an empty array if the generations do not cover the period yet (nothing expires)."""
+    if not seen_items:
+        return None
+    if not seen_items.covers(timestamp_expired):
+        return np.zeros(0, dtype=np.uint64)
+    return await seen_items.get_seen_since(timestamp_expired)
+
+
+async def acount_expired(
+    vector_store: VectorDb, documents: list[Document], changes: DeltaChanges, timestamp_expired: int, seen: np.ndarray | None
+) -> tuple[int, str | None]:
+    """Count objects that would be deleted as expired and return the count with how it was counted (see DeltaPlan.expire_counted_by).
+
+    The filtered count of the database includes objects of the crawled items, these are touched or deleted by the run (not expired),
+    hence their expired objects are looked up by item_id and subtracted. Seen items are not stored in the database, they need a scan.
+    """
+    if seen is None and (n_expired := await asyncio.to_thread(vector_store.count_expired, timestamp_expired)) is not None:
+        n_crawled = 0
+
+        def _count_crawled(batch: list[Document]) -> None:
+            nonlocal n_crawled
+            n_crawled += sum(1 for d in batch if d.metadata.get("last_seen_at") is not None and int(d.metadata["last_seen_at"]) < timestamp_expired)
+
+        await aget_by_item_ids_batches(vector_store, documents, _count_crawled)
+        Actor.log.info("Dry run: %s objects would be expired (filtered count)", n_expired - n_crawled)
+        return n_expired - n_crawled, "count"
+
+    if not can_scan_metadata(vector_store):
+        Actor.log.warning("Dry run: expired objects are not counted, the database has no filtered count and its metadata cannot be scanned")
+        return 0, None
+    return await asyncio.to_thread(count_expired, vector_store, documents, changes, timestamp_expired, seen), "scan"
+
+
+def count_expired(vector_store: VectorDb, documents: list[Document], changes: DeltaChanges, timestamp_expired: int, seen: np.ndarray | None) -> int:
+    """Count objects that would be deleted as expired after the changes are applied.
+
+    With last_seen_at, objects not seen since timestamp_expired are expired unless they are updated (touched) or deleted by this run.
+    With seen items (generation-based liveness), objects of items not seen since timestamp_expired nor by this run are expired.
+    """
+    crawled_item_ids = {d.metadata["item_id"] for d in documents}
+    touched_or_deleted = set(changes.ids_update_last_seen) | set(changes.ids_delete_flat)
+    n_expired = 0
+    for batch in vector_store.iter_metadata():
+        if seen is not None:
+            item_ids = [d.metadata.get("item_id", "") for d in batch]
+            unseen = ~np.isin(hash_item_ids(item_ids), seen)
+            n_expired += sum(1 for item_id, u in zip(item_ids, unseen) if u and item_id not in crawled_item_ids)
+        else:
+            # Objects without last_seen_at are not matched by the expiry filter of the database
+            n_expired += sum(
+                1
+                for d in batch
+                if d.metadata.get("last_seen_at") is not None
+                and int(d.metadata["last_seen_at"]) < timestamp_expired
+                and get_document_id(d) not in touched_or_deleted
+            )
+    Actor.log.info("Dry run: %s objects would be expired", n_expired)
+    return n_expired
@@ -1,14 +1,19 @@
 from __future__ import annotations
 
+import asyncio
 import concurrent.futures
 import datetime
 from collections import defaultdict
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Callable
 
+import numpy as np
 from apify import Actor
-from langchain_core.documents import Document
-from langchain_core.vectorstores import VectorStore
 
+from .bloom import ItemIdsBloomFilter
+from .constants import DELTA_UPDATES_CONCURRENCY, DELTA_UPDATES_FULL_SCAN_MIN_COVERAGE, DELTA_UPDATES_REQUEST_TIMEOUT_SECS
+from .diff import ChunkColumns, compute_diff, get_document_id
+from .liveness import hash_item_ids
+from .manifest import ManifestEntry
 from .models import (
     ChromaIntegration,
     MilvusIntegration,
@@ -18,13 +23,18 @@ from .models import (
     QdrantIntegration,
     WeaviateIntegration,
 )
-from .utils import get_chunks_to_delete, get_chunks_to_update
+from .pipeline import DeltaChanges, apply_changes_pipelined
 
 if TYPE_CHECKING:
-    from langchain.vectorstores import VectorStore
+    from collections.abc import Awaitable
+
+    from langchain_core.documents import Document
     from langchain_core.embeddings import Embeddings
 
     from ._types import ActorInputsDb, VectorDb
+    from .journal import DeltaJournal
+    from .liveness import SeenItemsStore
+    from .manifest import DeltaManifest
 
 
 async def get_vector_database(actor_input: ActorInputsDb | None, embeddings: Embeddings) -> VectorDb:
@@ -73,6 +83,39 @@ def update_db_with_crawled_data(vector_store: VectorDb, documents: list[Document
 
     Actor.log.info("Comparing crawled data with the database ...")
     data_add, ids_update_last_seen, ids_del = compare_crawled_data_with_db(vector_store, documents)
+    apply_crawled_data_changes(vector_store, data_add, ids_update_last_seen, ids_del)
+
+
+async def aupdate_db_with_crawled_data(
+    vector_store: VectorDb,
+    documents: list[Document],
+    concurrency: int = DELTA_UPDATES_CONCURRENCY,
+    timeout_secs: float = DELTA_UPDATES_REQUEST_TIMEOUT_SECS,
+    bloom_filter: ItemIdsBloomFilter | None = None,
+    *,
+    touch: bool = True,
+    journal: DeltaJournal | None = None,
+    before_write: Callable[[], Awaitable[None]] | None = None,
+) -> None:
+    """Update the database with new crawled data, comparing the crawled data with the database asynchronously.
+
+    When touch is False, last_seen_at of unchanged objects is not updated (liveness is tracked by SeenItemsStore).
+    Changes are recorded in the journal (if given) before they are written.
+    before_write is awaited after the comparison and before the first write (e.g. to save crawled item_ids to the Bloom filter).
+    """
+
+    Actor.log.info("Comparing crawled data with the database (concurrency: %s, request timeout: %ss) ...", concurrency, timeout_secs)
+    changes = await acompare_crawled_data_with_db(vector_store, documents, concurrency, timeout_secs, bloom_filter)
+    if before_write:
+        await before_write()
+    await apply_changes_pipelined(vector_store, changes if touch else changes._replace(ids_update_last_seen=[]), journal)
+    if journal and journal.batches:
+        await journal.commit()
+
+
+def apply_crawled_data_changes(vector_store: VectorDb, data_add: list[Document], ids_update_last_seen: list[str], ids_del: list[str]) -> None:
+    """Delete changed objects, add new objects and update last_seen_at of unchanged objects."""
+
     Actor.log.info("Objects: to add: %s, to update last_seen_at: %s, to delete: %s", len(data_add), len(ids_update_last_seen), len(ids_del))
 
     # Delete data that were updated
@@ -93,11 +136,15 @@ def update_db_with_crawled_data(vector_store: VectorDb, documents: list[Document
 
 
 def upsert_db_with_crawled_data(vector_store: VectorDb, documents: list[Document]) -> None:
-    """Upsert crawled data into the database by first deleting all documents and then adding all the documents."""
+    """Upsert crawled data into the database by first deleting all documents and then adding all the documents.
+
+    Documents are deleted by distinct item_ids in batches (vector_store.get_by_item_ids_batch_size), batches are deleted concurrently.
+    """
     Actor.log.info("Upsert crawled data into database")
-    Actor.log.info("Delete documents by item_id. This might take a while as documents are deleted one by one.")
-    for d in documents:
-        vector_store.delete_by_item_id(d.metadata["item_id"])
+    batches = get_item_ids_batches(vector_store, documents)
+    Actor.log.info("Delete documents by item_id (%s batches)", len(batches))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=vector_store.pipeline_concurrency["delete"]) as executor:
+        list(executor.map(vector_store.delete_by_item_ids, batches))
     Actor.log.info("Delete documents by item_id. Done")
 
     Actor.log.info("Add documents")
@@ -114,31 +161,139 @@ def delete_expired_objects(vector_store: VectorDb, timestamp_expired: int) -> No
         vector_store.delete_expired(timestamp_expired)
 
 
+async def adelete_expired_objects(vector_store: VectorDb, timestamp_expired: int) -> None:
+    """Delete expired objects from the database asynchronously."""
+
+    if timestamp_expired:
+        dt = datetime.datetime.fromtimestamp(timestamp_expired, tz=datetime.timezone.utc)
+        Actor.log.info("About to delete objects from the database that were not seen since %s (timestamp: %s)", dt, timestamp_expired)
+        await vector_store.adelete_expired(timestamp_expired)
+
+
+async def delete_unseen_items(vector_store: VectorDb, seen_items: SeenItemsStore, timestamp_expired: int) -> None:
+    """Delete items that were not seen by any run since timestamp_expired (generation-based liveness, see liveness.py).
+
+    Item_ids of all database objects are scanned and the unseen ones are deleted by item_ids.
+    Nothing is deleted until the generations cover the whole retention period.
+    """
+    if not timestamp_expired:
+        return
+    if not can_scan_metadata(vector_store):
+        raise ValueError("Seen items (seenItemsKeyValueStoreName) require a scan of the database, which is not supported by this index")
+    if not seen_items.covers(timestamp_expired):
+        Actor.log.info("Seen item_ids are not recorded for the whole retention period yet, no items are expired")
+        return
+
+    seen = await seen_items.get_seen_since(timestamp_expired)
+
+    def _get_unseen() -> list[str]:
+        unseen: dict[str, None] = {}
+        for documents in vector_store.iter_metadata():
+            item_ids = list(dict.fromkeys(d.metadata["item_id"] for d in documents if d.metadata.get("item_id")))
+            unseen.update(dict.fromkeys(i for i, is_seen in zip(item_ids, np.isin(hash_item_ids(item_ids), seen)) if not is_seen))
+        return list(unseen)
+
+    unseen = await asyncio.to_thread(_get_unseen)
+    Actor.log.info("Deleting %s items that were not seen since %s", len(unseen), timestamp_expired)
+    batch_size = vector_store.get_by_item_ids_batch_size
+    for i in range(0, len(unseen), batch_size):
+        await asyncio.to_thread(vector_store.delete_by_item_ids, unseen[i : i + batch_size])
+    await seen_items.delete_older_than(timestamp_expired)
+
+
+def get_item_ids_batches(vector_store: VectorDb, data: list[Document]) -> list[list[str]]:
+    """Split distinct item_ids of the data into batches of vector_store.get_by_item_ids_batch_size."""
+
+    items_ids = list(dict.fromkeys(d.metadata["item_id"] for d in data))
+    batch_size = vector_store.get_by_item_ids_batch_size
+    return [items_ids[i : i + batch_size] for i in range(0, len(items_ids), batch_size)]
+
+
 def get_items_ids_from_db(vector_store: VectorDb, data: list[Document]) -> dict[str, list[Document]]:
-    """Get documents from the database by item_id."""
+    """Get documents from the database by item_id.
 
-    items_ids = {d.metadata["item_id"] for d in data}
+    Item_ids are fetched in batches (vector_store.get_by_item_ids_batch_size) using the native multi-value filter of the database,
+    at most DELTA_UPDATES_CONCURRENCY batches at the same time. Raise an exception if any batch fails, otherwise its items would be treated as new.
+    """
 
-    def _get_item_id(item_id: str) -> tuple[str, list[Document]]:
-        return item_id, vector_store.get_by_item_id(item_id)
+    batches = get_item_ids_batches(vector_store, data)
 
     crawled_db = defaultdict(list)
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future_to_item_id = {executor.submit(_get_item_id, item_id): item_id for item_id in items_ids}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=DELTA_UPDATES_CONCURRENCY) as executor:
+        futures = [executor.submit(vector_store.get_by_item_ids, b) for b in batches]
 
-        for k, future in enumerate(concurrent.futures.as_completed(future_to_item_id)):
-            item_id = future_to_item_id[future]
-            if k % 1000 == 0:
-                Actor.log.info("Processing item_id %s (%d/%d) to compare crawled data with the database", item_id, k, len(items_ids))
-            try:
-                item_id, documents = future.result()
-                crawled_db[item_id].extend(documents)
-            except Exception as e:
-                Actor.log.error("Item_id %s generated an error", item_id, e)
+        for k, future in enumerate(concurrent.futures.as_completed(futures)):
+            if k % 100 == 0:
+                Actor.log.info("Processing item_ids batch (%d/%d) to compare crawled data with the database", k, len(batches))
+            for doc in future.result():
+                crawled_db[doc.metadata["item_id"]].append(doc)
 
     return dict(crawled_db)
 
 
+async def aget_items_ids_from_db(
+    vector_store: VectorDb,
+    data: list[Document],
+    concurrency: int = DELTA_UPDATES_CONCURRENCY,
+    timeout_secs: float = DELTA_UPDATES_REQUEST_TIMEOUT_SECS,
+) -> dict[str, list[Document]]:
+    """Get documents from the database by item_id asynchronously."""
+
+    crawled_db = defaultdict(list)
+
+    def _add(documents: list[Document]) -> None:
+        for doc in documents:
+            crawled_db[doc.metadata["item_id"]].append(doc)
+
+    await aget_by_item_ids_batches(vector_store, data, _add, concurrency, timeout_secs)
+    return dict(crawled_db)
+
+
+async def aget_db_chunk_columns(
+    vector_store: VectorDb,
+    data: list[Document],
+    concurrency: int = DELTA_UPDATES_CONCURRENCY,
+    timeout_secs: float = DELTA_UPDATES_REQUEST_TIMEOUT_SECS,
+) -> ChunkColumns:
+    """Get columns (item_id, checksum, id) of database chunks of the crawled item_ids. Documents are released as soon as a batch is processed."""
+
+    columns = ChunkColumns()
+    await aget_by_item_ids_batches(vector_store, data, columns.extend, concurrency, timeout_secs)
+    return columns
+
+
+async def aget_by_item_ids_batches(
+    vector_store: VectorDb,
+    data: list[Document],
+    process_batch: Callable[[list[Document]], None],
+    concurrency: int = DELTA_UPDATES_CONCURRENCY,
+    timeout_secs: float = DELTA_UPDATES_REQUEST_TIMEOUT_SECS,
+) -> None:
+    """Get documents from the database by item_id asynchronously and process every batch of documents once it is fetched.
+
+    At most `concurrency` batches are requested at the same time and each request is limited by `timeout_secs`.
+    Raise an exception if any batch fails or times out, otherwise its items would be treated as new.
+    """
+
+    batches = get_item_ids_batches(vector_store, data)
+    semaphore = asyncio.Semaphore(concurrency)
+    done = 0
+
+    async def _get(item_ids: list[str]) -> None:
+        nonlocal done
+        async with semaphore:
+            try:
+                documents = await asyncio.wait_for(vector_store.aget_by_item_ids(item_ids), timeout=timeout_secs)
+            except asyncio.TimeoutError as e:
+                raise TimeoutError(f"Getting {len(item_ids)} item_ids (starting with {item_ids[0]}) timed out after {timeout_secs}s") from e
+        if done % 100 == 0:
+            Actor.log.info("Processing item_ids batch (%d/%d) to compare crawled data with the database", done, len(batches))
+        done += 1
+        process_batch(documents)
+
+    await asyncio.gather(*[_get(b) for b in batches])
+
+
 def compare_crawled_data_with_db(vector_store: VectorDb, data: list[Document]) -> tuple[list[Document], list[str], list[str]]:
     """Compare current crawled data with the data in the database. Return data to add, delete and update.
 
@@ -146,70 +301,217 @@ def compare_crawled_data_with_db(vector_store: VectorDb, data: list[Document]) -
     Data that was not changed -> update metadata last_seen_at
     Data that was changed -> delete and add new
     """
-    data_add = []
-    ids_delete: set[str] = set()
-    ids_update_last_seen: set[str] = set()
-
-    if hasattr(vector_store, "count") and vector_store.count() == 0:
+    count = vector_store.count() if hasattr(vector_store, "count") else None
+    if count == 0:
         return data, [], []
 
-    crawled_db = get_items_ids_from_db(vector_store, data)
-
-    for d in data:
-        if res := crawled_db.get(d.metadata["item_id"]):
-            if d.metadata["checksum"] in {r.metadata["checksum"] for r in res}:
-                # Because of weaviate database, we need to use chunk_id instead of id
-                ids_update_last_seen.update({r.metadata.get("id") or r.metadata.get("chunk_id", ""): r for r in res})
-            else:
-                ids_delete.update({r.metadata.get("id") or r.metadata.get("chunk_id", ""): r for r in res})
-                data_add.append(d)
-        else:
-            data_add.append(d)
+    if count is not None and can_scan_metadata(vector_store) and should_scan_database(count, data):
+        changes = get_chunk_changes(data, get_db_chunk_columns_by_scan(vector_store, data))
+    else:
+        changes = get_crawled_data_changes(data, get_items_ids_from_db(vector_store, data))
+    return changes.data_add, changes.ids_update_last_seen, changes.ids_delete_flat
 
-    return data_add, list(ids_update_last_seen), list(ids_delete)
 
+async def acompare_crawled_data_with_db(
+    vector_store: VectorDb,
+    data: list[Document],
+    concurrency: int = DELTA_UPDATES_CONCURRENCY,
+    timeout_secs: float = DELTA_UPDATES_REQUEST_TIMEOUT_SECS,
+    bloom_filter: ItemIdsBloomFilter | None = None,
+) -> DeltaChanges:
+    """Compare current crawled data with the data in the database asynchronously. Return data to add, delete (grouped by item_id) and update.
 
-async def update_db_with_crawled_data_using_internal_cache(
-    vector_store: VectorStore, documents: list[Document], cache_key_name: str, cache_kv_store_name: str, expired_days: float
-) -> None:
+    When the crawled items cover a large part of the database, metadata of all objects is scanned instead of lookups by item_id.
+    If a Bloom filter of item_ids in the database is given, only item_ids that might be in the database are looked up, other items are new.
     """
-    Updates the vector store with new documents and removes outdated ones.
 
-    This function uses Apify's key-value store to handle documents. Each document, along with its metadata,
-    is hashed and stored as a key in the key-value store.
+    count = await asyncio.to_thread(vector_store.count) if hasattr(vector_store, "count") else None
+    if count == 0:
+        return DeltaChanges(data, [], {})
+
+    if count is not None and can_scan_metadata(vector_store) and should_scan_database(count, data):
+        return get_chunk_changes(data, await asyncio.to_thread(get_db_chunk_columns_by_scan, vector_store, data))
+
+    lookup_data = filter_by_bloom_filter(data, bloom_filter) if bloom_filter else data
+    return get_chunk_changes(data, await aget_db_chunk_columns(vector_store, lookup_data, concurrency, timeout_secs))
+
 
-    The function performs a comparison between the current set of documents and the set from the previous runs.
-    It identifies new documents and those no longer present. New documents are added to the vector store, while
-    documents older than the specified 'expired_days' are removed.
+def can_scan_metadata(vector_store: VectorDb) -> bool:
+    return getattr(vector_store, "supports_metadata_scan", True)
+
+
+def should_scan_database(db_count: int, data: list[Document]) -> bool:
+    """Return True if a scan of all database objects is cheaper than lookups of the crawled item_ids.
+
+    The number of items in the database is estimated from the number of objects and the average number of chunks per crawled item.
     """
+    if not data:
+        return False
+    n_items = len({d.metadata["item_id"] for d in data})
+    db_items = db_count * n_items / len(data)
+    return n_items >= DELTA_UPDATES_FULL_SCAN_MIN_COVERAGE * db_items
+
+
+def get_db_chunk_columns_by_scan(vector_store: VectorDb, data: list[Document]) -> ChunkColumns:
+    """Scan metadata of all database objects and return columns of chunks of the crawled item_ids."""
+
+    Actor.log.info("Crawled items cover a large part of the database, scanning metadata of all objects ...")
+    item_ids = {d.metadata["item_id"] for d in data}
+    columns = ChunkColumns()
+    n_scanned = 0
+    for documents in vector_store.iter_metadata():
+        columns.extend(d for d in documents if d.metadata.get("item_id") in item_ids)
+        n_scanned += len(documents)
+    Actor.log.info("Scanned %s objects, %s of them belong to the crawled items", n_scanned, len(columns))
+    return columns
+
+
+async def aget_bloom_filter_from_db(vector_store: VectorDb) -> ItemIdsBloomFilter:
+    """Create a Bloom filter of all item_ids in the database by scanning metadata of all objects."""
+
+    def _scan() -> ItemIdsBloomFilter:
+        bloom_filter = ItemIdsBloomFilter()
+        for documents in vector_store.iter_metadata():
+            bloom_filter.add_many([d.metadata["item_id"] for d in documents if d.metadata.get("item_id")])
+        return bloom_filter
+
+    return await asyncio.to_thread(_scan)
+
+
+def filter_by_bloom_filter(data: list[Document], bloom_filter: ItemIdsBloomFilter) -> list[Document]:
+    """Return documents whose item_id might be in the database (false positives are resolved by the database lookup)."""
+
+    item_ids = list(dict.fromkeys(d.metadata["item_id"] for d in data))
+    maybe_in_db = {item_id for item_id, present in zip(item_ids, bloom_filter.contains_many(item_ids)) if present}
+    Actor.log.info("Bloom filter: %s of %s crawled item_ids might be in the database, other item_ids are new", len(maybe_in_db), len(item_ids))
+    return [d for d in data if d.metadata["item_id"] in maybe_in_db]
+
+
+def get_crawled_data_changes(data: list[Document], crawled_db: dict[str, list[Document]]) -> DeltaChanges:
+    """Compare crawled data with the documents found in the database (grouped by item_id). Return data to add, delete and update."""
+
+    return get_chunk_changes(data, ChunkColumns.from_documents(doc for docs in crawled_db.values() for doc in docs))
+
+
+def get_chunk_changes(data: list[Document], db: ChunkColumns) -> DeltaChanges:
+    """Compare crawled data with the columns of database chunks (see diff.compute_diff). Return data to add, delete and update."""
 
-    Actor.log.info("Load previous cache %s from the key-value store: %s", cache_key_name, cache_kv_store_name)
+    crawled = ChunkColumns.from_documents(data)
+    add, touch, delete = compute_diff(crawled, db)
+    data_add = [data[i] for i in np.flatnonzero(add)]
+    ids_update_last_seen = list(dict.fromkeys(db.ids[i] for i in np.flatnonzero(touch)))
 
-    kv_store = await Actor.open_key_value_store(name=cache_kv_store_name)
-    previous_runs = await kv_store.get_value(cache_key_name) or {}
-    previous_runs = [Document.parse_obj(doc) for doc in previous_runs]
-    Actor.log.info("Previous runs contains: %s records", len(previous_runs))
+    # Every deleted item has a changed chunk in data_add, map item_id digests back to item_ids
+    crawled_item_ids, db_item_ids = crawled.item_ids, db.item_ids
+    item_ids = {crawled_item_ids[i]: data[i].metadata["item_id"] for i in np.flatnonzero(add)}
+    ids_delete: dict[str, list[str]] = defaultdict(list)
+    for i in np.flatnonzero(delete):
+        ids_delete[item_ids[db_item_ids[i]]].append(db.ids[i])
+    return DeltaChanges(data_add, ids_update_last_seen, {k: list(dict.fromkeys(v)) for k, v in ids_delete.items()})
 
-    chunks_to_add, chunks_to_update = get_chunks_to_update(previous_runs, documents)
-    chunks_to_delete, chunks_old_keep = get_chunks_to_delete(previous_runs, documents, expired_days=expired_days)
 
-    Actor.log.info("Chunks to add: %s, chunks to update last_seen metadata: %s", len(chunks_to_add), len(chunks_to_update))
-    Actor.log.info("Chunks to delete: %s", len(chunks_to_delete))
+async def aupdate_db_with_manifest(
+    vector_store: VectorDb,
+    documents: list[Document],
+    manifest: DeltaManifest,
+    *,
+    reconcile: bool = False,
+    concurrency: int = DELTA_UPDATES_CONCURRENCY,
+    timeout_secs: float = DELTA_UPDATES_REQUEST_TIMEOUT_SECS,
+    touch: bool = True,
+    journal: DeltaJournal | None = None,
+) -> None:
+    """Update the database with new crawled data using the delta manifest instead of querying the database.
 
-    if chunks_to_delete:
-        vector_store.delete(ids=[x.metadata["id"] for x in chunks_to_delete if x.metadata["id"]])
-        Actor.log.info("Deleted %s from database", len(chunks_to_delete))
+    When the manifest is new or reconcile is True, the crawled data is compared with the database and the manifest entries
+    of the crawled items are rebuilt from the database state. When touch is False, last_seen_at of unchanged objects is not updated.
+    """
 
-    if chunks_to_add:
-        inserted = vector_store.add_documents(chunks_to_add, ids=[x.metadata["id"] for x in chunks_to_add if x.metadata["id"]])
-        Actor.log.info("Added %s documents to the vector store", len(inserted))
+    if reconcile or manifest.is_empty:
+        Actor.log.info("Reconciling delta manifest: comparing crawled data with the database ...")
+        crawled_db = await aget_items_ids_from_db(vector_store, documents, concurrency, timeout_secs)
+        changes = get_crawled_data_changes(documents, crawled_db)
+        stored = {item_id: ManifestEntry(res[0].metadata["checksum"], [get_document_id(r) for r in res], 0) for item_id, res in crawled_db.items()}
+        manifest.mark_reconciled()
     else:
-        Actor.log.info("No new documents to add")
+        Actor.log.info("Comparing crawled data with the delta manifest ...")
+        stored = await aget_manifest_entries(manifest, documents)
+        changes = get_manifest_changes(documents, stored)
+
+    await apply_changes_pipelined(vector_store, changes if touch else changes._replace(ids_update_last_seen=[]), journal)
+
+    added = {id(d) for d in changes.data_add}
+    for item_id, docs in group_by_item_id(documents).items():
+        checksum, last_seen_at = docs[0].metadata["checksum"], docs[0].metadata["last_seen_at"]
+        if any(id(d) in added for d in docs):
+            chunk_ids = [get_stored_chunk_id(vector_store, d) for d in docs if id(d) in added]
+        else:
+            chunk_ids = stored[item_id].chunk_ids
+        await manifest.set(item_id, ManifestEntry(checksum, chunk_ids, last_seen_at))
+    await manifest.save()
+    # The journal is cleared only after the manifest is saved, otherwise added chunks (random chunk_ids) would be missing in the manifest
+    if journal and journal.batches:
+        await journal.commit()
+
+
+async def aget_manifest_entries(manifest: DeltaManifest, data: list[Document]) -> dict[str, ManifestEntry]:
+    """Return the manifest entries of the crawled items stored in the database."""
+    return {item_id: entry for item_id in {d.metadata["item_id"] for d in data} if (entry := await manifest.get(item_id))}
+
+
+def get_manifest_changes(data: list[Document], stored: dict[str, ManifestEntry]) -> DeltaChanges:
+    """Compare crawled data with the manifest entries. Return data to add, delete and update."""
+
+    data_add = []
+    ids_delete: dict[str, list[str]] = {}
+    ids_update_last_seen: list[str] = []
+
+    for item_id, docs in group_by_item_id(data).items():
+        if (entry := stored.get(item_id)) and entry.checksum in {d.metadata["checksum"] for d in docs}:
+            ids_update_last_seen.extend(entry.chunk_ids)
+            continue
+        if entry:
+            ids_delete[item_id] = entry.chunk_ids
+        data_add.extend(docs)
+
+    return DeltaChanges(data_add, ids_update_last_seen, ids_delete)
 
-    # update cache
-    if current_cache := chunks_to_add + chunks_to_update + chunks_old_keep:
-        await kv_store.set_value(cache_key_name, current_cache)
-        Actor.log.info("Updated cache: %s in the key-value store with %s entries", cache_key_name, len(current_cache))
 
-        Actor.log.info("Push chunked data to the unnamed output dataset")
-        await Actor.push_data([doc.dict() for doc in current_cache])
+def group_by_item_id(data: list[Document]) -> dict[str, list[Document]]:
+    grouped = defaultdict(list)
+    for d in data:
+        grouped[d.metadata["item_id"]].append(d)
+    return dict(grouped)
+
+
+def get_stored_chunk_id(vector_store: VectorDb, doc: Document) -> str:
+    """Return the id under which the document is stored in the database (Pinecone might prefix it with item_id)."""
+    if hasattr(vector_store, "create_prefix_id_from_item_id_chunk_id"):
+        return str(vector_store.create_prefix_id_from_item_id_chunk_id(doc))
+    return str(doc.metadata["chunk_id"])
+
+
+async def delete_expired_from_manifest(manifest: DeltaManifest, timestamp_expired: int) -> None:
+    """Remove expired entries from the manifest (the objects are deleted from the database by delete_expired_objects)."""
+
+    if timestamp_expired:
+        chunk_ids = await manifest.delete_expired(timestamp_expired)
+        Actor.log.info("Removed %s expired chunks from the delta manifest", len(chunk_ids))
+        await manifest.save()
+
+
+async def migrate_manifest_to_id_prefix(manifest: DeltaManifest) -> int:
+    """Prefix chunk_ids of the manifest entries with item_id (item_id#chunk_id) the same way the Pinecone id prefix migration does.
+
+    Otherwise unchanged items would be touched and changed items deleted under the old ids. Return the number of updated entries.
+    """
+
+    n_updated = 0
+    async for item_id, entry in manifest.items():
+        chunk_ids = [chunk_id if "#" in chunk_id else f"{item_id}#{chunk_id}" for chunk_id in entry.chunk_ids]
+        if chunk_ids != entry.chunk_ids:
+            await manifest.set(item_id, entry._replace(chunk_ids=chunk_ids))
+            n_updated += 1
+    Actor.log.info("Migrated chunk_ids of %s delta manifest entries to the id prefix", n_updated)
+    await manifest.save()
+    return n_updated
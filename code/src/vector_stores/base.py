@@ -1,35 +1,182 @@
 from __future__ import annotations
 
+import asyncio
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, ClassVar, TypeVar
+
+from apify import Actor
 
 if TYPE_CHECKING:
+    from collections.abc import Awaitable, Iterator
+
     from langchain_core.documents import Document
+    from langchain_core.embeddings import Embeddings
 
 BACKOFF_MAX_TIME_SECONDS = 900
 BACKOFF_MAX_TIME_DELETE_SECONDS = 900  # 15 minutes (if many objects were added it takes time to search in the database)
 
+# Bit-packed embedding types (see emb.EMBEDDING_TYPE_DTYPES)
+BINARY_EMBEDDING_TYPES = {"binary", "ubinary"}
+
+# Number of objects returned by a single request of the metadata export (iter_metadata)
+METADATA_EXPORT_BATCH_SIZE = 1_000
+
+# Default number of concurrent requests of a single update_last_seen_at call
+TOUCH_CONCURRENCY = 8
+
+T = TypeVar("T")
+R = TypeVar("R")
+
 
 class VectorDbBase(ABC):
     # only for testing purposes (to wait for the index to be updated, e.g. in Pinecone)
     unit_test_wait_for_index = 0
 
+    # Number of item_ids fetched in a single get_by_item_ids request (tuned per database)
+    get_by_item_ids_batch_size: ClassVar[int] = 100
+
+    # Maximum number of concurrent delete, add (including embeddings) and update last_seen_at requests (see pipeline.py)
+    pipeline_concurrency: ClassVar[dict[str, int]] = {"delete": 2, "add": 2, "touch": 4}
+
+    # Embedding types stored natively by the database (see emb.EMBEDDING_TYPE_DTYPES)
+    native_embedding_types: ClassVar[set[str]] = {"float"}
+
+    # Number of objects added, deleted and touched (last_seen_at updated) by a single request (used to estimate requests of a dry run)
+    write_batch_sizes: ClassVar[dict[str, int]] = {"add": 100, "delete": 1_000, "touch": 1_000}
+
+    # Maximum number of concurrent requests of a single update_last_seen_at call (set by deltaUpdatesTouchConcurrency)
+    touch_concurrency: int = TOUCH_CONCURRENCY
+
+    # True if lookups and writes (aadd_documents, adelete, aupdate_last_seen_at) use an async client on the event loop instead of worker threads
+    use_async_client: bool = False
+
+    # False if iter_metadata is not supported (e.g. Pinecone pod-based indexes), crawled data is then compared by lookups only
+    supports_metadata_scan: bool = True
+
+    def check_embedding_type(self, embeddings: Embeddings) -> str:
+        """Return the embedding type and check that the database is able to store it.
+
+        int8/uint8 vectors are stored as float vectors by databases that do not support them natively.
+        Bit-packed binary vectors are meaningless as float vectors, hence they are rejected.
+        """
+        embedding_type: str = getattr(embeddings, "embedding_type", "float")
+        if embedding_type in self.native_embedding_types:
+            return embedding_type
+        if embedding_type in BINARY_EMBEDDING_TYPES:
+            raise ValueError(
+                f"Embedding type '{embedding_type}' is not supported by {type(self).__name__}. "
+                f"Supported embedding types: {sorted(self.native_embedding_types | {'int8', 'uint8'})}"
+            )
+        Actor.log.warning("Embedding type '%s' is not stored natively by %s, vectors are stored as floats", embedding_type, type(self).__name__)
+        return embedding_type
+
     @abstractmethod
     def get_by_item_id(self, item_id: str) -> list[Document]:
         """Get documents by item_id."""
 
+    @abstractmethod
+    def get_by_item_ids(self, item_ids: list[str]) -> list[Document]:
+        """Get documents by a list of item_ids (at most get_by_item_ids_batch_size item_ids) using a single multi-value filter."""
+
+    async def aget_by_item_ids(self, item_ids: list[str]) -> list[Document]:
+        """Get documents by a list of item_ids asynchronously.
+
+        Databases without an async client run get_by_item_ids in a worker thread.
+        """
+        return await asyncio.to_thread(self.get_by_item_ids, item_ids)
+
+    @staticmethod
+    def get_by_item_ids_within_limit(item_ids: list[str], get_: Callable[[list[str]], list[Document]], limit: int) -> list[Document]:
+        """Get documents by item_ids using a query that returns at most `limit` documents.
+
+        When the limit is reached, the result might be truncated, hence the item_ids are split in halves and queried again.
+        """
+        documents = get_(item_ids)
+        if len(documents) < limit or len(item_ids) <= 1:
+            return documents
+        mid = len(item_ids) // 2
+        return VectorDbBase.get_by_item_ids_within_limit(item_ids[:mid], get_, limit) + VectorDbBase.get_by_item_ids_within_limit(
+            item_ids[mid:], get_, limit
+        )
+
+    @staticmethod
+    async def aget_by_item_ids_within_limit(
+        item_ids: list[str], get_: Callable[[list[str]], Awaitable[list[Document]]], limit: int
+    ) -> list[Document]:
+        """Get documents by item_ids asynchronously using a query that returns at most `limit` documents (see get_by_item_ids_within_limit)."""
+        documents = await get_(item_ids)
+        if len(documents) < limit or len(item_ids) <= 1:
+            return documents
+        mid = len(item_ids) // 2
+        return await VectorDbBase.aget_by_item_ids_within_limit(item_ids[:mid], get_, limit) + await VectorDbBase.aget_by_item_ids_within_limit(
+            item_ids[mid:], get_, limit
+        )
+
+    @abstractmethod
+    def count(self) -> int | None:
+        """Get the number of objects in the database."""
+
+    def count_expired(self, expired_ts: int) -> int | None:  # noqa: ARG002
+        """Count objects not seen since expired_ts by a filtered count in the database, None if it has none (metadata is scanned)."""
+        return None
+
+    @abstractmethod
+    def iter_metadata(self, batch_size: int = METADATA_EXPORT_BATCH_SIZE) -> Iterator[list[Document]]:
+        """Iterate over metadata (item_id, checksum, id) of all objects in the database in batches, without vectors.
+
+        Used to compare crawled data with the database by a single scan instead of lookups by item_ids.
+        """
+
     @abstractmethod
     def update_last_seen_at(self, ids: list[str], last_seen_at: int | None = None) -> None:
         """Update last_seen_at field in the database."""
 
+    async def aupdate_last_seen_at(self, ids: list[str], last_seen_at: int | None = None) -> None:
+        """Update last_seen_at field in the database asynchronously.
+
+        Databases without an async client run update_last_seen_at in a worker thread.
+        """
+        await asyncio.to_thread(self.update_last_seen_at, ids, last_seen_at)
+
+    def run_concurrently(self, func: Callable[[T], R], items: list[T], max_workers: int | None = None) -> list[R]:
+        """Call func for every item using at most max_workers (default touch_concurrency) threads. Return results in order, raise the first exception.
+
+        Used by databases that update objects one by one or limit the size of a single request.
+        """
+        max_workers = max_workers or self.touch_concurrency
+        if len(items) <= 1 or max_workers <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+            return list(executor.map(func, items))
+
+    def flush(self) -> None:
+        """Wait until all writes are applied (databases acknowledging writes before they are applied)."""
+        return
+
+    async def aclose(self) -> None:
+        """Close async clients (databases with native async lookups create them on the first use, bound to the event loop)."""
+        return
+
     @abstractmethod
     def delete_by_item_id(self, item_id: str) -> None:
         """Delete documents by item_id."""
 
+    @abstractmethod
+    def delete_by_item_ids(self, item_ids: list[str]) -> None:
+        """Delete documents by a list of item_ids (at most get_by_item_ids_batch_size item_ids) using a single multi-value filter."""
+
     @abstractmethod
     def delete_expired(self, expired_ts: int) -> None:
         """Delete documents that are older than the ts_expired timestamp."""
 
+    async def adelete_expired(self, expired_ts: int) -> None:
+        """Delete documents that are older than the ts_expired timestamp asynchronously.
+
+        Databases without an async client run delete_expired in a worker thread.
+        """
+        await asyncio.to_thread(self.delete_expired, expired_ts)
+
     @abstractmethod
     def delete_all(self) -> None:
         """Delete all documents from the database (internal function for testing purposes)."""
@@ -1,23 +1,30 @@
 from __future__ import annotations
 
+import asyncio
+import time
 from datetime import datetime, timezone
 from functools import partial
-from typing import TYPE_CHECKING, Any, Iterator, TypeVar
+from typing import TYPE_CHECKING, Any, ClassVar, Iterator, TypeVar
 
 import backoff
 import chromadb
+from apify import Actor
 from chromadb.errors import ChromaError
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
 
-from .base import BACKOFF_MAX_TIME_DELETE_SECONDS, BACKOFF_MAX_TIME_SECONDS, VectorDbBase
+from .base import BACKOFF_MAX_TIME_DELETE_SECONDS, BACKOFF_MAX_TIME_SECONDS, METADATA_EXPORT_BATCH_SIZE, VectorDbBase
 
 if TYPE_CHECKING:
+    from chromadb.api.models.AsyncCollection import AsyncCollection
     from langchain_core.embeddings import Embeddings
 
     from ..models import ChromaIntegration
 
 BATCH_SIZE = 300  # Chroma's default (max) size, number of documents to insert in a single request.
+EMBEDDING_BATCH_SIZE = 1_000  # Number of documents embedded in a single request to the embeddings provider
+ADD_CONCURRENCY = 4  # Number of embedding and insert requests in flight of a single add_documents call
+DELETE_PAGE_SIZE = 1_000  # Number of IDs fetched by a single request of the deletion scans
 
 T = TypeVar("T")
 
@@ -30,7 +37,12 @@ def batch(seq: list[T], size: int) -> Iterator[list[T]]:
 
 
 class ChromaDatabase(Chroma, VectorDbBase):
+    get_by_item_ids_batch_size: ClassVar[int] = 300
+    pipeline_concurrency: ClassVar[dict[str, int]] = {"delete": 2, "add": 2, "touch": 2}
+    write_batch_sizes: ClassVar[dict[str, int]] = {"add": BATCH_SIZE, "delete": BATCH_SIZE, "touch": BATCH_SIZE}
+
     def __init__(self, actor_input: ChromaIntegration, embeddings: Embeddings) -> None:
+        self.check_embedding_type(embeddings)
         # Create HttpClient using partial to handle optional parameters
         client_factory = partial(
             chromadb.HttpClient,
@@ -46,16 +58,24 @@ class ChromaDatabase(Chroma, VectorDbBase):
         if actor_input.chromaApiToken:
             client_factory = partial(client_factory, headers={"x-chroma-token": actor_input.chromaApiToken})
         client = client_factory()
+        # The async client has the same parameters, it is created on the first use as it is bound to the running event loop
+        self.async_client_factory = partial(chromadb.AsyncHttpClient, **client_factory.keywords)
+        self._async_index: AsyncCollection | None = None
+        self.use_async_client = bool(actor_input.chromaUseAsyncClient)
         collection_name = actor_input.chromaCollectionName
+        # A dry run must not create the collection (a missing collection raises an error)
         super().__init__(
             client=client,
             collection_name=collection_name,
             embedding_function=embeddings,
+            create_collection_if_not_exists=not actor_input.dryRun,
         )
         self.client = client
-        self.index = self.client.get_or_create_collection(collection_name)
+        self.index = self.client.get_collection(collection_name) if actor_input.dryRun else self.client.get_or_create_collection(collection_name)
         self._dummy_vector: list[float] = []
         self.batch_size = actor_input.chromaBatchSize or BATCH_SIZE
+        self.embedding_batch_size = actor_input.chromaEmbeddingBatchSize or EMBEDDING_BATCH_SIZE
+        self.add_concurrency = actor_input.chromaBatchConcurrency or ADD_CONCURRENCY
 
     @property
     def dummy_vector(self) -> list[float]:
@@ -77,60 +97,224 @@ class ChromaDatabase(Chroma, VectorDbBase):
             return [Document(page_content="", metadata={**m, "chunk_id": _id}) for _id, m in zip(ids, metadata)]
         return []
 
+    @backoff.on_exception(backoff.expo, ChromaError, max_time=BACKOFF_MAX_TIME_SECONDS)
+    def get_by_item_ids(self, item_ids: list[str]) -> list[Document]:
+        """Get documents by item_ids using the $in filter."""
+
+        results = self.index.get(where={"item_id": {"$in": item_ids}}, include=["metadatas"])  # type: ignore
+        if (ids := results.get("ids")) and (metadata := results.get("metadatas")):
+            return [Document(page_content="", metadata={**m, "chunk_id": _id}) for _id, m in zip(ids, metadata)]
+        return []
+
+    async def get_async_index(self) -> AsyncCollection:
+        """Get the collection of the async client (the client is created on the first call)."""
+        if self._async_index is None:
+            client = await self.async_client_factory()
+            self._async_index = await client.get_or_create_collection(self.index.name)
+        return self._async_index
+
+    @backoff.on_exception(backoff.expo, ChromaError, max_time=BACKOFF_MAX_TIME_SECONDS)
+    async def aget_by_item_ids(self, item_ids: list[str]) -> list[Document]:
+        """Get documents by item_ids using the $in filter and the async client."""
+
+        if not self.use_async_client:
+            return await super().aget_by_item_ids(item_ids)
+        index = await self.get_async_index()
+        results = await index.get(where={"item_id": {"$in": item_ids}}, include=["metadatas"])  # type: ignore
+        if (ids := results.get("ids")) and (metadata := results.get("metadatas")):
+            return [Document(page_content="", metadata={**m, "chunk_id": _id}) for _id, m in zip(ids, metadata)]
+        return []
+
+    def count(self) -> int | None:
+        """Get the number of objects in the collection."""
+        return self.index.count()
+
+    def iter_metadata(self, batch_size: int = METADATA_EXPORT_BATCH_SIZE) -> Iterator[list[Document]]:
+        """Iterate over metadata of all objects, paginated by limit and offset."""
+        offset = 0
+        while True:
+            results = self._get_page(batch_size, offset)
+            ids, metadata = results.get("ids") or [], results.get("metadatas") or []
+            if ids:
+                yield [Document(page_content="", metadata={**m, "chunk_id": _id}) for _id, m in zip(ids, metadata)]
+            if len(ids) < batch_size:
+                return
+            offset += batch_size
+
+    @backoff.on_exception(backoff.expo, ChromaError, max_time=BACKOFF_MAX_TIME_SECONDS)
+    def _get_page(self, limit: int, offset: int) -> Any:
+        return self.index.get(include=["metadatas"], limit=limit, offset=offset)
+
     def add_documents(self, documents: list[Document], **kwargs: Any) -> list[str]:
         """Add documents to the index.
 
-        We need to batch documents to avoid exceeding the maximum request size.
-        Chroma limits the number of records we can insert in a single request to keep the payload small.
+        Documents are embedded in batches of embedding_batch_size and inserted in batches of batch_size, as Chroma limits
+        the number of records we can insert in a single request. Batches are embedded and inserted concurrently (at most add_concurrency
+        requests in flight), documents are processed in windows of add_concurrency embedding batches to bound the memory.
         """
-        inserted_ids: list[str] = []
         batch_size = kwargs.pop("batch_size", self.batch_size)
+        for docs_window in batch(documents, self.embedding_batch_size * self.add_concurrency):
+            start = time.perf_counter()
+            embedding_batches = list(batch([d.page_content for d in docs_window], self.embedding_batch_size))
+            vectors = [v for vs in self.run_concurrently(self._embed_batch, embedding_batches, self.add_concurrency) for v in vs]
+            self.run_concurrently(
+                lambda args: self._upsert_batch(*args), list(zip(batch(docs_window, batch_size), batch(vectors, batch_size))), self.add_concurrency
+            )
+            elapsed = time.perf_counter() - start
+            Actor.log.info("Chroma: embedded and inserted %s documents in %.1fs (%.0f docs/s)", len(docs_window), elapsed, len(docs_window) / elapsed)
+        return [str(doc.metadata["chunk_id"]) for doc in documents]
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        if self.embeddings is None:
+            raise ValueError("ChromaDatabase requires an embedding function")
+        return self.embeddings.embed_documents(texts)
+
+    @backoff.on_exception(backoff.expo, ChromaError, max_time=BACKOFF_MAX_TIME_SECONDS)
+    def _upsert_batch(self, documents: list[Document], vectors: list[list[float]]) -> None:
+        start = time.perf_counter()
+        self.index.upsert(
+            ids=[str(doc.metadata["chunk_id"]) for doc in documents],
+            embeddings=vectors,  # type: ignore[arg-type]
+            metadatas=[doc.metadata for doc in documents],
+            documents=[doc.page_content for doc in documents],
+        )
+        Actor.log.debug("Chroma: inserted batch of %s documents (%.0f docs/s)", len(documents), len(documents) / (time.perf_counter() - start))
 
-        for docs_batch in batch(documents, batch_size):
-            ids = [str(doc.metadata["chunk_id"]) for doc in docs_batch]
-            batch_kwargs = {**kwargs, "ids": ids}
-            inserted_ids.extend(super().add_documents(docs_batch, **batch_kwargs))
-        return inserted_ids
+    async def aadd_documents(self, documents: list[Document], **kwargs: Any) -> list[str]:
+        """Add documents to the index using the async client, batches are embedded and inserted as by add_documents."""
+
+        if not self.use_async_client:
+            return await asyncio.to_thread(self.add_documents, documents, **kwargs)
+        batch_size = kwargs.pop("batch_size", self.batch_size)
+        limit = asyncio.Semaphore(self.add_concurrency)
+
+        async def _limited(coro: Any) -> Any:
+            async with limit:
+                return await coro
+
+        for docs_window in batch(documents, self.embedding_batch_size * self.add_concurrency):
+            start = time.perf_counter()
+            embedding_batches = batch([d.page_content for d in docs_window], self.embedding_batch_size)
+            vectors_batches = await asyncio.gather(*(_limited(self._aembed_batch(texts)) for texts in embedding_batches))
+            vectors = [v for vs in vectors_batches for v in vs]
+            await asyncio.gather(
+                *(_limited(self._aupsert_batch(docs, vs)) for docs, vs in zip(batch(docs_window, batch_size), batch(vectors, batch_size)))
+            )
+            elapsed = time.perf_counter() - start
+            Actor.log.info("Chroma: embedded and inserted %s documents in %.1fs (%.0f docs/s)", len(docs_window), elapsed, len(docs_window) / elapsed)
+        return [str(doc.metadata["chunk_id"]) for doc in documents]
+
+    async def _aembed_batch(self, texts: list[str]) -> list[list[float]]:
+        if self.embeddings is None:
+            raise ValueError("ChromaDatabase requires an embedding function")
+        return await self.embeddings.aembed_documents(texts)
+
+    @backoff.on_exception(backoff.expo, ChromaError, max_time=BACKOFF_MAX_TIME_SECONDS)
+    async def _aupsert_batch(self, documents: list[Document], vectors: list[list[float]]) -> None:
+        index = await self.get_async_index()
+        await index.upsert(
+            ids=[str(doc.metadata["chunk_id"]) for doc in documents],
+            embeddings=vectors,  # type: ignore[arg-type]
+            metadatas=[doc.metadata for doc in documents],
+            documents=[doc.page_content for doc in documents],
+        )
 
     @backoff.on_exception(backoff.expo, ChromaError, max_time=BACKOFF_MAX_TIME_SECONDS)
     def update_last_seen_at(self, ids: list[str], last_seen_at: int | None = None) -> None:
         """Update last_seen_at field in the database.
 
-        Large updates are split into batches (self.batch_size) to avoid oversized requests.
+        Large updates are split into batches (self.batch_size) to avoid oversized requests, the batches are sent concurrently (touch_concurrency).
         """
         if not ids:
             return
 
         last_seen_at = last_seen_at or int(datetime.now(timezone.utc).timestamp())
-        batch_size = self.batch_size
-        for ids_batch in batch(ids, batch_size):
-            self.index.update(ids=ids_batch, metadatas=[{"last_seen_at": last_seen_at} for _ in ids_batch])
+        self.run_concurrently(
+            lambda ids_batch: self.index.update(ids=ids_batch, metadatas=[{"last_seen_at": last_seen_at} for _ in ids_batch]),
+            list(batch(ids, self.batch_size)),
+        )
 
-    @backoff.on_exception(backoff.expo, ChromaError, max_time=BACKOFF_MAX_TIME_DELETE_SECONDS)
-    def delete_expired(self, expired_ts: int) -> None:
-        """Delete expired objects.
+    async def aupdate_last_seen_at(self, ids: list[str], last_seen_at: int | None = None) -> None:
+        """Update last_seen_at field in the database using the async client, batches are sent concurrently (touch_concurrency)."""
 
-        Fetch all expired IDs first, then delete them in batches using the configured batch_size.
-        """
-        r = self.index.get(where={"last_seen_at": {"$lt": expired_ts}}, include=[])  # type: ignore
-        ids: list[str] = r.get("ids") or []
-        if not ids:
+        if not self.use_async_client:
+            await super().aupdate_last_seen_at(ids, last_seen_at)
             return
-        for ids_batch in batch(ids, self.batch_size):
-            self.index.delete(ids=ids_batch)
+        last_seen_at = last_seen_at or int(datetime.now(timezone.utc).timestamp())
+        limit = asyncio.Semaphore(self.touch_concurrency)
 
-    def delete_by_item_id(self, item_id: str) -> None:
-        """Delete documents by item_id.
+        @backoff.on_exception(backoff.expo, ChromaError, max_time=BACKOFF_MAX_TIME_SECONDS)
+        async def _update(ids_batch: list[str]) -> None:
+            async with limit:
+                index = await self.get_async_index()
+                await index.update(ids=ids_batch, metadatas=[{"last_seen_at": last_seen_at} for _ in ids_batch])
+
+        await asyncio.gather(*(_update(ids_batch) for ids_batch in batch(ids, self.batch_size)))
+
+    def delete_where(self, where: dict | None) -> int:
+        """Delete objects matching the where filter (all objects if None) page by page. Return the number of deleted objects.
 
-        Fetch all documents with the given item_id and delete in batches.
+        IDs are fetched in pages of DELETE_PAGE_SIZE and every page is deleted (in batches of batch_size) before the next page is fetched.
+        Deleted objects no longer match the filter, so the next page is always fetched from offset 0. The number of pages
+        is bounded by the collection count, in case the deletes are not visible to the next read immediately.
         """
-        r = self.index.get(where={"item_id": item_id}, include=[])
-        ids: list[str] = r.get("ids") or []
-        if not ids:
+        deleted = 0
+        for _ in range(self.index.count() // DELETE_PAGE_SIZE + 1):
+            ids = self._get_ids_page(where, DELETE_PAGE_SIZE)
+            for ids_batch in batch(ids, self.batch_size):
+                self._delete_ids(ids_batch)
+            deleted += len(ids)
+            if len(ids) < DELETE_PAGE_SIZE:
+                break
+        return deleted
+
+    async def adelete_where(self, where: dict | None) -> int:
+        """Delete objects matching the where filter page by page using the async client (see delete_where)."""
+        index = await self.get_async_index()
+        deleted = 0
+        for _ in range(await index.count() // DELETE_PAGE_SIZE + 1):
+            ids = await self._aget_ids_page(where, DELETE_PAGE_SIZE)
+            await self.adelete(ids=ids)
+            deleted += len(ids)
+            if len(ids) < DELETE_PAGE_SIZE:
+                break
+        return deleted
+
+    @backoff.on_exception(backoff.expo, ChromaError, max_time=BACKOFF_MAX_TIME_SECONDS)
+    def _get_ids_page(self, where: dict | None, limit: int) -> list[str]:
+        return self.index.get(where=where, limit=limit, include=[]).get("ids") or []
+
+    @backoff.on_exception(backoff.expo, ChromaError, max_time=BACKOFF_MAX_TIME_SECONDS)
+    async def _aget_ids_page(self, where: dict | None, limit: int) -> list[str]:
+        index = await self.get_async_index()
+        return (await index.get(where=where, limit=limit, include=[])).get("ids") or []
+
+    @backoff.on_exception(backoff.expo, ChromaError, max_time=BACKOFF_MAX_TIME_DELETE_SECONDS)
+    def _delete_ids(self, ids: list[str]) -> None:
+        self.index.delete(ids=ids)
+
+    def delete_expired(self, expired_ts: int) -> None:
+        """Delete expired objects, expired IDs are fetched and deleted page by page (see delete_where)."""
+        deleted = self.delete_where({"last_seen_at": {"$lt": expired_ts}})
+        Actor.log.info("Chroma: deleted %s expired objects", deleted)
+
+    async def adelete_expired(self, expired_ts: int) -> None:
+        """Delete expired objects using the async client, expired IDs are fetched and deleted page by page."""
+
+        if not self.use_async_client:
+            await super().adelete_expired(expired_ts)
             return
+        deleted = await self.adelete_where({"last_seen_at": {"$lt": expired_ts}})
+        Actor.log.info("Chroma: deleted %s expired objects", deleted)
 
-        for ids_batch in batch(ids, self.batch_size):
-            self.index.delete(ids=ids_batch)
+    def delete_by_item_id(self, item_id: str) -> None:
+        """Delete documents by item_id, IDs are fetched and deleted page by page."""
+        self.delete_where({"item_id": item_id})
+
+    @backoff.on_exception(backoff.expo, ChromaError, max_time=BACKOFF_MAX_TIME_DELETE_SECONDS)
+    def delete_by_item_ids(self, item_ids: list[str]) -> None:
+        """Delete documents by item_ids using the $in filter."""
+        self.index.delete(where={"item_id": {"$in": item_ids}})  # type: ignore
 
     def delete(self, ids: list[str] | None = None, **kwargs: Any) -> None:
         """Delete objects by ids.
@@ -143,15 +327,27 @@ class ChromaDatabase(Chroma, VectorDbBase):
         for ids_batch in batch(ids, self.batch_size):
             super().delete(ids=ids_batch, **kwargs)
 
-    def delete_all(self) -> None:
-        """Delete all objects.
+    @backoff.on_exception(backoff.expo, ChromaError, max_time=BACKOFF_MAX_TIME_DELETE_SECONDS)
+    async def adelete(self, ids: list[str] | None = None, **kwargs: Any) -> None:
+        """Delete objects by ids using the async client, batches are deleted concurrently (touch_concurrency)."""
 
-        Delete the object in batches to avoid exceeding the maximum request size.
-        """
-        r = self.index.get()
-        if r["ids"]:
-            for ids_batch in batch(r["ids"], self.batch_size):
-                self.index.delete(ids=ids_batch)
+        if not self.use_async_client:
+            await asyncio.to_thread(self.delete, ids, **kwargs)
+            return
+        if not ids:
+            return
+        index = await self.get_async_index()
+        limit = asyncio.Semaphore(self.touch_concurrency)
+
+        async def _delete(ids_batch: list[str]) -> None:
+            async with limit:
+                await index.delete(ids=ids_batch)
+
+        await asyncio.gather(*(_delete(ids_batch) for ids_batch in batch(ids, self.batch_size)))
+
+    def delete_all(self) -> None:
+        """Delete all objects, IDs are fetched and deleted page by page."""
+        self.delete_where(None)
 
     def search_by_vector(self, vector: list[float], k: int = 1_000_000, filter_: dict | None = None) -> list[Document]:
         """Search by vector."""
@@ -1,30 +1,95 @@
 from __future__ import annotations
 
+import json
 from datetime import datetime, timezone
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, ClassVar, Iterator
 
+import numpy as np
+from apify import Actor
 from langchain_core.documents import Document
 from langchain_milvus.vectorstores import Milvus
-from pymilvus import MilvusClient  # type: ignore
-from pymilvus.exceptions import DescribeCollectionException  # type: ignore
+from pymilvus import DataType, MilvusClient  # type: ignore
+from pymilvus.exceptions import DescribeCollectionException, MilvusException  # type: ignore
 
-from .base import VectorDbBase
+from .base import BINARY_EMBEDDING_TYPES, METADATA_EXPORT_BATCH_SIZE, VectorDbBase
 
 if TYPE_CHECKING:
     from langchain_core.embeddings import Embeddings
 
     from ..models import MilvusIntegration
 
+# Maximum number of objects returned by a single query (Milvus default of quotaAndLimits.maxQueryResultWindow is 16384)
+MAX_QUERY_SIZE = 16_384
+
+# Parts of error messages of Milvus versions without partial upserts (before 2.6), the upsert is rejected as missing fields
+PARTIAL_UPDATE_UNSUPPORTED_MESSAGES = ("partial", "not support", "missed an field", "missing field")
+
 
 class MilvusDatabase(Milvus, VectorDbBase):
+    native_embedding_types: ClassVar[set[str]] = {"float", "int8", *BINARY_EMBEDDING_TYPES}
+    get_by_item_ids_batch_size: ClassVar[int] = 500
+    pipeline_concurrency: ClassVar[dict[str, int]] = {"delete": 2, "add": 2, "touch": 2}
+    write_batch_sizes: ClassVar[dict[str, int]] = {"add": 1_000, "delete": 1_000, "touch": 1_000}
+
     def __init__(self, actor_input: MilvusIntegration, embeddings: Embeddings) -> None:
         self.collection_name = actor_input.milvusCollectionName
+        self.embedding_type = embedding_type = self.check_embedding_type(embeddings)
 
         connection_args = {"uri": actor_input.milvusUri, "token": actor_input.milvusToken}
-        super().__init__(connection_args=connection_args, embedding_function=embeddings, collection_name=self.collection_name)
+        super().__init__(
+            connection_args=connection_args,
+            embedding_function=embeddings,
+            collection_name=self.collection_name,
+            **self.get_vector_field_args(embedding_type, embeddings),
+        )
         self.client = MilvusClient(**connection_args)
+        self.partial_update_supported = True
         self._dummy_vector: list[float] = []
 
+    @staticmethod
+    def get_vector_field_args(embedding_type: str, embeddings: Embeddings) -> dict[str, Any]:
+        """Return the vector schema, index and search parameters for compressed embedding types.
+
+        int8 vectors are stored as INT8_VECTOR, bit-packed binary vectors as BINARY_VECTOR (dimension is the number of bits).
+        """
+        if embedding_type == "float":
+            return {}
+
+        dimension = len(embeddings.embed_query("dummy"))
+        if embedding_type in BINARY_EMBEDDING_TYPES:
+            return {
+                "vector_schema": {"dtype": DataType.BINARY_VECTOR, "dim": dimension * 8},
+                "index_params": {"index_type": "BIN_IVF_FLAT", "metric_type": "HAMMING", "params": {"nlist": 128}},
+                "search_params": {"metric_type": "HAMMING", "params": {"nprobe": 16}},
+            }
+        return {
+            "vector_schema": {"dtype": DataType.INT8_VECTOR, "dim": dimension},
+            "index_params": {"index_type": "HNSW", "metric_type": "COSINE", "params": {"M": 16, "efConstruction": 200}},
+            "search_params": {"metric_type": "COSINE", "params": {"ef": 64}},
+        }
+
+    def to_milvus_vector(self, vector: Any) -> Any:
+        """Convert a vector to the type pymilvus sends for the vector field (query vectors are plain lists, documents NumPy arrays).
+
+        Bit-packed binary vectors are sent as bytes (BINARY_VECTOR), pymilvus would send an np.int8 array as INT8_VECTOR.
+        int8 vectors are sent as np.int8 arrays (INT8_VECTOR), float vectors are not converted.
+        """
+        if self.embedding_type in BINARY_EMBEDDING_TYPES:
+            return np.asarray(vector, dtype=np.uint8 if self.embedding_type == "ubinary" else np.int8).tobytes()
+        if self.embedding_type == "int8":
+            return np.asarray(vector, dtype=np.int8)
+        return vector
+
+    def add_embeddings(self, texts: list[str], embeddings: list, *args: Any, **kwargs: Any) -> list[str]:
+        """Insert vectors converted with to_milvus_vector (see Milvus.add_embeddings)."""
+        return super().add_embeddings(texts, [self.to_milvus_vector(v) for v in embeddings], *args, **kwargs)
+
+    def _collection_search(self, embedding_or_text: Any, *args: Any, **kwargs: Any) -> Any:
+        """Search by a vector converted with to_milvus_vector (all searches by vector and by query text go through this method)."""
+        if not isinstance(embedding_or_text, str):
+            embedding_or_text = self.to_milvus_vector(embedding_or_text)
+        return super()._collection_search(embedding_or_text, *args, **kwargs)
+
     @property
     def dummy_vector(self) -> list[float]:
         if not self._dummy_vector and self.embeddings:
@@ -42,26 +107,105 @@ class MilvusDatabase(Milvus, VectorDbBase):
 
         try:
             filter_ = f"item_id == '{item_id}'"
-            res = self.client.query(collection_name=self.collection_name, filter=filter_, output_fields=["chunk_id", "item_id", "checksum"])
+            res = self.client.query(
+                collection_name=self.collection_name, filter=filter_, output_fields=["chunk_id", "item_id", "checksum", "last_seen_at"]
+            )
         except DescribeCollectionException:
             return []
 
         return [Document(page_content="", metadata=o) for o in res]
 
+    def get_by_item_ids(self, item_ids: list[str]) -> list[Document]:
+        """Get objects by item_ids using the `in` operator.
+
+        A query returns at most MAX_QUERY_SIZE objects, the item_ids are split when the limit is reached.
+        """
+
+        def _get(item_ids_: list[str]) -> list[Document]:
+            filter_ = f"item_id in {json.dumps(item_ids_)}"
+            res = self.client.query(
+                collection_name=self.collection_name,
+                filter=filter_,
+                output_fields=["chunk_id", "item_id", "checksum", "last_seen_at"],
+                limit=MAX_QUERY_SIZE,
+            )
+            return [Document(page_content="", metadata=o) for o in res]
+
+        try:
+            return self.get_by_item_ids_within_limit([i for i in item_ids if i], _get, MAX_QUERY_SIZE)
+        except DescribeCollectionException:
+            return []
+
+    def count(self) -> int | None:
+        """Get the number of objects in the collection (0 if the collection does not exist yet)."""
+        try:
+            res = self.client.query(collection_name=self.collection_name, filter="", output_fields=["count(*)"])
+        except DescribeCollectionException:
+            return 0
+        return int(res[0]["count(*)"])
+
+    def count_expired(self, expired_ts: int) -> int | None:
+        """Count objects that are expired (the same filter as delete_expired)."""
+        res = self.client.query(collection_name=self.collection_name, filter=f"last_seen_at < {expired_ts}", output_fields=["count(*)"])
+        return int(res[0]["count(*)"])
+
+    def iter_metadata(self, batch_size: int = METADATA_EXPORT_BATCH_SIZE) -> Iterator[list[Document]]:
+        """Iterate over metadata of all objects using the query iterator (not limited by MAX_QUERY_SIZE)."""
+        try:
+            iterator = self.client.query_iterator(
+                collection_name=self.collection_name,
+                batch_size=batch_size,
+                filter="",
+                output_fields=["chunk_id", "item_id", "checksum", "last_seen_at"],
+            )
+        except DescribeCollectionException:
+            return
+        try:
+            while res := iterator.next():
+                yield [Document(page_content="", metadata=o) for o in res]
+        finally:
+            iterator.close()
+
     def update_last_seen_at(self, ids: list[str], last_seen_at: int | None = None) -> None:
-        """Update last_seen_at field in the database."""
+        """Update last_seen_at field in the database.
+
+        Only the primary key and last_seen_at are sent by a partial upsert (Milvus 2.6+).
+        Older Milvus versions do not support partial updates, the whole objects (including vectors) are fetched and upserted.
+        """
 
         last_seen_at = last_seen_at or int(datetime.now(timezone.utc).timestamp())
 
+        if self.partial_update_supported:
+            data = [{self._primary_field: _id, "last_seen_at": last_seen_at} for _id in ids]
+            try:
+                self.client.upsert(collection_name=self.collection_name, data=data, partial_update=True)
+            except MilvusException as e:
+                if not self.is_partial_update_unsupported(e):
+                    raise
+                Actor.log.warning("Milvus partial update is not supported, falling back to upserting whole objects. Error: %s", e)
+                self.partial_update_supported = False
+            else:
+                return
+
         data = self.client.get(collection_name=self.collection_name, ids=ids)
         for d in data:
             d["last_seen_at"] = last_seen_at
         self.client.upsert(collection_name=self.collection_name, data=data)
 
+    @staticmethod
+    def is_partial_update_unsupported(e: MilvusException) -> bool:
+        """Return True if the error means that partial upserts are not supported, other errors (e.g. timeouts) are not a reason to fall back."""
+        message = str(e.message or e).lower()
+        return any(m in message for m in PARTIAL_UPDATE_UNSUPPORTED_MESSAGES)
+
     def delete_by_item_id(self, item_id: str) -> None:
         """Delete object by item_id."""
         self.client.delete(collection_name=self.collection_name, filter=f"item_id == '{item_id}'")
 
+    def delete_by_item_ids(self, item_ids: list[str]) -> None:
+        """Delete objects by item_ids using the `in` operator."""
+        self.client.delete(collection_name=self.collection_name, filter=f"item_id in {json.dumps(item_ids)}")
+
     def delete_expired(self, expired_ts: int) -> None:
         """Delete objects from the index that are expired."""
         self.client.delete(collection_name=self.collection_name, filter=f"last_seen_at < {expired_ts}")
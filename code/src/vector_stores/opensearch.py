@@ -1,16 +1,18 @@
 from __future__ import annotations
 
 import time
+from collections import deque
 from datetime import datetime, timezone
-from typing import TYPE_CHECKING, Any
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, ClassVar, Iterator
 
 from langchain_community.vectorstores import OpenSearchVectorSearch
 from langchain_core.documents import Document
-from opensearchpy import OpenSearch, RequestsHttpConnection
-from opensearchpy.helpers import bulk
+from opensearchpy import AsyncOpenSearch, NotFoundError, OpenSearch, RequestsHttpConnection
+from opensearchpy.helpers import parallel_bulk
 from requests_aws4auth import AWS4Auth  # type: ignore
 
-from .base import VectorDbBase
+from .base import METADATA_EXPORT_BATCH_SIZE, VectorDbBase
 
 if TYPE_CHECKING:
     from langchain_core.embeddings import Embeddings
@@ -19,9 +21,20 @@ if TYPE_CHECKING:
 
 MAX_SIZE = 10_000
 
+# Keep alive of the point in time used by the metadata export
+PIT_KEEP_ALIVE = "10m"
+
+# knn_vector data_type for compressed embedding types (int8 -> byte vectors, binary -> bit-packed vectors)
+KNN_VECTOR_DATA_TYPES = {"int8": "byte", "binary": "binary"}
+
 
 class OpenSearchDatabase(OpenSearchVectorSearch, VectorDbBase):
+    native_embedding_types: ClassVar[set[str]] = {"float", *KNN_VECTOR_DATA_TYPES}
+    get_by_item_ids_batch_size: ClassVar[int] = 500
+    write_batch_sizes: ClassVar[dict[str, int]] = {"add": 500, "delete": 1_000, "touch": 500}
+
     def __init__(self, actor_input: OpensearchIntegration, embeddings: Embeddings) -> None:
+        embedding_type = self.check_embedding_type(embeddings)
         self.index_name = actor_input.openSearchIndexName
         name = actor_input.awsServiceName or ""
         self.service_name = name
@@ -43,11 +56,22 @@ class OpenSearchDatabase(OpenSearchVectorSearch, VectorDbBase):
         )
         self.client: OpenSearch = self.client  # for type hinting across the class
         self._dummy_vector: list[float] = []
+        # Lookups use an async client created on the first use (bound to the event loop)
+        # AWS4Auth signs only requests of the sync client, lookups then run get_by_item_ids in worker threads
+        self.async_client_factory: Callable[[], AsyncOpenSearch] | None = None
+        if not awsauth:
+            self.async_client_factory = partial(
+                AsyncOpenSearch, hosts=actor_input.openSearchUrl, http_compress=True, use_ssl=actor_input.useSsl, verify_certs=actor_input.verifyCerts
+            )
+        self._async_client: AsyncOpenSearch | None = None
 
         if not self.index_exists(self.index_name):
             if actor_input.autoCreateIndex:
                 v = self.dummy_vector
-                self.create_index(dimension=len(v), index_name=self.index_name)
+                if data_type := KNN_VECTOR_DATA_TYPES.get(embedding_type):
+                    self.create_compressed_index(dimension=len(v), data_type=data_type)
+                else:
+                    self.create_index(dimension=len(v), index_name=self.index_name)
                 # extra wait time for the index to be created
                 time.sleep(5)
             else:
@@ -56,6 +80,24 @@ class OpenSearchDatabase(OpenSearchVectorSearch, VectorDbBase):
                     f"option in the OpenSearch settings."
                 )
 
+    def create_compressed_index(self, dimension: int, data_type: str) -> None:
+        """Create an index with byte (int8) or binary (bit-packed) knn vectors.
+
+        Byte vectors use the lucene engine. Binary vectors require the faiss engine and the hamming space,
+        and their dimension is the number of bits.
+        """
+        if data_type == "binary":
+            method = {"name": "hnsw", "engine": "faiss", "space_type": "hamming"}
+            dimension *= 8
+        else:
+            method = {"name": "hnsw", "engine": "lucene", "space_type": "cosinesimil"}
+
+        body = {
+            "settings": {"index": {"knn": True}},
+            "mappings": {"properties": {"vector_field": {"type": "knn_vector", "dimension": dimension, "data_type": data_type, "method": method}}},
+        }
+        self.client.indices.create(index=self.index_name, body=body)
+
     @property
     def dummy_vector(self) -> list[float]:
         if not self._dummy_vector and self.embeddings:
@@ -96,10 +138,100 @@ class OpenSearchDatabase(OpenSearchVectorSearch, VectorDbBase):
         # OpenSearch creates a custom _id for each document, we need to return this _id in the metadata
         return [Document(page_content="", metadata={"id": o["_id"], **o["_source"]["metadata"]}) for o in res]
 
+    def get_by_item_ids(self, item_ids: list[str]) -> list[Document]:
+        """Get objects by item_ids using the terms query.
+
+        A search returns at most MAX_SIZE hits, the item_ids are split when the limit is reached.
+        """
+
+        def _get(item_ids_: list[str]) -> list[Document]:
+            return self.hits_to_documents(self.client.search(**self.get_item_ids_query(item_ids_)))
+
+        if not (item_ids := [i for i in item_ids if i]):
+            return []
+
+        # Other errors are raised, otherwise all items of the batch would be considered new and added again as duplicates
+        try:
+            return self.get_by_item_ids_within_limit(item_ids, _get, MAX_SIZE)
+        except NotFoundError:
+            return []
+
+    async def aget_by_item_ids(self, item_ids: list[str]) -> list[Document]:
+        """Get objects by item_ids using the terms query and the async client (see get_by_item_ids)."""
+
+        if self.async_client_factory is None:
+            return await super().aget_by_item_ids(item_ids)
+
+        if self._async_client is None:
+            self._async_client = self.async_client_factory()
+        client = self._async_client
+
+        async def _get(item_ids_: list[str]) -> list[Document]:
+            return self.hits_to_documents(await client.search(**self.get_item_ids_query(item_ids_)))
+
+        if not (item_ids := [i for i in item_ids if i]):
+            return []
+
+        try:
+            return await self.aget_by_item_ids_within_limit(item_ids, _get, MAX_SIZE)
+        except NotFoundError:
+            return []
+
+    def get_item_ids_query(self, item_ids: list[str]) -> dict[str, Any]:
+        return {
+            "index": self.index_name,
+            "body": {"query": {"terms": {"metadata.item_id": item_ids}}, "size": MAX_SIZE},
+            "params": {"_source_excludes": "vector_field"},
+        }
+
+    @staticmethod
+    def hits_to_documents(res: dict) -> list[Document]:
+        # OpenSearch creates a custom _id for each document, we need to return this _id in the metadata
+        hits = res.get("hits", {}).get("hits") or []
+        return [Document(page_content="", metadata={"id": o["_id"], **o["_source"]["metadata"]}) for o in hits]
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+
+    def count(self) -> int | None:
+        """Get the number of objects in the index."""
+        return int(self.client.count(index=self.index_name)["count"])
+
+    def count_expired(self, expired_ts: int) -> int | None:
+        """Count objects that are expired (the same range query as delete_expired)."""
+        return int(self.client.count(index=self.index_name, body={"query": self.get_expired_query(expired_ts)})["count"])
+
+    def iter_metadata(self, batch_size: int = METADATA_EXPORT_BATCH_SIZE) -> Iterator[list[Document]]:
+        """Iterate over metadata of all objects using search_after sorted by _id (not limited by MAX_SIZE).
+
+        A point in time (PIT) is used for a consistent view of the index when supported (it is not supported by OpenSearch serverless).
+        """
+        # noinspection PyBroadException
+        try:
+            pit_id = self.client.create_pit(index=self.index_name, params={"keep_alive": PIT_KEEP_ALIVE})["pit_id"]
+        except Exception:
+            pit_id = None
+
+        body: dict[str, Any] = {"query": {"match_all": {}}, "size": batch_size, "sort": [{"_id": "asc"}], "_source": ["metadata"]}
+        if pit_id:
+            body["pit"] = {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE}
+        try:
+            while True:
+                res = self.client.search(body=body) if pit_id else self.client.search(index=self.index_name, body=body)
+                if not (hits := res.get("hits", {}).get("hits")):
+                    return
+                yield [Document(page_content="", metadata={"id": o["_id"], **o["_source"]["metadata"]}) for o in hits]
+                body["search_after"] = hits[-1]["sort"]
+        finally:
+            if pit_id:
+                self.client.delete_pit(body={"pit_id": [pit_id]})
+
     def update_last_seen_at(self, ids: list[str], last_seen_at: int | None = None) -> None:
         """Update last_seen_at field in the database.
 
-        Improvement: We can use bulk update to update multiple documents in a single request
+        Partial updates are sent by bulk requests (chunks of 500 actions) in touch_concurrency threads.
         """
         last_seen_at = last_seen_at or int(datetime.now(timezone.utc).timestamp())
         # Prepare the bulk update actions
@@ -113,8 +245,8 @@ class OpenSearchDatabase(OpenSearchVectorSearch, VectorDbBase):
             for _id in ids
         ]
 
-        # Execute the bulk update
-        bulk(self.client, actions)
+        # Execute the bulk update, raise the first error
+        deque(parallel_bulk(self.client, actions, thread_count=self.touch_concurrency), maxlen=0)
 
     def delete_by_item_id(self, item_id: str) -> None:
         """Delete object by item_id."""
@@ -128,19 +260,32 @@ class OpenSearchDatabase(OpenSearchVectorSearch, VectorDbBase):
 
         self.delete(ids=[doc["_id"] for doc in hits])
 
+    def delete_by_item_ids(self, item_ids: list[str]) -> None:
+        """Delete objects by item_ids.
+
+        delete_by_query is not supported by OpenSearch serverless, the objects are found by the terms query and deleted by ids.
+        A failed lookup is raised (it must not turn into a no-op delete followed by adding the objects again).
+        """
+        if ids := [d.metadata["id"] for d in self.get_by_item_ids(item_ids)]:
+            self.delete(ids=ids)
+
     def delete_expired(self, expired_ts: int) -> None:
         """Delete objects from the index that are expired.
 
         Note that delete_by_query is not working for Opensearch serverless.
         We need to search for the documents first and then delete them.
         """
-        res = self.client.search(index=self.index_name, body={"query": {"range": {"metadata.last_seen_at": {"lt": expired_ts}}}, "size": MAX_SIZE})
+        res = self.client.search(index=self.index_name, body={"query": self.get_expired_query(expired_ts), "size": MAX_SIZE})
         if not (hits := res.get("hits", {}).get("hits")):
             return
 
         # delete the expired documents
         self.delete(ids=[doc["_id"] for doc in hits])
 
+    @staticmethod
+    def get_expired_query(expired_ts: int) -> dict:
+        return {"range": {"metadata.last_seen_at": {"lt": expired_ts}}}
+
     def get_all_ids(self) -> list[str]:
         """Get all document ids from the database.
 
@@ -1,27 +1,54 @@
 from __future__ import annotations
 
 from datetime import datetime, timezone
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, ClassVar, Iterator
 
 from langchain_core.documents import Document
 from langchain_postgres import PGVector
-from sqlalchemy import delete, text, update
+from sqlalchemy import delete, func, make_url, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.sql.expression import literal
 
-from .base import VectorDbBase
+from .base import METADATA_EXPORT_BATCH_SIZE, VectorDbBase
 
 if TYPE_CHECKING:
     from langchain_core.embeddings import Embeddings
+    from sqlalchemy.ext.asyncio import AsyncEngine
 
     from ..models import PgvectorIntegration
 
+# Condition matching expired objects (not seen since :value)
+EXPIRED_CONDITION = "(cmetadata ->> 'last_seen_at')::int < :value"
+
 
 class PGVectorDatabase(PGVector, VectorDbBase):
+    get_by_item_ids_batch_size: ClassVar[int] = 1_000
+    pipeline_concurrency: ClassVar[dict[str, int]] = {"delete": 2, "add": 2, "touch": 2}
+    write_batch_sizes: ClassVar[dict[str, int]] = {"add": 500, "delete": 1_000, "touch": 1_000}
+
     def __init__(self, actor_input: PgvectorIntegration, embeddings: Embeddings) -> None:
+        self.check_embedding_type(embeddings)
+        # A dry run must not create the extension, tables or collection (they are created by PGVector.__post_init__)
+        self.dry_run = bool(actor_input.dryRun)
         super().__init__(
-            embeddings=embeddings, collection_name=actor_input.postgresCollectionName, connection=actor_input.postgresSqlConnectionStr, use_jsonb=True
+            embeddings=embeddings,
+            collection_name=actor_input.postgresCollectionName,
+            connection=actor_input.postgresSqlConnectionStr,
+            use_jsonb=True,
+            create_extension=not self.dry_run,
         )
         self._dummy_vector: list[float] = []
+        # Lookups use an async engine (psycopg 3) created on the first use, it is bound to the event loop
+        self.async_url = make_url(actor_input.postgresSqlConnectionStr).set(drivername="postgresql+psycopg")
+        self._async_engine_lookups: AsyncEngine | None = None
+
+    def create_tables_if_not_exists(self) -> None:
+        if not self.dry_run:
+            super().create_tables_if_not_exists()
+
+    def create_collection(self) -> None:
+        if not self.dry_run:
+            super().create_collection()
 
     @property
     def dummy_vector(self) -> list[float]:
@@ -76,6 +103,80 @@ class PGVectorDatabase(PGVector, VectorDbBase):
 
         return [Document(page_content="", metadata=r.cmetadata | {"chunk_id": r.id}) for r in results]
 
+    def get_by_item_ids(self, item_ids: list[str]) -> list[Document]:
+        """Get documents by item_ids using the = ANY(...) condition."""
+        with self._make_sync_session() as session:
+            if not (collection := self.get_collection(session)):
+                raise ValueError("Collection not found")
+
+            results = (
+                session.query(self.EmbeddingStore)
+                .where(self.EmbeddingStore.collection_id == collection.uuid)
+                .where(text("(cmetadata ->> 'item_id') = ANY(:values)").bindparams(values=item_ids))
+                .all()
+            )
+
+        return [Document(page_content="", metadata=r.cmetadata | {"chunk_id": r.id}) for r in results]
+
+    async def aget_by_item_ids(self, item_ids: list[str]) -> list[Document]:
+        """Get documents by item_ids using the = ANY(...) condition and the async engine, only ids and metadata are selected."""
+        if self._async_engine_lookups is None:
+            self._async_engine_lookups = create_async_engine(self.async_url)
+
+        store = self.EmbeddingStore
+        async with AsyncSession(self._async_engine_lookups) as session:
+            collection_id = (
+                await session.execute(select(self.CollectionStore.uuid).where(self.CollectionStore.name == self.collection_name))
+            ).scalar()
+            if collection_id is None:
+                raise ValueError("Collection not found")
+
+            stmt = (
+                select(store.id, store.cmetadata)
+                .where(store.collection_id == collection_id)
+                .where(text("(cmetadata ->> 'item_id') = ANY(:values)").bindparams(values=item_ids))
+            )
+            results = (await session.execute(stmt)).all()
+
+        return [Document(page_content="", metadata=r.cmetadata | {"chunk_id": r.id}) for r in results]
+
+    async def aclose(self) -> None:
+        if self._async_engine_lookups is not None:
+            await self._async_engine_lookups.dispose()
+            self._async_engine_lookups = None
+
+    def count(self) -> int | None:
+        """Get the number of objects in the collection."""
+        with self._make_sync_session() as session:
+            if not (collection := self.get_collection(session)):
+                raise ValueError("Collection not found")
+
+            return int(session.query(func.count(self.EmbeddingStore.id)).where(self.EmbeddingStore.collection_id == collection.uuid).scalar() or 0)
+
+    def count_expired(self, expired_ts: int) -> int | None:
+        """Count objects that are expired (the same condition as delete_expired)."""
+        with self._make_sync_session() as session:
+            if not (collection := self.get_collection(session)):
+                raise ValueError("Collection not found")
+
+            query = (
+                session.query(func.count(self.EmbeddingStore.id))
+                .where(self.EmbeddingStore.collection_id == collection.uuid)
+                .where(text(EXPIRED_CONDITION).bindparams(value=expired_ts))
+            )
+            return int(query.scalar() or 0)
+
+    def iter_metadata(self, batch_size: int = METADATA_EXPORT_BATCH_SIZE) -> Iterator[list[Document]]:
+        """Iterate over metadata of all objects using a server-side cursor (results are streamed in batches)."""
+        with self._make_sync_session() as session:
+            if not (collection := self.get_collection(session)):
+                raise ValueError("Collection not found")
+
+            stmt = select(self.EmbeddingStore.id, self.EmbeddingStore.cmetadata).where(self.EmbeddingStore.collection_id == collection.uuid)
+            result = session.execute(stmt.execution_options(yield_per=batch_size))
+            for rows in result.partitions():
+                yield [Document(page_content="", metadata=r.cmetadata | {"chunk_id": r.id}) for r in rows]
+
     def update_last_seen_at(self, ids: list[str], last_seen_at: int | None = None) -> None:
         """Update last_seen_at field in the database."""
 
@@ -108,6 +209,20 @@ class PGVectorDatabase(PGVector, VectorDbBase):
         session.execute(stmt)
         session.commit()
 
+    def delete_by_item_ids(self, item_ids: list[str]) -> None:
+        """Delete objects by item_ids using the = ANY(...) condition."""
+        with self._make_sync_session() as session:
+            if not (collection := self.get_collection(session)):
+                raise ValueError("Collection not found")
+
+            stmt = (
+                delete(self.EmbeddingStore)
+                .where(self.EmbeddingStore.collection_id == literal(str(collection.uuid)))
+                .where(text("(cmetadata ->> 'item_id') = ANY(:values)").bindparams(values=item_ids))
+            )
+            session.execute(stmt)
+            session.commit()
+
     def delete_expired(self, expired_ts: int) -> None:
         """Delete objects from the index that are expired."""
 
@@ -118,7 +233,7 @@ class PGVectorDatabase(PGVector, VectorDbBase):
             stmt = (
                 delete(self.EmbeddingStore)
                 .where(self.EmbeddingStore.collection_id == literal(str(collection.uuid)))
-                .where(text("(cmetadata ->> 'last_seen_at')::int < :value").bindparams(value=expired_ts))
+                .where(text(EXPIRED_CONDITION).bindparams(value=expired_ts))
             )
             session.execute(stmt)
             session.commit()
@@ -1,16 +1,21 @@
 from __future__ import annotations
 
 import copy
+import time
+import uuid
+from collections import deque
 from datetime import datetime, timezone
-from typing import TYPE_CHECKING, Any
+from functools import partial
+from typing import TYPE_CHECKING, Any, ClassVar, Iterator
 
 import backoff
+from apify import Actor
 from langchain_core.documents import Document
 from langchain_pinecone import PineconeVectorStore
 from pinecone import Pinecone as PineconeClient  # type: ignore[import-untyped]
-from pinecone.exceptions import PineconeApiException  # type: ignore[import-untyped]
+from pinecone.exceptions import PineconeApiException, PineconeException  # type: ignore[import-untyped]
 
-from .base import BACKOFF_MAX_TIME_DELETE_SECONDS, BACKOFF_MAX_TIME_SECONDS, VectorDbBase
+from .base import BACKOFF_MAX_TIME_DELETE_SECONDS, BACKOFF_MAX_TIME_SECONDS, METADATA_EXPORT_BATCH_SIZE, VectorDbBase
 
 if TYPE_CHECKING:
     from langchain_core.embeddings import Embeddings
@@ -20,17 +25,72 @@ if TYPE_CHECKING:
 # Pinecone API attribution tag
 PINECONE_SOURCE_TAG = "apify"
 
+# Maximum top_k of a query
+MAX_TOP_K = 10_000
+
+# Number of ids fetched in a single request (ids are sent in the URL)
+FETCH_BATCH_SIZE = 200
+
+# Maximum number of ids deleted in a single request
+DELETE_BATCH_SIZE = 1_000
+
+# Retries (with exponential backoff starting at EXPIRY_QUERY_RETRY_SECS) of a query for expired ids returning only deleted ids
+EXPIRY_QUERY_RETRIES = 5
+EXPIRY_QUERY_RETRY_SECS = 1.0
+
+# Number of vectors upserted in a single request (the request size is limited to 2 MB)
+UPSERT_BATCH_SIZE = 100
+
+# Number of texts embedded in a single request (default of embeddingBatchSize)
+EMBEDDING_BATCH_SIZE = 1_000
+
+# Number of upsert requests in flight of a single add_documents call (pool threads of the index)
+UPSERT_CONCURRENCY = 8
+
+# Number of migrated vectors between progress logs of the id prefix migration
+MIGRATION_LOG_INTERVAL = 10_000
+
+
+def get_pinecone_client(api_key: str, *, use_grpc: bool = False) -> Any:
+    """Return the REST client or the gRPC client (requires the pinecone[grpc] package)."""
+    if not use_grpc:
+        return PineconeClient(api_key=api_key, source_tag=PINECONE_SOURCE_TAG)
+    try:
+        from pinecone.grpc import PineconeGRPC  # type: ignore[import-untyped]
+    except ImportError as e:
+        raise ImportError("Pinecone gRPC client is not installed. Install pinecone[grpc] or disable pineconeUseGrpc.") from e
+    return PineconeGRPC(api_key=api_key, source_tag=PINECONE_SOURCE_TAG)
+
 
 class PineconeDatabase(PineconeVectorStore, VectorDbBase):
+    get_by_item_ids_batch_size: ClassVar[int] = 100
+    pipeline_concurrency: ClassVar[dict[str, int]] = {"delete": 4, "add": 4, "touch": 8}
+    write_batch_sizes: ClassVar[dict[str, int]] = {"add": UPSERT_BATCH_SIZE, "delete": DELETE_BATCH_SIZE, "touch": 1}
+
     def __init__(self, actor_input: PineconeIntegration, embeddings: Embeddings) -> None:
-        self.client = PineconeClient(api_key=actor_input.pineconeApiKey, source_tag=PINECONE_SOURCE_TAG)
-        self.index = self.client.Index(actor_input.pineconeIndexName)
+        self.check_embedding_type(embeddings)
+        self.upsert_batch_size = actor_input.pineconeUpsertBatchSize or UPSERT_BATCH_SIZE
+        self.upsert_concurrency = actor_input.pineconeUpsertConcurrency or UPSERT_CONCURRENCY
+        self.client = get_pinecone_client(actor_input.pineconeApiKey, use_grpc=bool(actor_input.pineconeUseGrpc))
+        self.index = self.client.Index(actor_input.pineconeIndexName, pool_threads=self.upsert_concurrency)
         self.namespace = actor_input.pineconeIndexNamespace or None
         self.use_id_prefix = actor_input.usePineconeIdPrefix
-        self.embedding_batch_size = actor_input.embeddingBatchSize
+        # Ids can be listed only in serverless indexes
+        self.supports_metadata_scan = self.is_serverless_index(actor_input.pineconeIndexName)
+        self.embedding_batch_size = actor_input.embeddingBatchSize or EMBEDDING_BATCH_SIZE
         super().__init__(index=self.index, embedding=embeddings, namespace=self.namespace)
         self._dummy_vector: list[float] = []
 
+    def with_namespace(self, namespace: str | None) -> PineconeDatabase:
+        """Return a database bound to another namespace of the same index, the client and its connection pool are shared."""
+        db = copy.copy(self)
+        db.set_namespace(namespace)
+        return db
+
+    def set_namespace(self, namespace: str | None) -> None:
+        # LangChain methods (e.g. delete) use the namespace of the vector store by default
+        self.namespace = self._namespace = namespace or None
+
     @property
     def dummy_vector(self) -> list[float]:
         if not self._dummy_vector and self.embeddings:
@@ -59,23 +119,115 @@ class PineconeDatabase(PineconeVectorStore, VectorDbBase):
     def add_documents(self, documents: list[Document], **kwargs: Any) -> list[str]:
         """Add documents to the index.
 
-        Allows to use Pinecone id prefix and embedding chunk size.
+        Allows to use Pinecone id prefix and embedding chunk size. Documents are embedded in batches of embedding_batch_size
+        and upserted in batches of upsert_batch_size by async requests (at most upsert_concurrency in flight),
+        the next batch is embedded while the upserts of the previous batch are running.
+        """
+        embedding_batch_size = kwargs.get("embedding_chunk_size") or self.embedding_batch_size
+        # do not change metadata of the original documents
+        metadatas = [{**doc.metadata, self._text_key: doc.page_content} for doc in documents]
+        ids = kwargs.get("ids") or [str(uuid.uuid4()) for _ in documents]
+        if kwargs.get("ids") and self.use_id_prefix:
+            for doc, metadata in zip(documents, metadatas):
+                metadata["chunk_id"] = self.create_prefix_id_from_item_id_chunk_id(doc)
+            ids = [metadata["chunk_id"] for metadata in metadatas]
+
+        pending: deque[tuple[list[tuple], Any]] = deque()
+        for i in range(0, len(documents), embedding_batch_size):
+            vectors = self._embedding.embed_documents([doc.page_content for doc in documents[i : i + embedding_batch_size]])
+            embedded = list(zip(ids[i : i + embedding_batch_size], vectors, metadatas[i : i + embedding_batch_size]))
+            for j in range(0, len(embedded), self.upsert_batch_size):
+                batch = embedded[j : j + self.upsert_batch_size]
+                while len(pending) >= self.upsert_concurrency:
+                    self._wait_for_upsert(*pending.popleft())
+                pending.append((batch, self.index.upsert(vectors=batch, namespace=self.namespace, async_req=True)))
+        while pending:
+            self._wait_for_upsert(*pending.popleft())
+        return ids
+
+    def _wait_for_upsert(self, vectors: list[tuple], result: Any) -> None:
+        """Wait for an async upsert (gRPC future or REST async result), a failed upsert is retried with backoff."""
+        try:
+            result.result() if hasattr(result, "result") else result.get()
+        except PineconeException as e:
+            Actor.log.warning("Pinecone upsert of %s vectors failed, retrying. Error: %s", len(vectors), e)
+            self._upsert(vectors)
+
+    @backoff.on_exception(backoff.expo, PineconeException, max_time=BACKOFF_MAX_TIME_SECONDS)
+    def _upsert(self, vectors: list[tuple]) -> None:
+        self.index.upsert(vectors=vectors, namespace=self.namespace)
+
+    def migrate_to_id_prefix(self, vectors_per_second: float | None = None) -> int:
+        """Migrate vectors of the namespace to prefixed ids (item_id#chunk_id) without re-embedding, return the number of migrated vectors.
+
+        All ids are listed, ids without the prefix are fetched in batches (with values), upserted under the prefixed ids and
+        the old ids are deleted. Vectors are upserted before the old ids are deleted, hence the migration can be interrupted
+        and resumed by another run (migrated ids are skipped). The throughput is limited to vectors_per_second (if set).
         """
-        if not kwargs.get("embedding_chunk_size"):
-            kwargs["embedding_chunk_size"] = self.embedding_batch_size
+        started_at = time.monotonic()
+        n_migrated = 0
+        ids: list[str] = []
+        for _ids in self.index.list(namespace=self.namespace):
+            ids.extend(_id for _id in _ids if "#" not in _id)
+            if len(ids) < FETCH_BATCH_SIZE:
+                continue
+            n_migrated += self.migrate_ids_to_prefix(ids)
+            ids = []
+            if n_migrated % MIGRATION_LOG_INTERVAL < FETCH_BATCH_SIZE:
+                Actor.log.info("Pinecone id prefix migration: migrated %s vectors", n_migrated)
+            if vectors_per_second and (wait := n_migrated / vectors_per_second - (time.monotonic() - started_at)) > 0:
+                time.sleep(wait)
+        if ids:
+            n_migrated += self.migrate_ids_to_prefix(ids)
+        Actor.log.info("Pinecone id prefix migration finished: migrated %s vectors in %.0f s", n_migrated, time.monotonic() - started_at)
+        return n_migrated
 
-        if (ids := kwargs.get("ids")) and self.use_id_prefix:
-            # do not change id of the original document
-            documents = copy.deepcopy(documents)
-            for doc in documents:
-                doc.metadata["chunk_id"] = self.create_prefix_id_from_item_id_chunk_id(doc)
-            kwargs["ids"] = [doc.metadata["chunk_id"] for doc, _id in zip(documents, ids)]
+    @backoff.on_exception(backoff.expo, PineconeApiException, max_time=BACKOFF_MAX_TIME_SECONDS)
+    def migrate_ids_to_prefix(self, ids: list[str]) -> int:
+        """Copy vectors to prefixed ids and delete the old ids. Vectors without item_id in metadata are not migrated."""
+        results = self.index.fetch(ids=ids, namespace=self.namespace)
+        vectors, migrated = [], []
+        for _id, v in results["vectors"].items():
+            if not (item_id := v["metadata"].get("item_id")):
+                Actor.log.warning("Pinecone id prefix migration: vector %s has no item_id in metadata, skipping", _id)
+                continue
+            prefix_id = f"{item_id}#{_id}"
+            vectors.append((prefix_id, list(v["values"]), {**v["metadata"], "chunk_id": prefix_id}))
+            migrated.append(_id)
+        for i in range(0, len(vectors), self.upsert_batch_size):
+            self._upsert(vectors[i : i + self.upsert_batch_size])
+        for i in range(0, len(migrated), DELETE_BATCH_SIZE):
+            self._delete_ids(migrated[i : i + DELETE_BATCH_SIZE])
+        return len(migrated)
 
-        return super().add_documents(documents, **kwargs)
+    def is_serverless_index(self, index_name: str) -> bool:
+        return "pod" not in (self.client.describe_index(index_name).to_dict().get("spec") or {})
 
     def count(self) -> int | None:
-        result = self.index.describe_index_stats(namespace=self.namespace)
-        return result.get("total_vector_count", 0) or 0
+        """Get the number of vectors in the namespace (total_vector_count of the stats counts all namespaces)."""
+        namespaces = self.index.describe_index_stats().get("namespaces") or {}
+        stats = namespaces.get(self.namespace or "") or (None if self.namespace else namespaces.get("__default__"))
+        return int(stats["vector_count"] or 0) if stats else 0
+
+    def iter_metadata(self, batch_size: int = METADATA_EXPORT_BATCH_SIZE) -> Iterator[list[Document]]:
+        """Iterate over metadata of all objects in the namespace, ids are listed (serverless indexes only) and fetched in batches."""
+        ids: list[str] = []
+        for _ids in self.index.list(namespace=self.namespace):
+            ids.extend(_ids)
+            if len(ids) >= batch_size:
+                yield self.fetch_metadata(ids)
+                ids = []
+        if ids:
+            yield self.fetch_metadata(ids)
+
+    @backoff.on_exception(backoff.expo, PineconeApiException, max_time=BACKOFF_MAX_TIME_SECONDS)
+    def fetch_metadata(self, ids: list[str]) -> list[Document]:
+        """Fetch metadata of objects by ids in batches of FETCH_BATCH_SIZE."""
+        documents: list[Document] = []
+        for i in range(0, len(ids), FETCH_BATCH_SIZE):
+            results = self.index.fetch(ids=ids[i : i + FETCH_BATCH_SIZE], namespace=self.namespace)
+            documents.extend(Document(page_content="", metadata=v["metadata"] | {"chunk_id": _id}) for _id, v in results["vectors"].items())
+        return documents
 
     @backoff.on_exception(backoff.expo, PineconeApiException, max_time=BACKOFF_MAX_TIME_SECONDS)
     def get_by_item_id(self, item_id: str) -> list[Document]:
@@ -99,12 +251,44 @@ class PineconeDatabase(PineconeVectorStore, VectorDbBase):
         return [Document(page_content="", metadata=d["metadata"] | {"chunk_id": d["id"]}) for d in results["matches"]]
 
     @backoff.on_exception(backoff.expo, PineconeApiException, max_time=BACKOFF_MAX_TIME_SECONDS)
+    def get_by_item_ids(self, item_ids: list[str]) -> list[Document]:
+        """Get objects by item_ids.
+
+        With id prefixes, ids of all item_ids are listed and fetched in batches.
+        Otherwise, a similarity search with the $in filter is used, the item_ids are split when top_k is reached.
+        """
+        if self.use_id_prefix:
+            ids_ = []
+            for item_id in item_ids:
+                prefix = f"{item_id}#" if "#" not in item_id else item_id
+                for _ids in self.index.list(prefix=prefix, namespace=self.namespace):
+                    ids_.extend(_ids)
+            documents: list[Document] = []
+            for i in range(0, len(ids_), FETCH_BATCH_SIZE):
+                results = self.index.fetch(ids=ids_[i : i + FETCH_BATCH_SIZE], namespace=self.namespace)
+                documents.extend(Document(page_content="", metadata=results["vectors"][_v]["metadata"]) for _v in results["vectors"])
+            return documents
+
+        def _get(item_ids_: list[str]) -> list[Document]:
+            results = self.index.query(
+                vector=self.dummy_vector, top_k=MAX_TOP_K, filter={"item_id": {"$in": item_ids_}}, include_metadata=True, namespace=self.namespace
+            )
+            return [Document(page_content="", metadata=d["metadata"] | {"chunk_id": d["id"]}) for d in results["matches"]]
+
+        return self.get_by_item_ids_within_limit(item_ids, _get, MAX_TOP_K)
+
     def update_last_seen_at(self, ids: list[str], last_seen_at: int | None = None) -> None:
-        """Update last_seen_at field in the database."""
+        """Update last_seen_at field in the database.
+
+        Pinecone updates metadata one id at a time, the updates are sent concurrently (touch_concurrency).
+        """
 
         last_seen_at = last_seen_at or int(datetime.now(timezone.utc).timestamp())
-        for _id in ids:
-            self.index.update(id=_id, set_metadata={"last_seen_at": last_seen_at}, namespace=self.namespace)
+        self.run_concurrently(partial(self.update_last_seen_at_by_id, last_seen_at=last_seen_at), ids)
+
+    @backoff.on_exception(backoff.expo, PineconeApiException, max_time=BACKOFF_MAX_TIME_SECONDS)
+    def update_last_seen_at_by_id(self, id_: str, last_seen_at: int) -> None:
+        self.index.update(id=id_, set_metadata={"last_seen_at": last_seen_at}, namespace=self.namespace)
 
     @backoff.on_exception(backoff.expo, PineconeApiException, max_time=BACKOFF_MAX_TIME_DELETE_SECONDS)
     def delete_by_item_id(self, item_id: str) -> None:
@@ -124,13 +308,88 @@ class PineconeDatabase(PineconeVectorStore, VectorDbBase):
             self.delete(ids=ids, namespace=self.namespace)
 
     @backoff.on_exception(backoff.expo, PineconeApiException, max_time=BACKOFF_MAX_TIME_DELETE_SECONDS)
+    def delete_by_item_ids(self, item_ids: list[str]) -> None:
+        """Delete objects by item_ids.
+
+        Serverless indexes do not support deleting by a metadata filter, the ids are listed by prefix (with id prefixes)
+        or found by the $in filter and deleted by ids.
+        """
+        ids: list[str] = []
+        if self.use_id_prefix:
+            for item_id in item_ids:
+                prefix = f"{item_id}#" if "#" not in item_id else item_id
+                for _ids in self.index.list(prefix=prefix, namespace=self.namespace):
+                    ids.extend(_ids)
+        else:
+            ids = [d.metadata["chunk_id"] for d in self.get_by_item_ids(item_ids)]
+
+        for i in range(0, len(ids), DELETE_BATCH_SIZE):
+            self.delete(ids=ids[i : i + DELETE_BATCH_SIZE], namespace=self.namespace)
+
     def delete_expired(self, expired_ts: int) -> None:
-        """Delete objects from the index that are expired."""
+        """Delete objects from the index that are expired.
+
+        With id prefixes, all ids are listed and their metadata fetched in batches (a complete scan of the namespace, serverless indexes only).
+        Otherwise, the expired objects are found by filtered queries (at most MAX_TOP_K per query) repeated until a query
+        returns fewer than MAX_TOP_K objects. The ids are deleted in batches of DELETE_BATCH_SIZE concurrently.
+        """
+        n_deleted = 0
+        if self.use_id_prefix and self.supports_metadata_scan:
+            for batch in self.iter_metadata():
+                ids = [d.metadata["chunk_id"] for d in batch if int(d.metadata.get("last_seen_at") or 0) < expired_ts]
+                n_deleted += self.delete_ids_concurrently(ids)
+        else:
+            n_deleted = self.delete_expired_by_query(expired_ts)
+        Actor.log.info("Deleted %s expired objects from Pinecone", n_deleted)
+
+    def delete_expired_by_query(self, expired_ts: int) -> int:
+        """Delete expired objects found by filtered queries repeated until a query returns fewer than MAX_TOP_K objects.
+
+        Deleted objects can still be returned by the query for a short time (eventual consistency). A query returning only
+        deleted objects is retried after a backoff (at most EXPIRY_QUERY_RETRIES times). Return the number of deleted objects.
+        """
+        n_deleted, retries = 0, 0
+        deleted: set[str] = set()
+        while True:
+            matches = self.query_expired_ids(expired_ts)
+            ids = [_id for _id in matches if _id not in deleted]
+            if not ids and len(matches) >= MAX_TOP_K and retries < EXPIRY_QUERY_RETRIES:
+                time.sleep(EXPIRY_QUERY_RETRY_SECS * 2**retries)
+                retries += 1
+                continue
+            if not ids:
+                if len(matches) >= MAX_TOP_K:
+                    Actor.log.warning(
+                        "Pinecone query returned only deleted objects after %s retries, remaining expired objects will be deleted by the next run",
+                        retries,
+                    )
+                return n_deleted
+            retries = 0
+            n_deleted += self.delete_ids_concurrently(ids)
+            deleted.update(ids)
+            if len(matches) < MAX_TOP_K:
+                return n_deleted
 
-        res = self.search_by_vector(self.dummy_vector, filter_={"last_seen_at": {"$lt": expired_ts}})
-        ids = [d.metadata.get("id") or d.metadata.get("chunk_id", "") for d in res]
-        ids = [_id for _id in ids if _id]
-        self.delete(ids=ids, namespace=self.namespace)
+    @backoff.on_exception(backoff.expo, PineconeApiException, max_time=BACKOFF_MAX_TIME_SECONDS)
+    def query_expired_ids(self, expired_ts: int) -> list[str]:
+        results = self.index.query(
+            vector=self.dummy_vector,
+            top_k=MAX_TOP_K,
+            filter={"last_seen_at": {"$lt": expired_ts}},
+            include_metadata=False,
+            namespace=self.namespace,
+        )
+        return [m["id"] for m in results["matches"]]
+
+    def delete_ids_concurrently(self, ids: list[str]) -> int:
+        """Delete ids in batches of DELETE_BATCH_SIZE using at most pipeline_concurrency["delete"] threads, return the number of ids."""
+        batches = [ids[i : i + DELETE_BATCH_SIZE] for i in range(0, len(ids), DELETE_BATCH_SIZE)]
+        self.run_concurrently(self._delete_ids, batches, max_workers=self.pipeline_concurrency["delete"])
+        return len(ids)
+
+    @backoff.on_exception(backoff.expo, PineconeApiException, max_time=BACKOFF_MAX_TIME_DELETE_SECONDS)
+    def _delete_ids(self, ids: list[str]) -> None:
+        self.index.delete(ids=ids, namespace=self.namespace)
 
     def delete_all(self) -> None:
         """Delete all objects from the index in the namespace that the database was initialized.
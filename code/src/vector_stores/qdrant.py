@@ -1,46 +1,104 @@
 from __future__ import annotations
 
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, ClassVar, Iterable, Iterator, Sequence
 
 import backoff
 from langchain_core.documents import Document
 from langchain_qdrant import Qdrant
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from qdrant_client.http.exceptions import ResponseHandlingException
-from qdrant_client.models import FieldCondition, Filter, MatchValue, Range
+from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Datatype,
+    Distance,
+    FieldCondition,
+    Filter,
+    HasIdCondition,
+    HnswConfigDiff,
+    MatchAny,
+    MatchValue,
+    Range,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    VectorParams,
+)
 
-from .base import BACKOFF_MAX_TIME_DELETE_SECONDS, BACKOFF_MAX_TIME_SECONDS, VectorDbBase
+from .base import BACKOFF_MAX_TIME_DELETE_SECONDS, BACKOFF_MAX_TIME_SECONDS, METADATA_EXPORT_BATCH_SIZE, VectorDbBase
 
 if TYPE_CHECKING:
     from langchain_core.embeddings import Embeddings
-    from qdrant_client.http.models import CollectionInfo
+    from qdrant_client.http.models import CollectionInfo, ExtendedPointId, Record
 
     from ..models.qdrant_input_model import QdrantIntegration
 
+# Number of points upserted in a single request (default of qdrantUpsertBatchSize)
+UPSERT_BATCH_SIZE = 64
+
+# Number of upsert requests in flight of a single add_texts call (default of qdrantUpsertParallelism)
+UPSERT_PARALLELISM = 4
+
+# Number of points returned by a single scroll request of item_ids lookups
+SCROLL_PAGE_SIZE = 10_000
+
+# Metadata fields returned by item_ids lookups (page content and other metadata are not needed to compare crawled data)
+LOOKUP_PAYLOAD_FIELDS = ("item_id", "checksum", "last_seen_at")
+
+# Filter matching no point (no id), used by the write barrier (flush)
+FLUSH_FILTER = Filter(must=[HasIdCondition(has_id=[])])
+
 
 class QdrantDatabase(Qdrant, VectorDbBase):
+    native_embedding_types: ClassVar[set[str]] = {"float", "uint8"}
+    get_by_item_ids_batch_size: ClassVar[int] = 1_000
+    pipeline_concurrency: ClassVar[dict[str, int]] = {"delete": 4, "add": 4, "touch": 4}
+    write_batch_sizes: ClassVar[dict[str, int]] = {"add": UPSERT_BATCH_SIZE, "delete": 1_000, "touch": 1_000}
+
     def __init__(self, actor_input: QdrantIntegration, embeddings: Embeddings) -> None:
-        if actor_input.qdrantAutoCreateCollection:
+        embedding_type = self.check_embedding_type(embeddings)
+        client_kwargs: dict[str, Any] = {"url": actor_input.qdrantUrl, "api_key": actor_input.qdrantApiKey}
+        if actor_input.qdrantPreferGrpc:
+            client_kwargs |= {"prefer_grpc": True, "grpc_port": actor_input.qdrantGrpcPort or 6334}
+        client = QdrantClient(**client_kwargs)
+        self.upsert_batch_size = actor_input.qdrantUpsertBatchSize or UPSERT_BATCH_SIZE
+        self.upsert_parallelism = actor_input.qdrantUpsertParallelism or UPSERT_PARALLELISM
+        self._unflushed_writes = False
+
+        if actor_input.qdrantAutoCreateCollection and embedding_type == "uint8":
+            self.create_uint8_collection(client, actor_input, embeddings)
+        elif actor_input.qdrantAutoCreateCollection:
             # The collection is created if it doesn't exist
             # The text passed is used to determine the dimension of the vector
             # This method is usually called internally by Qdrant#from_documents and Qdrant#from_texts
             Qdrant.construct_instance(
                 ["<dummy-text>"],
                 embedding=embeddings,
-                url=actor_input.qdrantUrl,
-                api_key=actor_input.qdrantApiKey,
                 collection_name=actor_input.qdrantCollectionName,
                 vector_name=actor_input.qdrantVectorName or None,
+                on_disk=actor_input.qdrantOnDiskVectors or None,
+                **self.get_collection_params(actor_input),
+                **client_kwargs,
             )
 
-        client = QdrantClient(url=actor_input.qdrantUrl, api_key=actor_input.qdrantApiKey)
         super().__init__(
             client=client,
             collection_name=actor_input.qdrantCollectionName,
             embeddings=embeddings,
             vector_name=actor_input.qdrantVectorName or None,
+            async_client=AsyncQdrantClient(**client_kwargs),
         )
+        # A dry run must not write to the database
+        if not actor_input.dryRun:
+            self.create_payload_indexes(client, actor_input)
+
+        self._dummy_vector: list[float] = []
+
+    @staticmethod
+    def create_payload_indexes(client: QdrantClient, actor_input: QdrantIntegration) -> None:
         client.create_payload_index(
             collection_name=actor_input.qdrantCollectionName,
             field_name="metadata.item_id",
@@ -54,7 +112,45 @@ class QdrantDatabase(Qdrant, VectorDbBase):
                 field_schema="integer",
             )
 
-        self._dummy_vector: list[float] = []
+    @staticmethod
+    def get_collection_params(actor_input: QdrantIntegration) -> dict[str, Any]:
+        """Return parameters of a new collection set by the input: quantization, on-disk payload, HNSW index, shards and replication."""
+        params: dict[str, Any] = {}
+        # Quantized vectors are kept in RAM, the original vectors (possibly on disk) are used only for rescoring
+        if actor_input.qdrantQuantization == "scalar":
+            params["quantization_config"] = ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, always_ram=True))
+        elif actor_input.qdrantQuantization == "binary":
+            params["quantization_config"] = BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+        if actor_input.qdrantHnswM is not None or actor_input.qdrantHnswEfConstruct:
+            params["hnsw_config"] = HnswConfigDiff(m=actor_input.qdrantHnswM, ef_construct=actor_input.qdrantHnswEfConstruct)
+        if actor_input.qdrantOnDiskPayload:
+            params["on_disk_payload"] = True
+        if actor_input.qdrantShardNumber:
+            params["shard_number"] = actor_input.qdrantShardNumber
+        if actor_input.qdrantReplicationFactor:
+            params["replication_factor"] = actor_input.qdrantReplicationFactor
+        return params
+
+    @staticmethod
+    def create_uint8_collection(client: QdrantClient, actor_input: QdrantIntegration, embeddings: Embeddings) -> None:
+        """Create a collection storing uint8 vectors (4x smaller than float32) if it doesn't exist.
+
+        Qdrant.construct_instance always creates float32 vectors, hence the collection is created here.
+        """
+        if client.collection_exists(actor_input.qdrantCollectionName):
+            return
+
+        params = VectorParams(
+            size=len(embeddings.embed_query("<dummy-text>")),
+            distance=Distance.COSINE,
+            datatype=Datatype.UINT8,
+            on_disk=actor_input.qdrantOnDiskVectors or None,
+        )
+        client.create_collection(
+            actor_input.qdrantCollectionName,
+            vectors_config={actor_input.qdrantVectorName: params} if actor_input.qdrantVectorName else params,
+            **QdrantDatabase.get_collection_params(actor_input),
+        )
 
     @property
     def dummy_vector(self) -> list[float]:
@@ -71,25 +167,137 @@ class QdrantDatabase(Qdrant, VectorDbBase):
         else:
             return True
 
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: list[dict] | None = None,
+        ids: Sequence[str] | None = None,
+        batch_size: int | None = None,
+        **kwargs: Any,  # noqa: ARG002
+    ) -> list[str]:
+        """Embed texts in batches and upsert them without waiting until they are applied (wait=False).
+
+        At most upsert_parallelism upserts are in flight, the next batch is embedded while the previous batches are upserted.
+        Upserted points are persisted in the write-ahead log of Qdrant, flush waits until they are applied.
+        """
+        added_ids: list[str] = []
+        pending: deque[Future] = deque()
+        with ThreadPoolExecutor(max_workers=self.upsert_parallelism) as executor:
+            for batch_ids, points in self._generate_rest_batches(texts, metadatas, ids, batch_size or self.upsert_batch_size):
+                while len(pending) >= self.upsert_parallelism:
+                    pending.popleft().result()
+                pending.append(executor.submit(self._upsert_points, points))
+                added_ids.extend(batch_ids)
+            while pending:
+                pending.popleft().result()
+        return added_ids
+
+    @backoff.on_exception(backoff.expo, ResponseHandlingException, max_time=BACKOFF_MAX_TIME_SECONDS)
+    def _upsert_points(self, points: list) -> None:
+        self.client.upsert(self.collection_name, points=points, wait=False)
+        self._unflushed_writes = True
+
+    @backoff.on_exception(backoff.expo, ResponseHandlingException, max_time=BACKOFF_MAX_TIME_SECONDS)
+    def flush(self) -> None:
+        """Wait until all upserts sent without waiting are applied.
+
+        Operations of a shard are applied in order, hence an empty payload update by a filter (sent to all shards) matching no point
+        with wait=True returns after all previous writes are applied. Nothing is written, even if the filter matched a point.
+        """
+        if not self._unflushed_writes:
+            return
+        self.client.set_payload(self.collection_name, payload={}, points=FLUSH_FILTER, wait=True)
+        self._unflushed_writes = False
+
     def count(self) -> int | None:
         """Get the number of documents in the index."""
         results: CollectionInfo = self.client.get_collection(self.collection_name)
         return results.points_count
 
+    def count_expired(self, expired_ts: int) -> int | None:
+        """Count objects that are expired (the same filter as delete_expired)."""
+        return self.client.count(self.collection_name, count_filter=self.get_expired_filter(expired_ts), exact=True).count
+
+    def iter_metadata(self, batch_size: int = METADATA_EXPORT_BATCH_SIZE) -> Iterator[list[Document]]:
+        """Iterate over metadata of all points by scrolling, only the metadata payload is returned (without page content and vectors)."""
+        offset = None
+        while True:
+            results, offset = self._scroll_metadata(batch_size, offset)
+            if documents := [Document(page_content="", metadata=d.payload.get("metadata", {}) | {"chunk_id": d.id}) for d in results if d.payload]:
+                yield documents
+            if offset is None:
+                return
+
     @backoff.on_exception(backoff.expo, ResponseHandlingException, max_time=BACKOFF_MAX_TIME_SECONDS)
+    def _scroll_metadata(self, limit: int, offset: ExtendedPointId | None) -> tuple[list[Record], ExtendedPointId | None]:
+        return self.client.scroll(self.collection_name, with_payload=[self.metadata_payload_key], with_vectors=False, limit=limit, offset=offset)
+
+    @property
+    def lookup_payload(self) -> list[str]:
+        return [f"{self.metadata_payload_key}.{field}" for field in LOOKUP_PAYLOAD_FIELDS]
+
     def get_by_item_id(self, item_id: str) -> list[Document]:
-        """Get all documents with the given item_id.
+        """Get all documents with the given item_id (with the full payload), scrolling through all pages."""
+        scroll_filter = Filter(must=[FieldCondition(key=f"{self.metadata_payload_key}.item_id", match=MatchValue(value=item_id))])
+        return self.scroll_documents(scroll_filter, with_payload=True)
+
+    def get_item_ids_filter(self, item_ids: list[str]) -> Filter:
+        return Filter(must=[FieldCondition(key=f"{self.metadata_payload_key}.item_id", match=MatchAny(any=item_ids))])
+
+    def get_by_item_ids(self, item_ids: list[str]) -> list[Document]:
+        """Get all documents with any of the given item_ids (MatchAny filter), scrolling through all pages.
 
-        Scrolling is not used because the number of documents with the same item_id is expected to be small.
+        Only the fields needed to compare crawled data with the database are returned (see LOOKUP_PAYLOAD_FIELDS).
         """
+        return self.scroll_documents(self.get_item_ids_filter(item_ids), with_payload=self.lookup_payload)
+
+    def scroll_documents(self, scroll_filter: Filter, with_payload: bool | list[str]) -> list[Document]:
+        documents: list[Document] = []
+        offset = None
+        while True:
+            results, offset = self._scroll(scroll_filter, with_payload, offset)
+            documents.extend(Document(page_content="", metadata=d.payload.get("metadata", {}) | {"chunk_id": d.id}) for d in results if d.payload)
+            if offset is None:
+                return documents
+
+    @backoff.on_exception(backoff.expo, ResponseHandlingException, max_time=BACKOFF_MAX_TIME_SECONDS)
+    def _scroll(
+        self, scroll_filter: Filter, with_payload: bool | list[str], offset: ExtendedPointId | None
+    ) -> tuple[list[Record], ExtendedPointId | None]:
+        return self.client.scroll(
+            self.collection_name,
+            scroll_filter=scroll_filter,
+            with_payload=with_payload,
+            with_vectors=False,
+            limit=SCROLL_PAGE_SIZE,
+            offset=offset,
+        )
+
+    async def aget_by_item_ids(self, item_ids: list[str]) -> list[Document]:
+        """Get all documents with any of the given item_ids using the async client."""
+
+        if not self.async_client:
+            return await super().aget_by_item_ids(item_ids)
+
+        scroll_filter = self.get_item_ids_filter(item_ids)
+        documents: list[Document] = []
+        offset = None
+        while True:
+            results, offset = await self._ascroll_item_ids(scroll_filter, offset)
+            documents.extend(Document(page_content="", metadata=d.payload.get("metadata", {}) | {"chunk_id": d.id}) for d in results if d.payload)
+            if offset is None:
+                return documents
 
-        results, _ = self.client.scroll(
+    @backoff.on_exception(backoff.expo, ResponseHandlingException, max_time=BACKOFF_MAX_TIME_SECONDS)
+    async def _ascroll_item_ids(self, scroll_filter: Filter, offset: ExtendedPointId | None) -> tuple[list[Record], ExtendedPointId | None]:
+        return await self.async_client.scroll(  # type: ignore[union-attr]
             self.collection_name,
-            scroll_filter=Filter(must=[FieldCondition(key=f"{self.metadata_payload_key}.item_id", match=MatchValue(value=item_id))]),
+            scroll_filter=scroll_filter,
+            with_payload=self.lookup_payload,
             with_vectors=False,
-            limit=100_000,
+            limit=SCROLL_PAGE_SIZE,
+            offset=offset,
         )
-        return [Document(page_content="", metadata=d.payload.get("metadata", {}) | {"chunk_id": d.id}) for d in results if d.payload]
 
     @backoff.on_exception(backoff.expo, ResponseHandlingException, max_time=BACKOFF_MAX_TIME_SECONDS)
     def update_last_seen_at(self, ids: list[str], last_seen_at: int | None = None) -> None:
@@ -109,12 +317,18 @@ class QdrantDatabase(Qdrant, VectorDbBase):
             self.collection_name, Filter(must=[FieldCondition(key=f"{self.metadata_payload_key}.item_id", match=MatchValue(value=item_id))])
         )
 
+    @backoff.on_exception(backoff.expo, ResponseHandlingException, max_time=BACKOFF_MAX_TIME_DELETE_SECONDS)
+    def delete_by_item_ids(self, item_ids: list[str]) -> None:
+        """Delete objects by item_ids (MatchAny filter)."""
+        self.client.delete(self.collection_name, self.get_item_ids_filter(item_ids))
+
     @backoff.on_exception(backoff.expo, ResponseHandlingException, max_time=BACKOFF_MAX_TIME_DELETE_SECONDS)
     def delete_expired(self, expired_ts: int) -> None:
         """Delete objects from the index that are expired."""
-        self.client.delete(
-            self.collection_name, Filter(must=[FieldCondition(key=f"{self.metadata_payload_key}.last_seen_at", range=Range(lt=expired_ts))])
-        )
+        self.client.delete(self.collection_name, self.get_expired_filter(expired_ts))
+
+    def get_expired_filter(self, expired_ts: int) -> Filter:
+        return Filter(must=[FieldCondition(key=f"{self.metadata_payload_key}.last_seen_at", range=Range(lt=expired_ts))])
 
     def delete_all(self) -> None:
         """Delete all objects from the index."""
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import asyncio
 from datetime import datetime, timezone
-from typing import TYPE_CHECKING, Any
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, ClassVar, Iterator
 
 import weaviate
 from apify import Actor
@@ -9,25 +11,46 @@ from langchain_core.documents import Document
 from langchain_weaviate import WeaviateVectorStore
 from weaviate.classes.query import Filter
 
-from .base import VectorDbBase
+from .base import METADATA_EXPORT_BATCH_SIZE, VectorDbBase
 
 if TYPE_CHECKING:
     from langchain_core.embeddings import Embeddings
+    from weaviate import WeaviateAsyncClient
+    from weaviate.collections.classes.filters import _Filters
 
     from ..models import WeaviateIntegration
 
+# Maximum number of objects returned by a single query (Weaviate default QUERY_MAXIMUM_RESULTS is 10000)
+MAX_QUERY_SIZE = 10_000
+
 
 class WeaviateDatabase(WeaviateVectorStore, VectorDbBase):
+    get_by_item_ids_batch_size: ClassVar[int] = 200
+    pipeline_concurrency: ClassVar[dict[str, int]] = {"delete": 2, "add": 4, "touch": 8}
+    write_batch_sizes: ClassVar[dict[str, int]] = {"add": 100, "delete": 1_000, "touch": 1}
+
     def __init__(self, actor_input: WeaviateIntegration, embeddings: Embeddings) -> None:
+        self.check_embedding_type(embeddings)
         self.collection_name = actor_input.weaviateCollectionName
         self.text_key = "text"
         auth_ = weaviate.auth.AuthApiKey(actor_input.weaviateApiKey) if actor_input.weaviateApiKey else None
 
+        # Lookups use an async client with the same parameters, connected on the first use (bound to the event loop)
         if "localhost" in actor_input.weaviateUrl:
             self.client = weaviate.connect_to_local()
+            self.async_client_factory: Callable[[], WeaviateAsyncClient] = weaviate.use_async_with_local
         else:
             self.client = weaviate.connect_to_wcs(cluster_url=actor_input.weaviateUrl, auth_credentials=auth_)
-
+            self.async_client_factory = partial(
+                weaviate.use_async_with_weaviate_cloud,
+                cluster_url=actor_input.weaviateUrl,
+                auth_credentials=auth_,  # type: ignore[arg-type]
+            )
+        self._async_client: WeaviateAsyncClient | None = None
+
+        # WeaviateVectorStore creates a missing collection, a dry run must not write to the database
+        if actor_input.dryRun and not self.client.collections.exists(self.collection_name):
+            raise ValueError(f"Weaviate collection {self.collection_name} does not exist, a dry run does not create it")
         super().__init__(client=self.client, index_name=self.collection_name, text_key=self.text_key, embedding=embeddings)
         self._dummy_vector: list[float] = []
 
@@ -58,25 +81,120 @@ class WeaviateDatabase(WeaviateVectorStore, VectorDbBase):
 
         return [Document(page_content="", metadata=dict(o.properties) | {"chunk_id": str(o.uuid)}) for o in response.objects]
 
+    def get_by_item_ids(self, item_ids: list[str]) -> list[Document]:
+        """Get objects by item_ids using the contains_any filter.
+
+        A query returns at most MAX_QUERY_SIZE objects, the item_ids are split when the limit is reached.
+        """
+
+        collection = self.client.collections.get(name=self.collection_name)
+
+        def _get(item_ids_: list[str]) -> list[Document]:
+            response = collection.query.fetch_objects(filters=Filter.by_property("item_id").contains_any(item_ids_), limit=MAX_QUERY_SIZE)
+            return [Document(page_content="", metadata=dict(o.properties) | {"chunk_id": str(o.uuid)}) for o in response.objects]
+
+        if not (item_ids := [i for i in item_ids if i]):
+            return []
+
+        try:
+            return self.get_by_item_ids_within_limit(item_ids, _get, MAX_QUERY_SIZE)
+        except weaviate.exceptions.WeaviateQueryError:
+            # The query fails when the collection is missing or empty (item_id property is not in the schema yet).
+            # Other errors are raised, otherwise all items of the batch would be considered new and added again as duplicates
+            if self.is_empty():
+                return []
+            raise
+
+    async def aget_by_item_ids(self, item_ids: list[str]) -> list[Document]:
+        """Get objects by item_ids using the contains_any filter and the async client (see get_by_item_ids)."""
+
+        if self._async_client is None:
+            client = self.async_client_factory()
+            await client.connect()
+            self._async_client = client
+        collection = self._async_client.collections.get(name=self.collection_name)
+
+        async def _get(item_ids_: list[str]) -> list[Document]:
+            response = await collection.query.fetch_objects(filters=Filter.by_property("item_id").contains_any(item_ids_), limit=MAX_QUERY_SIZE)
+            return [Document(page_content="", metadata=dict(o.properties) | {"chunk_id": str(o.uuid)}) for o in response.objects]
+
+        if not (item_ids := [i for i in item_ids if i]):
+            return []
+
+        try:
+            return await self.aget_by_item_ids_within_limit(item_ids, _get, MAX_QUERY_SIZE)
+        except weaviate.exceptions.WeaviateQueryError:
+            if await asyncio.to_thread(self.is_empty):
+                return []
+            raise
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+
+    def is_empty(self) -> bool:
+        """Return True if the collection does not exist or has no objects."""
+        return not self.client.collections.exists(self.collection_name) or not self.count()
+
+    def count(self) -> int | None:
+        """Get the number of objects in the collection."""
+        collection = self.client.collections.get(name=self.collection_name)
+        return collection.aggregate.over_all(total_count=True).total_count
+
+    def count_expired(self, expired_ts: int) -> int | None:
+        """Count objects that are expired (the same filter as delete_expired)."""
+        collection = self.client.collections.get(name=self.collection_name)
+        return collection.aggregate.over_all(filters=Filter.by_property("last_seen_at").less_than(expired_ts), total_count=True).total_count
+
+    def iter_metadata(self, batch_size: int = METADATA_EXPORT_BATCH_SIZE) -> Iterator[list[Document]]:
+        """Iterate over metadata of all objects using the cursor-based collection iterator."""
+        collection = self.client.collections.get(name=self.collection_name)
+        documents: list[Document] = []
+        for o in collection.iterator(return_properties=["item_id", "checksum", "last_seen_at"], cache_size=batch_size):
+            documents.append(Document(page_content="", metadata=dict(o.properties) | {"chunk_id": str(o.uuid)}))
+            if len(documents) >= batch_size:
+                yield documents
+                documents = []
+        if documents:
+            yield documents
+
     def update_last_seen_at(self, ids: list[str], last_seen_at: int | None = None) -> None:
-        """Update last_seen_at field in the database."""
+        """Update last_seen_at field in the database.
+
+        Weaviate updates (PATCH) objects one by one, the updates are sent concurrently (touch_concurrency).
+        """
 
         last_seen_at = last_seen_at or int(datetime.now(timezone.utc).timestamp())
 
         collection = self.client.collections.get(name=self.collection_name)
-        for _id in ids:
-            collection.data.update(uuid=_id, properties={"last_seen_at": last_seen_at})
+        self.run_concurrently(lambda _id: collection.data.update(uuid=_id, properties={"last_seen_at": last_seen_at}), ids)
 
     def delete_by_item_id(self, item_id: str) -> None:
         """Delete object by item_id."""
-        collection = self.client.collections.get(name=self.collection_name)
-        collection.data.delete_many(Filter.by_property("item_id").equal(item_id), verbose=True)
+        self.delete_many(Filter.by_property("item_id").equal(item_id))
+
+    def delete_by_item_ids(self, item_ids: list[str]) -> None:
+        """Delete objects by item_ids using the contains_any filter."""
+        self.delete_many(Filter.by_property("item_id").contains_any(item_ids))
 
     def delete_expired(self, expired_ts: int) -> None:
         """Delete objects from the index that are expired."""
+        self.delete_many(Filter.by_property("last_seen_at").less_than(expired_ts))
+
+    def delete_many(self, filters: _Filters) -> None:
+        """Delete all objects matching the filter.
 
+        A batch delete matches at most MAX_QUERY_SIZE objects (QUERY_MAXIMUM_RESULTS) without an error, hence it is repeated
+        until fewer objects match. Failed deletes are raised, otherwise stale objects would be kept next to the new ones.
+        """
         collection = self.client.collections.get(name=self.collection_name)
-        collection.data.delete_many(Filter.by_property("last_seen_at").less_than(expired_ts), verbose=True)
+        while True:
+            result = collection.data.delete_many(filters, verbose=True)
+            if result.failed:
+                raise RuntimeError(f"Failed to delete {result.failed} of {result.matches} objects from Weaviate collection {self.collection_name}")
+            if result.matches < MAX_QUERY_SIZE or not result.successful:
+                return
 
     def get(self, id_: str) -> Any:
         """Get a document by id from the database.
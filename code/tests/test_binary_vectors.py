@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+from typing import Any
+
+import numpy as np
+import pytest
+from langchain_milvus.vectorstores import Milvus
+from opensearchpy.serializer import JSONSerializer
+from pymilvus import DataType  # type: ignore
+from pymilvus.client.prepare import Prepare  # type: ignore
+from pymilvus.grpc_gen import common_pb2  # type: ignore
+
+from src.vector_stores.milvus import MilvusDatabase
+from src.vector_stores.opensearch import OpenSearchDatabase
+
+# Bits of a 16-dimensional binary embedding, bit-packed the same way as Cohere binary (int8) and ubinary (uint8) embeddings
+BITS = np.array([1, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 1, 1, 0], dtype=np.uint8)
+PACKED = np.packbits(BITS)
+
+
+def _milvus(embedding_type: str) -> Any:
+    db = MilvusDatabase.__new__(MilvusDatabase)
+    db.__dict__.update(embedding_type=embedding_type, col=object(), timeout=None)
+    return db
+
+
+class Recorder:
+    """Stand-in for a method of langchain-milvus recording positional arguments (called without self, it is not a descriptor)."""
+
+    def __init__(self, result: Any = None) -> None:
+        self.calls: list[tuple] = []
+        self.result = result
+
+    def __call__(self, *args: Any, **_kwargs: Any) -> Any:
+        self.calls.append(args)
+        return self.result
+
+
+def _placeholder(vector: Any) -> Any:
+    request = Prepare.search_requests_with_expr("test", "vector", {"metric_type": "HAMMING", "params": {}}, 10, data=[vector])
+    group = common_pb2.PlaceholderGroup()
+    group.ParseFromString(request.placeholder_group)
+    return group.placeholders[0]
+
+
+@pytest.mark.parametrize(("embedding_type", "dtype"), [("binary", np.int8), ("ubinary", np.uint8)])
+def test_milvus_binary_vectors_round_trip(monkeypatch: pytest.MonkeyPatch, embedding_type: str, dtype: type) -> None:
+    db = _milvus(embedding_type)
+    inserted, searched = Recorder(["a"]), Recorder()
+    monkeypatch.setattr(Milvus, "add_embeddings", inserted)
+    monkeypatch.setattr(Milvus, "_collection_search", searched)
+
+    db.add_embeddings(["a"], [PACKED.astype(dtype)])
+    fields_info = [
+        {"name": "pk", "type": DataType.VARCHAR, "is_primary": True, "auto_id": False, "params": {"max_length": 64}},
+        {"name": "vector", "type": DataType.BINARY_VECTOR, "params": {"dim": len(BITS)}},
+    ]
+    request = Prepare.row_insert_param("test", [{"pk": "a", "vector": inserted.calls[0][1][0]}], "", fields_info)
+    field = next(f for f in request.fields_data if f.field_name == "vector")
+    assert np.unpackbits(np.frombuffer(field.vectors.binary_vector, dtype=np.uint8)).tolist() == BITS.tolist()
+
+    # Query embeddings are plain lists of ints
+    db.similarity_search_by_vector(PACKED.astype(dtype).tolist(), k=1)
+    placeholder = _placeholder(searched.calls[0][0])
+    assert placeholder.type == DataType.BINARY_VECTOR, "Binary vectors should not be searched as INT8_VECTOR"
+    value = placeholder.values[0]  # noqa: PD011
+    assert np.unpackbits(np.frombuffer(value, dtype=np.uint8)).tolist() == BITS.tolist()
+
+
+def test_milvus_int8_vectors_stay_int8_arrays(monkeypatch: pytest.MonkeyPatch) -> None:
+    db = _milvus("int8")
+    searched = Recorder()
+    monkeypatch.setattr(Milvus, "_collection_search", searched)
+
+    db.similarity_search_by_vector([1, -2, 127], k=1)
+
+    assert searched.calls[0][0].dtype == np.int8
+    placeholder = _placeholder(searched.calls[0][0])
+    assert placeholder.type == DataType.INT8_VECTOR
+    value = placeholder.values[0]  # noqa: PD011
+    assert np.frombuffer(value, dtype=np.int8).tolist() == [1, -2, 127]
+
+
+def test_opensearch_binary_vectors_round_trip() -> None:
+    created: list[dict] = []
+    db = OpenSearchDatabase.__new__(OpenSearchDatabase)
+    db.__dict__.update(index_name="test", client=SimpleNamespace(indices=SimpleNamespace(create=lambda index, body: created.append(body))))  # noqa: ARG005
+
+    db.create_compressed_index(dimension=len(PACKED), data_type="binary")
+
+    vector_field = created[0]["mappings"]["properties"]["vector_field"]
+    assert vector_field["dimension"] == len(BITS), "Dimension of binary vectors is the number of bits"
+    assert vector_field["data_type"] == "binary"
+    assert vector_field["method"] == {"name": "hnsw", "engine": "faiss", "space_type": "hamming"}
+
+    # Documents are bulk indexed as JSON arrays of signed bytes
+    source = json.loads(JSONSerializer().dumps({"vector_field": PACKED.astype(np.int8)}))
+    assert all(-128 <= v <= 127 for v in source["vector_field"])
+    assert np.unpackbits(np.asarray(source["vector_field"], dtype=np.int8).view(np.uint8)).tolist() == BITS.tolist()
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from src.bloom import INITIAL_CAPACITY, ItemIdsBloomFilter
+
+
+def test_bloom_filter_has_no_false_negatives() -> None:
+    bloom_filter = ItemIdsBloomFilter()
+    item_ids = [f"item-{i}" for i in range(INITIAL_CAPACITY + 1000)]
+    bloom_filter.add_many(item_ids)
+
+    assert len(bloom_filter.filters) == 2, "A second filter should be added when the first one is full"
+    assert bloom_filter.contains_many(item_ids).all()
+    assert bloom_filter.contains_many([f"other-{i}" for i in range(10_000)]).mean() < 0.02
+
+
+def test_bloom_filter_skips_present_item_ids() -> None:
+    bloom_filter = ItemIdsBloomFilter()
+    bloom_filter.add_many(["a", "b", "a"])
+    bloom_filter.add_many(["b", "c"])
+
+    assert len(bloom_filter) == 3
+
+
+def test_bloom_filter_to_bytes_and_back() -> None:
+    bloom_filter = ItemIdsBloomFilter()
+    bloom_filter.add_many(["a", "b"])
+
+    loaded = ItemIdsBloomFilter.from_bytes(bloom_filter.to_bytes())
+
+    assert len(loaded) == 2
+    assert loaded.contains_many(["a", "b"]).all()
+    assert loaded.filters[0].bits.tobytes() == bloom_filter.filters[0].bits.tobytes()
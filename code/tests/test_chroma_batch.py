@@ -13,9 +13,23 @@ if TYPE_CHECKING:
 
     from src._types import VectorDb
 
+import threading
+
 from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.vector_stores.chroma import BATCH_SIZE, ChromaDatabase, batch
+
+
+class RecordingCollection:
+    def __init__(self) -> None:
+        self.upserts: list[list[str]] = []
+        self.lock = threading.Lock()
 
-from src.vector_stores.chroma import BATCH_SIZE, batch
+    def upsert(self, ids: list[str], embeddings: list[list[float]], metadatas: list[dict], documents: list[str]) -> None:
+        assert len(ids) == len(embeddings) == len(metadatas) == len(documents)
+        with self.lock:
+            self.upserts.append(ids)
 
 
 def _make_docs(n: int) -> list[Document]:
@@ -32,6 +46,92 @@ def test_batch_respects_batch_size() -> None:
     assert len(chunks[-1]) == 5, "Remainder batch size incorrect"
 
 
+def test_add_documents_embedding_batch_size_is_independent() -> None:
+    db = ChromaDatabase.__new__(ChromaDatabase)
+    db._embedding_function = DeterministicFakeEmbedding(size=4)
+    db.index = RecordingCollection()  # type: ignore[assignment]
+    db.batch_size, db.embedding_batch_size, db.add_concurrency = 2, 3, 2
+    docs = _make_docs(11)
+
+    inserted_ids = db.add_documents(docs)
+
+    assert inserted_ids == [d.metadata["chunk_id"] for d in docs]
+    assert max(len(ids) for ids in db.index.upserts) == 2  # type: ignore[attr-defined]
+    assert sorted(_id for ids in db.index.upserts for _id in ids) == sorted(inserted_ids)  # type: ignore[attr-defined]
+
+
+class AsyncRecordingCollection:
+    name = "test"
+
+    def __init__(self) -> None:
+        self.records: dict[str, dict] = {}
+
+    async def upsert(self, ids: list[str], embeddings: list[list[float]], metadatas: list[dict], documents: list[str]) -> None:  # noqa: ARG002
+        self.records.update(zip(ids, metadatas))
+
+    async def update(self, ids: list[str], metadatas: list[dict]) -> None:
+        for _id, m in zip(ids, metadatas):
+            self.records[_id] = {**self.records[_id], **m}
+
+    async def delete(self, ids: list[str]) -> None:
+        for _id in ids:
+            self.records.pop(_id, None)
+
+    async def get(self, where: dict, include: list[str]) -> dict:  # noqa: ARG002
+        item_ids = where["item_id"]["$in"]
+        ids = [_id for _id, m in self.records.items() if m.get("item_id") in item_ids]
+        return {"ids": ids, "metadatas": [self.records[_id] for _id in ids]}
+
+
+async def test_async_client_add_touch_delete() -> None:
+    db = ChromaDatabase.__new__(ChromaDatabase)
+    db._embedding_function = DeterministicFakeEmbedding(size=4)
+    db._async_index = AsyncRecordingCollection()  # type: ignore[assignment]
+    db.use_async_client = True
+    db.batch_size, db.embedding_batch_size, db.add_concurrency = 2, 3, 2
+    docs = [Document(page_content=f"text {i}", metadata={"item_id": f"item-{i % 2}", "chunk_id": f"c{i}"}) for i in range(5)]
+
+    assert await db.aadd_documents(docs) == ["c0", "c1", "c2", "c3", "c4"]
+    await db.aupdate_last_seen_at(["c0", "c1", "c2"], last_seen_at=10)
+    await db.adelete(ids=["c3", "c4"])
+
+    res = await db.aget_by_item_ids(["item-0", "item-1"])
+    assert sorted(d.metadata["chunk_id"] for d in res) == ["c0", "c1", "c2"]
+    assert all(d.metadata["last_seen_at"] == 10 for d in res)
+
+
+class PagedCollection:
+    def __init__(self, records: dict[str, dict]) -> None:
+        self.records = records
+        self.limits: list[int | None] = []
+
+    def count(self) -> int:
+        return len(self.records)
+
+    def get(self, where: dict | None, limit: int | None, include: list[str]) -> dict:  # noqa: ARG002
+        self.limits.append(limit)
+        ids = [_id for _id, m in self.records.items() if where is None or m["last_seen_at"] < where["last_seen_at"]["$lt"]]
+        return {"ids": ids[:limit]}
+
+    def delete(self, ids: list[str]) -> None:
+        for _id in ids:
+            del self.records[_id]
+
+
+def test_delete_expired_is_paginated(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("src.vector_stores.chroma.DELETE_PAGE_SIZE", 2)
+    db = ChromaDatabase.__new__(ChromaDatabase)
+    db.index = PagedCollection({f"c{i}": {"last_seen_at": i} for i in range(7)})  # type: ignore[assignment]
+    db.batch_size = 1
+
+    db.delete_expired(5)
+    assert sorted(db.index.records) == ["c5", "c6"]  # type: ignore[attr-defined]
+    assert db.index.limits == [2, 2, 2]  # type: ignore[attr-defined]
+
+    db.delete_all()
+    assert not db.index.records  # type: ignore[attr-defined]
+
+
 @pytest.mark.parametrize("bad_size", [0, -1])
 def test_batch_invalid_size(bad_size: int) -> None:
     with pytest.raises(ValueError, match="size must be > 0"):
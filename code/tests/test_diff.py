@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from langchain_core.documents import Document
+
+from src.diff import ChunkColumns, compute_diff
+
+
+def _doc(item_id: str, chunk_id: str, checksum: str) -> Document:
+    return Document(page_content="", metadata={"item_id": item_id, "chunk_id": chunk_id, "checksum": checksum})
+
+
+def test_compute_diff() -> None:
+    db = ChunkColumns.from_documents([_doc("a", "a1", "1"), _doc("a", "a2", "1"), _doc("b", "b1", "1"), _doc("c", "c1", "1")])
+    crawled = ChunkColumns.from_documents([_doc("a", "x1", "1"), _doc("b", "x2", "2"), _doc("d", "x3", "1")])
+
+    add, touch, delete = compute_diff(crawled, db)
+
+    assert add.tolist() == [False, True, True]
+    assert [db.ids[i] for i in touch.nonzero()[0]] == ["a1", "a2"]
+    assert [db.ids[i] for i in delete.nonzero()[0]] == ["b1"]
+
+
+def test_compute_diff_empty_db() -> None:
+    add, touch, delete = compute_diff(ChunkColumns.from_documents([_doc("a", "x1", "1")]), ChunkColumns())
+
+    assert add.tolist() == [True]
+    assert not touch.size
+    assert not delete.size
+
+
+def test_chunk_columns_opensearch_id() -> None:
+    columns = ChunkColumns.from_documents([Document(page_content="", metadata={"id": "os-1", "item_id": "a", "chunk_id": "a1", "checksum": "1"})])
+
+    assert columns.ids == ["os-1"]
+    assert columns.keys.dtype.itemsize == 32
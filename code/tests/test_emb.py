@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import base64
+from types import SimpleNamespace
+from typing import Any
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings, FakeEmbeddings
+from pydantic import SecretStr
+
+from src.emb import (
+    CohereCompressedEmbeddings,
+    EmbeddingsPool,
+    OpenAIBase64Embeddings,
+    decode_base64_embedding,
+    get_embedding_provider,
+)
+
+
+def _b64(values: list[float]) -> str:
+    return base64.b64encode(np.asarray(values, dtype="<f4").tobytes()).decode()
+
+
+class FakeEmbeddingsClient:
+    def __init__(self) -> None:
+        self.calls: list[dict] = []
+
+    def create(self, input: list[Any], **kwargs: Any) -> SimpleNamespace:  # noqa: A002
+        self.calls.append({"input": input, **kwargs})
+        return SimpleNamespace(data=[SimpleNamespace(embedding=_b64([float(i), 0.5, -1.0])) for i, _ in enumerate(input)])
+
+
+def test_decode_base64_embedding() -> None:
+    arr = decode_base64_embedding(_b64([1.0, 2.5, -3.0]))
+    assert arr.dtype == np.float32
+    assert arr.tolist() == [1.0, 2.5, -3.0]
+
+
+def test_openai_base64_embed_documents() -> None:
+    emb = OpenAIBase64Embeddings(api_key=SecretStr("fake"), check_embedding_ctx_length=False, chunk_size=2)
+    client = FakeEmbeddingsClient()
+    emb.client = client
+
+    res = emb.embed_documents(["a", "b", "c"])
+
+    assert len(res) == 3
+    assert all(isinstance(r, np.ndarray) and r.dtype == np.float32 for r in res)
+    assert [r.tolist() for r in res] == [[0.0, 0.5, -1.0], [1.0, 0.5, -1.0], [0.0, 0.5, -1.0]]
+    assert len(client.calls) == 2
+    assert all(c["encoding_format"] == "base64" for c in client.calls)
+
+
+def test_openai_base64_embed_query_returns_list() -> None:
+    emb = OpenAIBase64Embeddings(api_key=SecretStr("fake"), check_embedding_ctx_length=False)
+    emb.client = FakeEmbeddingsClient()
+
+    res = emb.embed_query("a")
+
+    assert res == [0.0, 0.5, -1.0]
+
+
+class FakeCohereClient:
+    def __init__(self) -> None:
+        self.calls: list[dict] = []
+
+    def embed(self, **kwargs: Any) -> SimpleNamespace:
+        self.calls.append(kwargs)
+        return SimpleNamespace(embeddings=SimpleNamespace(int8=[[1, -2, 127], [-128, 0, 5]][: len(kwargs["texts"])]))
+
+
+async def test_cohere_compressed_embeddings() -> None:
+    emb = await get_embedding_provider("Cohere", "fake", {"model": "embed-english-v3.0", "embedding_types": ["int8"]})
+    assert isinstance(emb, CohereCompressedEmbeddings)
+    assert emb.embedding_type == "int8"
+
+    client = FakeCohereClient()
+    emb.client = client
+    res = emb.embed_documents(["a", "b"])
+
+    assert np.asarray(res).dtype == np.int8
+    assert np.asarray(res).tolist() == [[1, -2, 127], [-128, 0, 5]]
+    assert client.calls[0]["embedding_types"] == ["int8"]
+    assert emb.embed_query("a") == [1, -2, 127]
+
+
+async def test_cohere_compressed_embeddings_invalid_types() -> None:
+    with pytest.raises(ValueError, match="embedding_types"):
+        await get_embedding_provider("Cohere", "fake", {"model": "embed-english-v3.0", "embedding_types": ["int8", "binary"]})
+
+
+class FailingEmbeddings(Embeddings):
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:  # noqa: ARG002
+        self.calls += 1
+        raise RuntimeError("rate limited")
+
+    def embed_query(self, text: str) -> list[float]:  # noqa: ARG002
+        self.calls += 1
+        raise RuntimeError("rate limited")
+
+
+def test_embeddings_pool_spreads_batches() -> None:
+    pool = EmbeddingsPool([(FakeEmbeddings(size=4), 1), (FakeEmbeddings(size=4), 3)], batch_size=2)
+
+    res = pool.embed_documents([f"text {i}" for i in range(7)])
+
+    assert len(res) == 7
+    assert all(len(r) == 4 for r in res)
+
+
+def test_embeddings_pool_failover() -> None:
+    failing = FailingEmbeddings()
+    pool = EmbeddingsPool([(failing, 100), (FakeEmbeddings(size=4), 1)], batch_size=2)
+
+    res = pool.embed_documents([f"text {i}" for i in range(6)])
+
+    assert len(res) == 6
+    assert 1 <= failing.calls < 3, "Failed member should be put in cooldown after the first failure"
+    assert pool.get_members_order()[-1] == 0
+
+
+def test_embeddings_pool_all_members_fail() -> None:
+    pool = EmbeddingsPool([(FailingEmbeddings(), 1), (FailingEmbeddings(), 1)])
+
+    with pytest.raises(RuntimeError, match="All embeddings pool members failed"):
+        pool.embed_query("text")
+
+
+def test_embeddings_pool_requires_same_model() -> None:
+    with pytest.raises(ValueError, match="same model"):
+        EmbeddingsPool(
+            [
+                (OpenAIBase64Embeddings(api_key=SecretStr("fake"), model="text-embedding-3-small"), 1),
+                (OpenAIBase64Embeddings(api_key=SecretStr("fake"), model="text-embedding-3-large"), 1),
+            ]
+        )
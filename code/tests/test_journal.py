@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+from langchain_core.documents import Document
+
+from src.journal import DeltaJournal, JournalBatch
+from src.manifest import DeltaManifest, ManifestEntry
+from src.pipeline import DeltaChanges, apply_changes_pipelined, recover_from_journal
+from src.vcs import aupdate_db_with_manifest
+
+from .test_manifest import FakeKeyValueStore
+from .test_vcs import FakeVectorDb
+
+
+class FailingAddVectorDb(FakeVectorDb):
+    def add_documents(self, documents: list[Document], ids: list[str]) -> None:
+        super().add_documents(documents[:1], ids[:1])
+        raise RuntimeError("add failed")
+
+
+def _doc(item_id: str, chunk_id: str) -> Document:
+    return Document(page_content="", metadata={"item_id": item_id, "chunk_id": chunk_id, "checksum": "2", "last_seen_at": 1})
+
+
+async def test_journal_save_and_load() -> None:
+    kv_store = FakeKeyValueStore()
+    journal = DeltaJournal(kv_store)
+    await journal.begin([JournalBatch("delete", ["a1"], ["a"]), JournalBatch("add", [], ["a", "b"])])
+    await journal.mark_done(0)
+    await journal.save_done()
+
+    loaded = DeltaJournal(kv_store)
+    await loaded.load()
+    assert loaded.pending == [JournalBatch("add", [], ["a", "b"])]
+
+    await journal.commit()
+    loaded = DeltaJournal(kv_store)
+    await loaded.load()
+    assert not loaded.pending
+
+
+async def test_aupdate_db_with_manifest_commits_journal() -> None:
+    kv_store = FakeKeyValueStore()
+    db: Any = FakeVectorDb([_doc("a", "a1")])
+    journal = DeltaJournal(kv_store)
+
+    await apply_changes_pipelined(db, DeltaChanges([_doc("a", "a2")], [], {"a": ["a1"]}), journal)
+    assert db.added == ["a2"]
+    assert journal.batches, "The caller commits the journal"
+
+    manifest = DeltaManifest(FakeKeyValueStore())
+    await manifest.load_meta()
+    await aupdate_db_with_manifest(db, [_doc("b", "b1")], manifest, journal=journal)
+    assert not any(kv_store.records.values()), "Journal should be cleared after the manifest is saved"
+
+
+class FailingSaveManifest(DeltaManifest):
+    async def save(self) -> None:
+        raise RuntimeError("save failed")
+
+
+async def test_recover_from_journal_after_failed_manifest_save() -> None:
+    kv_store = FakeKeyValueStore()
+    db: Any = FakeVectorDb([_doc("a", "a1"), _doc("c", "c1")])
+    manifest_kv_store = FakeKeyValueStore()
+    manifest = DeltaManifest(manifest_kv_store)
+    await manifest.load_meta()
+    await manifest.set("a", ManifestEntry("1", ["a1"], 1))
+    await manifest.set("c", ManifestEntry("2", ["c1"], 1))
+    await manifest.save()
+
+    failing = FailingSaveManifest(manifest_kv_store)
+    await failing.load_meta()
+    journal = DeltaJournal(kv_store)
+    with pytest.raises(RuntimeError, match="save failed"):
+        await aupdate_db_with_manifest(db, [_doc("a", "a2"), _doc("b", "b1"), _doc("c", "c1")], failing, journal=journal)
+    assert sorted(db.added) == ["a2", "b1"], "All changes are written before the manifest is saved"
+
+    journal = DeltaJournal(kv_store)
+    await journal.load()
+    assert journal.batches, "Journal should not be cleared before the manifest is saved"
+    manifest = DeltaManifest(manifest_kv_store)
+    await manifest.load_meta()
+    await recover_from_journal(db, journal, manifest)
+
+    assert [d.metadata["chunk_id"] for d in db.documents] == ["c1"], "Items added but missing in the manifest should be deleted"
+    assert await manifest.get("a") is None
+    assert await manifest.get("c") == ManifestEntry("2", ["c1"], 1), "Unchanged items should be kept"
+    assert not any(kv_store.records.values())
+
+
+async def test_recover_from_journal_after_failed_add() -> None:
+    kv_store = FakeKeyValueStore()
+    db: Any = FailingAddVectorDb([_doc("a", "a1"), _doc("c", "c1")])
+    changes = DeltaChanges([_doc("a", "a2"), _doc("a", "a3"), _doc("b", "b1")], [], {"a": ["a1"]})
+
+    with pytest.raises(RuntimeError, match="add failed"):
+        await apply_changes_pipelined(db, changes, DeltaJournal(kv_store))
+    assert db.added == ["a2"], "Item a is stored partially"
+
+    journal = DeltaJournal(kv_store)
+    await journal.load()
+    manifest = DeltaManifest(FakeKeyValueStore())
+    await manifest.load_meta()
+    await manifest.set("a", ManifestEntry("1", ["a1"], 1))
+    await recover_from_journal(db, journal, manifest)
+
+    assert db.deleted_item_ids == [["a", "b"]]
+    assert [d.metadata["chunk_id"] for d in db.documents] == ["c1"]
+    assert await manifest.get("a") is None
+    assert not journal.pending
+    assert not any(kv_store.records.values())
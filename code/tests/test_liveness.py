@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from src.constants import DAY_IN_SECONDS
+from src.liveness import SeenItemsStore, hash_item_ids
+
+from .test_manifest import FakeKeyValueStore
+
+DAY1 = 100 * DAY_IN_SECONDS
+
+
+async def test_seen_items_record_and_merge_generations() -> None:
+    kv_store = FakeKeyValueStore()
+    store = SeenItemsStore(kv_store)
+    await store.load_meta()
+
+    await store.record(["a", "b"], DAY1 + 10)
+    await store.record(["b", "c"], DAY1 + 20)
+    await store.record(["d"], DAY1 + DAY_IN_SECONDS)
+
+    assert store.generations == [DAY1, DAY1 + DAY_IN_SECONDS]
+    assert len(await store.load_generation(DAY1)) == 3, "Runs of the same day should be merged"
+
+    loaded = SeenItemsStore(kv_store)
+    await loaded.load_meta()
+    assert loaded.generations == store.generations
+
+
+async def test_seen_items_since_and_delete_older() -> None:
+    store = SeenItemsStore(FakeKeyValueStore())
+    await store.load_meta()
+    assert not store.covers(DAY1)
+
+    await store.record(["a"], DAY1)
+    await store.record(["b"], DAY1 + DAY_IN_SECONDS)
+    await store.record(["c"], DAY1 + 2 * DAY_IN_SECONDS)
+
+    assert store.covers(DAY1 + 5)
+    assert not store.covers(DAY1 - 1)
+    seen = await store.get_seen_since(DAY1 + DAY_IN_SECONDS + 5)
+    assert sorted(seen.tolist()) == sorted(hash_item_ids(["b", "c"]).tolist())
+
+    await store.delete_older_than(DAY1 + DAY_IN_SECONDS + 5)
+    assert store.generations == [DAY1 + DAY_IN_SECONDS, DAY1 + 2 * DAY_IN_SECONDS]
+    assert not len(await store.load_generation(DAY1))
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from opensearchpy import ConnectionError as OpenSearchConnectionError
+from opensearchpy import NotFoundError
+from weaviate.exceptions import WeaviateQueryError
+
+import src.vector_stores.opensearch as opensearch_module
+import src.vector_stores.weaviate as weaviate_module
+from src.vector_stores.opensearch import OpenSearchDatabase
+from src.vector_stores.weaviate import WeaviateDatabase
+
+
+def _opensearch(error: Exception) -> OpenSearchDatabase:
+    def search(**kwargs: Any) -> None:  # noqa: ARG001
+        raise error
+
+    db = OpenSearchDatabase.__new__(OpenSearchDatabase)
+    db.__dict__.update(client=SimpleNamespace(search=search), index_name="test")
+    return db
+
+
+def test_opensearch_get_and_delete_by_item_ids_raise_on_error() -> None:
+    with pytest.raises(OpenSearchConnectionError):
+        _opensearch(OpenSearchConnectionError("N/A", "timeout", None)).get_by_item_ids(["a"])
+
+    with pytest.raises(OpenSearchConnectionError):
+        _opensearch(OpenSearchConnectionError("N/A", "timeout", None)).delete_by_item_ids(["a"])
+
+    assert _opensearch(NotFoundError(404, "index_not_found_exception", {})).get_by_item_ids(["a"]) == [], "Missing index has no objects"
+
+
+def _weaviate(*, exists: bool, count: int) -> WeaviateDatabase:
+    def fetch_objects(**kwargs: Any) -> None:  # noqa: ARG001
+        raise WeaviateQueryError("query failed", "GRPC")
+
+    collection = SimpleNamespace(
+        query=SimpleNamespace(fetch_objects=fetch_objects),
+        aggregate=SimpleNamespace(over_all=lambda **_: SimpleNamespace(total_count=count)),
+    )
+    collections = SimpleNamespace(get=lambda **_: collection, exists=lambda _: exists)
+    db = WeaviateDatabase.__new__(WeaviateDatabase)
+    db.__dict__.update(client=SimpleNamespace(collections=collections), collection_name="test")
+    return db
+
+
+def test_weaviate_get_by_item_ids_raises_unless_collection_is_empty() -> None:
+    with pytest.raises(WeaviateQueryError):
+        _weaviate(exists=True, count=5).get_by_item_ids(["a"])
+
+    assert _weaviate(exists=True, count=0).get_by_item_ids(["a"]) == []
+    assert _weaviate(exists=False, count=0).get_by_item_ids(["a"]) == []
+
+
+def test_weaviate_delete_by_item_ids_repeats_capped_batch_delete(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(weaviate_module, "MAX_QUERY_SIZE", 2)
+    objects = ["a1", "a2", "a3", "a4", "a5"]
+
+    def delete_many(where: Any, verbose: bool) -> SimpleNamespace:  # noqa: ARG001, FBT001
+        matched = objects[:2]
+        del objects[:2]
+        return SimpleNamespace(matches=len(matched), successful=len(matched), failed=0)
+
+    collection = SimpleNamespace(data=SimpleNamespace(delete_many=delete_many))
+    db = WeaviateDatabase.__new__(WeaviateDatabase)
+    db.__dict__.update(client=SimpleNamespace(collections=SimpleNamespace(get=lambda **_: collection)), collection_name="test")
+
+    db.delete_by_item_ids(["a"])
+    assert not objects, "Batch delete should be repeated until fewer objects than the limit match"
+
+    collection.data.delete_many = lambda where, verbose: SimpleNamespace(matches=2, successful=1, failed=1)  # noqa: ARG005
+    with pytest.raises(RuntimeError, match="Failed to delete 1 of 2 objects"):
+        db.delete_by_item_ids(["a"])
+
+
+class FakeAsyncOpenSearch:
+    """Async client returning a hit per object {_id: item_id} of the requested item_ids, at most `size` hits."""
+
+    def __init__(self, objects: dict[str, str]) -> None:
+        self.objects = objects
+        self.requests: list[list[str]] = []
+        self.closed = False
+
+    async def search(self, index: str, body: dict, params: dict) -> dict:  # noqa: ARG002
+        item_ids = body["query"]["terms"]["metadata.item_id"]
+        self.requests.append(item_ids)
+        hits = [{"_id": _id, "_source": {"metadata": {"item_id": i}}} for _id, i in self.objects.items() if i in item_ids]
+        return {"hits": {"hits": hits[: body["size"]]}}
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+async def test_opensearch_aget_by_item_ids_uses_async_client(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(opensearch_module, "MAX_SIZE", 2)
+    client = FakeAsyncOpenSearch({"a1": "a", "b1": "b", "c1": "c"})
+    db = OpenSearchDatabase.__new__(OpenSearchDatabase)
+    db.__dict__.update(index_name="test", async_client_factory=lambda: client, _async_client=None)
+
+    documents = await db.aget_by_item_ids(["a", "b", "c"])
+
+    assert sorted(d.metadata["id"] for d in documents) == ["a1", "b1", "c1"]
+    assert client.requests == [["a", "b", "c"], ["a"], ["b", "c"], ["b"], ["c"]], "Item_ids should be split when the limit is reached"
+    await db.aclose()
+    assert client.closed
+
+
+async def test_weaviate_aget_by_item_ids_uses_async_client() -> None:
+    async def fetch_objects(filters: Any, limit: int) -> SimpleNamespace:  # noqa: ARG001
+        return SimpleNamespace(objects=[SimpleNamespace(properties={"item_id": "a"}, uuid="a1")])
+
+    async def connect() -> None:
+        connected.append(True)
+
+    connected: list[bool] = []
+    collection = SimpleNamespace(query=SimpleNamespace(fetch_objects=fetch_objects))
+    client = SimpleNamespace(connect=connect, collections=SimpleNamespace(get=lambda **_: collection))
+    db = WeaviateDatabase.__new__(WeaviateDatabase)
+    db.__dict__.update(async_client_factory=lambda: client, _async_client=None, collection_name="test")
+
+    assert [d.metadata["chunk_id"] for d in await db.aget_by_item_ids(["a"])] == ["a1"]
+    assert [d.metadata["chunk_id"] for d in await db.aget_by_item_ids(["a"])] == ["a1"]
+    assert connected == [True], "The async client should be connected once"
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import gzip
+import json
+from typing import Any
+
+from src.manifest import MIN_SHARDS, DeltaManifest, ManifestEntry, get_number_of_shards
+
+
+class FakeKeyValueStore:
+    def __init__(self) -> None:
+        self.records: dict[str, Any] = {}
+        self.reads: list[str] = []
+
+    async def get_value(self, key: str) -> Any:
+        self.reads.append(key)
+        return self.records.get(key)
+
+    async def set_value(self, key: str, value: Any, content_type: str | None = None) -> None:  # noqa: ARG002
+        self.records[key] = value
+
+
+def test_get_number_of_shards() -> None:
+    assert get_number_of_shards(0) == MIN_SHARDS
+    assert get_number_of_shards(1_000_000) == 128
+
+
+async def test_manifest_save_and_load_lazily() -> None:
+    kv_store = FakeKeyValueStore()
+    manifest = DeltaManifest(kv_store)
+    await manifest.load_meta()
+    assert manifest.is_empty
+
+    await manifest.set("item1", ManifestEntry("c1", ["a", "b"], 10))
+    await manifest.set("item2", ManifestEntry("c2", ["c"], 20))
+    await manifest.save()
+
+    shard_keys = [k for k in kv_store.records if k != manifest.meta_key]
+    assert len(shard_keys) == MIN_SHARDS
+    assert sum(len(json.loads(gzip.decompress(kv_store.records[k]))) for k in shard_keys) == 2
+
+    kv_store.reads.clear()
+    manifest = DeltaManifest(kv_store)
+    await manifest.load_meta()
+    assert not manifest.is_empty
+    assert await manifest.get("item1") == ManifestEntry("c1", ["a", "b"], 10)
+    assert len(kv_store.reads) == 2, "Only the meta and a single shard should be loaded"
+
+    assert await manifest.delete_expired(15) == ["a", "b"]
+    await manifest.save()
+    assert await manifest.get("item1") is None
+    assert await manifest.get("item2") == ManifestEntry("c2", ["c"], 20)
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+from pymilvus.exceptions import MilvusException  # type: ignore
+
+from src.vector_stores.milvus import MilvusDatabase
+
+
+class FakeClient:
+    """Client failing partial upserts with the given error, recording upserts."""
+
+    def __init__(self, error: MilvusException) -> None:
+        self.error = error
+        self.upserts: list[list[dict]] = []
+
+    def upsert(self, collection_name: str, data: list[dict], partial_update: bool = False) -> None:  # noqa: ARG002, FBT001, FBT002
+        if partial_update:
+            raise self.error
+        self.upserts.append(data)
+
+    def get(self, collection_name: str, ids: list[str]) -> list[dict]:  # noqa: ARG002
+        return [{"pk": _id, "vector": [0.0], "last_seen_at": 0} for _id in ids]
+
+
+def _milvus(error: MilvusException) -> Any:
+    db = MilvusDatabase.__new__(MilvusDatabase)
+    # client is a property of langchain-milvus
+    db.__dict__.update(_milvus_client=FakeClient(error), collection_name="test", _primary_field="pk", partial_update_supported=True)
+    return db
+
+
+def test_update_last_seen_at_falls_back_only_if_partial_update_is_unsupported() -> None:
+    db = _milvus(MilvusException(message="Insert missed an field `vector` to collection without set nullable==true or set default_value"))
+    db.update_last_seen_at(["a"], 10)
+    assert not db.partial_update_supported
+    assert db.client.upserts == [[{"pk": "a", "vector": [0.0], "last_seen_at": 10}]]
+
+    db = _milvus(MilvusException(message="rate limit exceeded"))
+    with pytest.raises(MilvusException):
+        db.update_last_seen_at(["a"], 10)
+    assert db.partial_update_supported, "Partial updates should not be disabled by other errors"
+    assert not db.client.upserts
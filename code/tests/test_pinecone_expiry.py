@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+import src.vector_stores.pinecone as pinecone_module
+from src.vector_stores.pinecone import PineconeDatabase
+
+if TYPE_CHECKING:
+    import pytest
+
+
+class FakeIndex:
+    """Index with objects {id: last_seen_at}, query returns at most top_k matches and list returns pages of 2 ids."""
+
+    def __init__(self, objects: dict[str, int]) -> None:
+        self.objects = dict(objects)
+        self.deleted: list[list[str]] = []
+        self.queries = 0
+
+    def query(self, top_k: int, filter: dict, **kwargs: Any) -> dict:  # noqa: A002, ARG002
+        self.queries += 1
+        expired_ts = filter["last_seen_at"]["$lt"]
+        return {"matches": [{"id": _id} for _id, ts in self.objects.items() if ts < expired_ts][:top_k]}
+
+    def fetch(self, ids: list[str], namespace: str | None = None) -> dict:  # noqa: ARG002
+        return {"vectors": {_id: {"metadata": {"last_seen_at": self.objects[_id]}} for _id in ids}}
+
+    def delete(self, ids: list[str], namespace: str | None = None) -> None:  # noqa: ARG002
+        self.deleted.append(ids)
+        for _id in ids:
+            self.objects.pop(_id)
+
+    # defined last, list would shadow the builtin in annotations of the following methods
+    def list(self, namespace: str | None = None, **kwargs: Any) -> Any:  # noqa: ARG002
+        ids = list(self.objects)
+        for i in range(0, len(ids), 2):
+            yield ids[i : i + 2]
+
+
+def _db(index: FakeIndex, *, use_id_prefix: bool) -> PineconeDatabase:
+    db = PineconeDatabase.__new__(PineconeDatabase)
+    # index is a property of newer langchain-pinecone versions
+    db.__dict__.update(index=index, _index=index)
+    db.namespace, db.use_id_prefix, db._dummy_vector = None, use_id_prefix, [0.0]
+    return db
+
+
+OBJECTS = {f"item{i}#c{i}": i for i in range(7)}
+
+
+def test_delete_expired_queries_until_all_expired_are_deleted(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(pinecone_module, "MAX_TOP_K", 2)
+    monkeypatch.setattr(pinecone_module, "DELETE_BATCH_SIZE", 1)
+    index = FakeIndex(OBJECTS)
+
+    _db(index, use_id_prefix=False).delete_expired(5)
+
+    assert sorted(index.objects) == ["item5#c5", "item6#c6"]
+    assert sorted(_id for ids in index.deleted for _id in ids) == [f"item{i}#c{i}" for i in range(5)]
+    assert index.queries == 3, "Querying should stop after a page shorter than top_k"
+
+
+class StaleIndex(FakeIndex):
+    """Index whose queries return deleted objects until `stale_queries` queries after the last delete."""
+
+    def __init__(self, objects: dict[str, int], stale_queries: int) -> None:
+        super().__init__(objects)
+        self.stale_queries = stale_queries
+        self.visible = dict(objects)
+        self.since_delete = 0
+
+    def query(self, top_k: int, filter: dict, **kwargs: Any) -> dict:  # noqa: A002, ARG002
+        self.queries += 1
+        self.since_delete += 1
+        if self.since_delete > self.stale_queries:
+            self.visible = dict(self.objects)
+        return {"matches": [{"id": _id} for _id, ts in self.visible.items() if ts < filter["last_seen_at"]["$lt"]][:top_k]}
+
+    def delete(self, ids: list[str], namespace: str | None = None) -> None:
+        super().delete(ids, namespace)
+        self.since_delete = 0
+
+
+def test_delete_expired_retries_query_returning_deleted_objects(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(pinecone_module, "MAX_TOP_K", 2)
+    monkeypatch.setattr(pinecone_module, "EXPIRY_QUERY_RETRY_SECS", 0)
+    index = StaleIndex(OBJECTS, stale_queries=2)
+
+    _db(index, use_id_prefix=False).delete_expired(5)
+
+    assert sorted(index.objects) == ["item5#c5", "item6#c6"], "Stale queries should be retried until new expired objects are returned"
+
+    monkeypatch.setattr(pinecone_module, "EXPIRY_QUERY_RETRIES", 1)
+    index = StaleIndex(OBJECTS, stale_queries=2)
+
+    _db(index, use_id_prefix=False).delete_expired(5)
+
+    assert len(index.objects) == 5, "Deleting should stop after the retries are exhausted"
+    assert index.queries == 3, "The query after the first delete should be retried once"
+
+
+def test_delete_expired_with_id_prefix_scans_namespace() -> None:
+    index = FakeIndex(OBJECTS)
+
+    _db(index, use_id_prefix=True).delete_expired(3)
+
+    assert not index.queries, "Ids should be listed instead of queried"
+    assert sorted(index.objects) == ["item3#c3", "item4#c4", "item5#c5", "item6#c6"]
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from typing import Any
+
+from src.vector_stores.pinecone import PineconeDatabase
+
+
+class FakeIndex:
+    """Index with vectors {id: (values, metadata)}, list returns pages of 2 ids."""
+
+    def __init__(self, vectors: dict[str, tuple[list[float], dict]]) -> None:
+        self.vectors = dict(vectors)
+
+    def fetch(self, ids: list[str], namespace: str | None = None) -> dict:  # noqa: ARG002
+        return {"vectors": {_id: {"values": self.vectors[_id][0], "metadata": self.vectors[_id][1]} for _id in ids}}
+
+    def upsert(self, vectors: list[tuple], namespace: str | None = None) -> None:  # noqa: ARG002
+        self.vectors.update({_id: (values, metadata) for _id, values, metadata in vectors})
+
+    def delete(self, ids: list[str], namespace: str | None = None) -> None:  # noqa: ARG002
+        for _id in ids:
+            self.vectors.pop(_id)
+
+    # defined last, list would shadow the builtin in annotations of the following methods
+    def list(self, namespace: str | None = None, **kwargs: Any) -> Any:  # noqa: ARG002
+        ids = sorted(self.vectors)
+        for i in range(0, len(ids), 2):
+            yield ids[i : i + 2]
+
+
+def test_migrate_to_id_prefix() -> None:
+    index = FakeIndex(
+        {
+            "c0": ([0.0], {"item_id": "a", "chunk_id": "c0", "text": "t0"}),
+            "c1": ([1.0], {"item_id": "b", "chunk_id": "c1", "text": "t1"}),
+            "a#c2": ([2.0], {"item_id": "a", "chunk_id": "a#c2", "text": "t2"}),
+            "c3": ([3.0], {"chunk_id": "c3", "text": "t3"}),
+        }
+    )
+    db = PineconeDatabase.__new__(PineconeDatabase)
+    # index is a property of newer langchain-pinecone versions
+    db.__dict__.update(index=index, _index=index)
+    db.namespace, db.upsert_batch_size = None, 1
+
+    assert db.migrate_to_id_prefix() == 2
+    assert sorted(index.vectors) == ["a#c0", "a#c2", "b#c1", "c3"], "Vectors without item_id should not be migrated"
+    assert index.vectors["b#c1"] == ([1.0], {"item_id": "b", "chunk_id": "b#c1", "text": "t1"})
+
+    assert db.migrate_to_id_prefix() == 0, "Migrated vectors should be skipped"
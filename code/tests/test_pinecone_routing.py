@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from src.vector_stores.pinecone import PineconeDatabase
+
+NAMESPACE1 = "namespace1"
+NAMESPACE2 = "namespace2"
+
+
+def _pinecone() -> PineconeDatabase:
+    db = PineconeDatabase.__new__(PineconeDatabase)
+    index = object()
+    # index is a property of newer langchain-pinecone versions
+    db.__dict__.update(index=index, _index=index)
+    return db
+
+
+def test_set_namespace() -> None:
+    db = _pinecone()
+
+    db.set_namespace(NAMESPACE1)
+    assert (db.namespace, db._namespace) == (NAMESPACE1, NAMESPACE1), "LangChain methods should use the namespace"
+
+    db.set_namespace("")
+    assert (db.namespace, db._namespace) == (None, None), "Empty namespace is the default namespace"
+
+
+def test_with_namespace_shares_index() -> None:
+    db = _pinecone()
+    db.set_namespace(NAMESPACE1)
+
+    db2 = db.with_namespace(NAMESPACE2)
+
+    assert db2.index is db.index
+    assert (db.namespace, db2.namespace) == (NAMESPACE1, NAMESPACE2)
+    assert db2._namespace == NAMESPACE2, "LangChain methods should use the new namespace"
+    assert db.with_namespace("").namespace is None
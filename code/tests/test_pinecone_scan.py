@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import Any
+
+from langchain_core.documents import Document
+
+from src.vcs import acompare_crawled_data_with_db
+from src.vector_stores.pinecone import PineconeDatabase
+
+
+class FakeIndex:
+    """Pod-based index with stats of two namespaces, list is not supported."""
+
+    def __init__(self) -> None:
+        self.queries: list[dict] = []
+
+    def describe_index_stats(self, **kwargs: Any) -> dict:  # noqa: ARG002
+        return {"total_vector_count": 5, "namespaces": {"": {"vector_count": 1}, "ns": {"vector_count": 4}}}
+
+    def query(self, filter: dict, **kwargs: Any) -> dict:  # noqa: A002, ARG002
+        self.queries.append(filter)
+        return {"matches": [{"id": "a1", "metadata": {"item_id": "a", "chunk_id": "a1", "checksum": "1"}}]}
+
+    # defined last, list would shadow the builtin in annotations of the following methods
+    def list(self, **kwargs: Any) -> Any:  # noqa: ARG002
+        raise AssertionError("Ids cannot be listed in a pod-based index")
+
+
+def _db(namespace: str | None) -> Any:
+    db = PineconeDatabase.__new__(PineconeDatabase)
+    index = FakeIndex()
+    # index is a property of newer langchain-pinecone versions
+    db.__dict__.update(
+        index=index, _index=index, client=SimpleNamespace(describe_index=lambda _: SimpleNamespace(to_dict=lambda: {"spec": {"pod": {}}}))
+    )
+    db.namespace, db.use_id_prefix, db._dummy_vector = namespace, False, [0.0]
+    db.supports_metadata_scan = db.is_serverless_index("test")
+    return db
+
+
+def test_count_of_namespace() -> None:
+    assert _db(None).count() == 1
+    assert _db("ns").count() == 4
+    assert _db("other").count() == 0
+
+
+async def test_pod_index_compares_by_lookups() -> None:
+    db = _db(None)
+    assert not db.supports_metadata_scan
+
+    changes = await acompare_crawled_data_with_db(db, [Document(page_content="", metadata={"item_id": "a", "chunk_id": "x", "checksum": "1"})])
+
+    assert changes.ids_update_last_seen == ["a1"], "Crawled items covering the namespace should be looked up instead of scanned"
+    assert db.index.queries
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from concurrent.futures import Future
+from typing import Any
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from pinecone.exceptions import PineconeException  # type: ignore[import-untyped]
+
+from src.vector_stores.pinecone import PineconeDatabase
+
+
+class FakeIndex:
+    """Index with async upserts (futures are resolved later), the first async upsert fails."""
+
+    def __init__(self) -> None:
+        self.upserts: list[list[str]] = []
+        self.pending: list[Future] = []
+        self.max_pending = 0
+
+    def upsert(self, vectors: list[tuple], namespace: str | None, *, async_req: bool = False) -> Any:  # noqa: ARG002
+        self.upserts.append([v[0] for v in vectors])
+        if not async_req:
+            return None
+        future: Future = Future()
+        self.pending = [f for f in self.pending if not f.done()] + [future]
+        self.max_pending = max(self.max_pending, len(self.pending))
+        if len(self.upserts) == 1:
+            future.set_exception(PineconeException("upsert failed"))
+        else:
+            future.set_result(None)
+        return future
+
+
+def test_add_documents_upserts_batches_with_retry() -> None:
+    db = PineconeDatabase.__new__(PineconeDatabase)
+    db._embedding = DeterministicFakeEmbedding(size=4)
+    db._text_key = "text"
+    index = FakeIndex()
+    # index is a property of newer langchain-pinecone versions
+    db.__dict__.update(index=index, _index=index)
+    db.namespace, db.use_id_prefix = None, True
+    db.embedding_batch_size, db.upsert_batch_size, db.upsert_concurrency = 4, 3, 2
+    docs = [Document(page_content=f"text {i}", metadata={"item_id": f"item{i}", "chunk_id": f"c{i}"}) for i in range(7)]
+
+    ids = db.add_documents(docs, ids=[d.metadata["chunk_id"] for d in docs])
+
+    assert ids == [f"item{i}#c{i}" for i in range(7)]
+    first_batch = ["item0#c0", "item1#c1", "item2#c2"]
+    # The failed batch is retried when waited for, after the next batch is already in flight
+    assert index.upserts == [first_batch, ["item3#c3"], first_batch, ["item4#c4", "item5#c5", "item6#c6"]]
+    assert index.max_pending <= db.upsert_concurrency
+    assert docs[0].metadata == {"item_id": "item0", "chunk_id": "c0"}, "Original documents should not be changed"
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, ClassVar
+
+from langchain_core.documents import Document
+
+from src.pipeline import DeltaChanges, apply_changes_pipelined, batch_items
+
+
+class RecordingVectorDb:
+    pipeline_concurrency: ClassVar[dict[str, int]] = {"delete": 2, "add": 2, "touch": 2}
+    use_async_client = False
+
+    def __init__(self) -> None:
+        self.events: list[tuple[str, list[str]]] = []
+        self.lock = threading.Lock()
+
+    def _record(self, op: str, ids: list[str]) -> None:
+        with self.lock:
+            self.events.append((op, ids))
+
+    def delete(self, ids: list[str]) -> None:
+        time.sleep(0.05)  # slow deletes, adds of other items should not wait for them
+        self._record("delete", ids)
+
+    def add_documents(self, documents: list[Document], ids: list[str]) -> None:  # noqa: ARG002
+        self._record("add", ids)
+
+    def update_last_seen_at(self, ids: list[str]) -> None:
+        self._record("touch", ids)
+
+
+def _doc(item_id: str, chunk_id: str) -> Document:
+    return Document(page_content="", metadata={"item_id": item_id, "chunk_id": chunk_id})
+
+
+def test_batch_items_keeps_items_together() -> None:
+    batches = list(batch_items({"a": ["a1", "a2"], "b": ["b1"], "c": ["c1", "c2", "c3"]}, size=2))
+
+    assert batches == [(["a"], ["a1", "a2"]), (["b", "c"], ["b1", "c1", "c2", "c3"])]
+
+
+async def test_apply_changes_pipelined_deletes_before_add(monkeypatch: Any) -> None:
+    monkeypatch.setattr("src.pipeline.ADD_BATCH_SIZE", 1)
+    db: Any = RecordingVectorDb()
+    changes = DeltaChanges([_doc("new", "n1"), _doc("changed", "c2")], ["u1"], {"changed": ["c1"]})
+
+    await apply_changes_pipelined(db, changes)
+
+    ops = [op for op, _ in db.events]
+    assert sorted(ops) == ["add", "add", "delete", "touch"]
+    assert ops.index("delete") < db.events.index(("add", ["c2"])), "Old chunks must be deleted before the new chunks are added"
+    assert db.events.index(("add", ["n1"])) < ops.index("delete"), "Adding a new item should not wait for deletes"
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+from langchain_core.documents import Document
+
+from src.bloom import ItemIdsBloomFilter
+from src.constants import DAY_IN_SECONDS
+from src.liveness import SeenItemsStore
+from src.manifest import DeltaManifest, ManifestEntry
+from src.planner import estimate_tokens, plan_run
+
+from .test_manifest import FakeKeyValueStore
+from .test_vcs import FakeScannableVectorDb, FakeVectorDb
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+def _doc(item_id: str, chunk_id: str, checksum: str, last_seen_at: int = 1, text: str = "") -> Document:
+    return Document(page_content=text, metadata={"item_id": item_id, "chunk_id": chunk_id, "checksum": checksum, "last_seen_at": last_seen_at})
+
+
+DB_DOCUMENTS = [_doc("a", "a1", "1"), _doc("b", "b1", "1"), _doc("b", "b2", "1"), _doc("c", "c1", "1"), _doc("z", "z1", "1", last_seen_at=5)]
+DATA = [_doc("a", "a1", "1"), _doc("b", "b3", "2", text="x" * 9), _doc("d", "d1", "1", text="x" * 4)]
+
+
+def test_estimate_tokens() -> None:
+    assert estimate_tokens(DATA) == 3 + 1
+
+
+async def test_plan_run_delta_updates() -> None:
+    db: Any = FakeScannableVectorDb(list(DB_DOCUMENTS))
+
+    plan = await plan_run(db, DATA, "deltaUpdates", "text-embedding-3-small", timestamp_expired=2)
+
+    assert (plan.items, plan.chunks, plan.add, plan.delete, plan.touch) == (3, 3, 2, 2, 1)
+    assert plan.expire == 1, "Only c1 is expired, a1 is touched, b1 and b2 are deleted and z1 was seen recently"
+    assert plan.expire_counted_by == "scan"
+    assert plan.embedding_tokens == 4
+    assert plan.embedding_cost_usd == 0
+    assert plan.write_requests == {"add": 1, "delete": 1, "touch": 1}
+    assert not db.added
+    assert not db.deleted
+    assert not db.updated
+    assert len(db.documents) == len(DB_DOCUMENTS)
+
+
+class CountingVectorDb(FakeVectorDb):
+    """Database with a filtered count of expired objects and without a metadata export."""
+
+    def count_expired(self, expired_ts: int) -> int | None:
+        return sum(1 for d in self.documents if d.metadata["last_seen_at"] < expired_ts)
+
+
+async def test_plan_run_counts_expired_by_filtered_count() -> None:
+    db: Any = CountingVectorDb(list(DB_DOCUMENTS))
+
+    plan = await plan_run(db, DATA, "deltaUpdates", None, timestamp_expired=2)
+
+    assert plan.expire == 1, "Expired objects of the crawled items (a1, b1, b2) are touched or deleted, only c1 is expired"
+    assert plan.expire_counted_by == "count"
+
+
+async def test_plan_run_does_not_count_expired_without_count_or_scan() -> None:
+    db: Any = FakeVectorDb(list(DB_DOCUMENTS))
+    db.supports_metadata_scan = False
+
+    plan = await plan_run(db, DATA, "deltaUpdates", None, timestamp_expired=2)
+
+    assert (plan.expire, plan.expire_counted_by) == (0, None)
+
+
+class NoLastSeenAtVectorDb(FakeScannableVectorDb):
+    """Database whose metadata export does not return last_seen_at."""
+
+    def iter_metadata(self, batch_size: int = 2) -> Iterator[list[Document]]:
+        for batch in super().iter_metadata(batch_size):
+            yield [Document(page_content="", metadata={k: v for k, v in d.metadata.items() if k != "last_seen_at"}) for d in batch]
+
+
+async def test_plan_run_without_last_seen_at_in_metadata() -> None:
+    db: Any = NoLastSeenAtVectorDb(list(DB_DOCUMENTS))
+
+    plan = await plan_run(db, DATA, "deltaUpdates", None, timestamp_expired=2)
+
+    assert plan.expire == 0, "Objects without last_seen_at should not be counted as expired"
+
+
+async def test_plan_run_with_manifest_and_bloom_filter() -> None:
+    kv_store = FakeKeyValueStore()
+    manifest = DeltaManifest(kv_store)
+    await manifest.load_meta()
+    await manifest.set("a", ManifestEntry("1", ["a1"], 1))
+    await manifest.set("b", ManifestEntry("1", ["b1", "b2"], 1))
+    await manifest.save()
+    db: Any = FakeVectorDb(list(DB_DOCUMENTS))
+
+    manifest = DeltaManifest(kv_store)
+    await manifest.load_meta()
+    plan = await plan_run(db, DATA, "deltaUpdates", None, manifest=manifest)
+    assert (plan.add, plan.delete, plan.touch) == (2, 2, 1)
+    assert not db.batches, "Changes should be compared with the manifest"
+    assert not manifest.dirty
+
+    plan = await plan_run(db, DATA, "deltaUpdates", None, manifest=manifest, reconcile=True)
+    assert (plan.add, plan.delete, plan.touch) == (2, 2, 1)
+    assert sorted(i for batch in db.batches for i in batch) == ["a", "b", "d"], "Reconciliation compares with the database"
+
+    db.batches.clear()
+    bloom_filter = ItemIdsBloomFilter()
+    bloom_filter.add_many(["a", "b", "c"])
+    plan = await plan_run(db, DATA, "deltaUpdates", None, bloom_filter=bloom_filter)
+    assert (plan.add, plan.delete, plan.touch) == (2, 2, 1)
+    assert sorted(i for batch in db.batches for i in batch) == ["a", "b"], "Items not in the Bloom filter should not be looked up"
+    assert len(bloom_filter) == 3
+
+
+async def test_plan_run_upsert_and_add() -> None:
+    db: Any = FakeScannableVectorDb(list(DB_DOCUMENTS))
+
+    plan = await plan_run(db, DATA, "upsert", None)
+    assert (plan.add, plan.delete, plan.touch, plan.expire) == (3, 3, 0, 0)
+    assert plan.embedding_cost_usd is None
+
+    plan = await plan_run(db, DATA, "add", None)
+    assert (plan.add, plan.delete, plan.touch) == (3, 0, 0)
+    assert not db.batches, "Add strategy does not query the database"
+
+
+async def test_plan_run_with_seen_items() -> None:
+    db: Any = FakeScannableVectorDb(list(DB_DOCUMENTS))
+    seen_items = SeenItemsStore(FakeKeyValueStore())
+    await seen_items.record(["c"], 2 * DAY_IN_SECONDS)
+
+    # Generations do not cover the period, nothing expires
+    plan = await plan_run(db, DATA, "deltaUpdates", None, timestamp_expired=1, seen_items=seen_items)
+    assert (plan.touch, plan.expire) == (0, 0)
+
+    plan = await plan_run(db, DATA, "deltaUpdates", None, timestamp_expired=2 * DAY_IN_SECONDS, seen_items=seen_items)
+    assert plan.expire == 1, "Only z1 expires, items a, b and d are crawled and c was seen"
+    assert plan.expire_counted_by == "scan", "Seen items are not in the database, they cannot be counted by a filter"
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from typing import Any
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from qdrant_client.models import BinaryQuantization, Datatype, Distance, HnswConfigDiff, ScalarQuantization, VectorParams
+
+from src.models import QdrantIntegration
+from src.vector_stores.qdrant import QdrantDatabase
+
+
+class FakeClient:
+    def __init__(self) -> None:
+        self.created: list[tuple[str, dict]] = []
+
+    def collection_exists(self, collection_name: str) -> bool:  # noqa: ARG002
+        return False
+
+    def create_collection(self, collection_name: str, **kwargs: Any) -> None:
+        self.created.append((collection_name, kwargs))
+
+
+def _input(**kwargs: Any) -> QdrantIntegration:
+    return QdrantIntegration(
+        qdrantUrl="http://localhost:6333",
+        qdrantCollectionName="test",
+        embeddingsProvider="OpenAI",
+        embeddingsApiKey="fake",
+        datasetFields=["text"],
+        **kwargs,
+    )
+
+
+def test_get_collection_params() -> None:
+    assert QdrantDatabase.get_collection_params(_input()) == {}, "Qdrant defaults should be used"
+
+    params = QdrantDatabase.get_collection_params(
+        _input(qdrantQuantization="scalar", qdrantOnDiskPayload=True, qdrantHnswM=32, qdrantShardNumber=2, qdrantReplicationFactor=3)
+    )
+    assert isinstance(params.pop("quantization_config"), ScalarQuantization)
+    assert params == {"hnsw_config": HnswConfigDiff(m=32), "on_disk_payload": True, "shard_number": 2, "replication_factor": 3}
+
+    params = QdrantDatabase.get_collection_params(_input(qdrantQuantization="binary", qdrantHnswM=0))
+    assert isinstance(params["quantization_config"], BinaryQuantization)
+    assert params["hnsw_config"] == HnswConfigDiff(m=0), "m=0 disables the HNSW graph and should be kept"
+
+
+def test_create_uint8_collection_with_tuning() -> None:
+    client: Any = FakeClient()
+
+    QdrantDatabase.create_uint8_collection(client, _input(qdrantOnDiskVectors=True, qdrantQuantization="scalar"), DeterministicFakeEmbedding(size=4))
+
+    [(name, kwargs)] = client.created
+    assert name == "test"
+    assert kwargs["vectors_config"] == VectorParams(size=4, distance=Distance.COSINE, datatype=Datatype.UINT8, on_disk=True)
+    assert isinstance(kwargs["quantization_config"], ScalarQuantization)
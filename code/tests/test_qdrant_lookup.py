@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+from qdrant_client.models import Record
+
+import src.vector_stores.qdrant as qdrant_module
+from src.vector_stores.qdrant import QdrantDatabase
+
+if TYPE_CHECKING:
+    import pytest
+
+
+class FakeClient:
+    """Client scrolling points {id: item_id} by pages, recording the requested payload."""
+
+    def __init__(self, points: dict[int, str]) -> None:
+        self.points = points
+        self.payloads: list[Any] = []
+
+    def scroll(self, collection_name: str, scroll_filter: Any, with_payload: Any, limit: int, offset: int | None = None, **kwargs: Any) -> tuple:  # noqa: ARG002
+        self.payloads.append(with_payload)
+        match = scroll_filter.must[0].match
+        item_ids = set(match.any) if hasattr(match, "any") else {match.value}
+        ids = [_id for _id, item_id in sorted(self.points.items()) if item_id in item_ids and _id >= (offset or 0)]
+        records = [Record(id=_id, payload={"metadata": {"item_id": self.points[_id], "checksum": "c"}}) for _id in ids[:limit]]
+        return records, ids[limit] if len(ids) > limit else None
+
+
+def test_get_by_item_ids_scrolls_all_pages_with_lookup_payload(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(qdrant_module, "SCROLL_PAGE_SIZE", 2)
+    client = FakeClient({1: "a", 2: "b", 3: "a", 4: "c", 5: "a"})
+    db = QdrantDatabase.__new__(QdrantDatabase)
+    db.__dict__.update(client=client, _client=client, collection_name="test", metadata_payload_key="metadata")
+
+    documents = db.get_by_item_ids(["a", "b"])
+
+    assert [d.metadata["chunk_id"] for d in documents] == [1, 2, 3, 5]
+    assert len(client.payloads) == 2
+    assert client.payloads[0] == ["metadata.item_id", "metadata.checksum", "metadata.last_seen_at"], "Page content should not be returned"
+
+    client.payloads.clear()
+    assert [d.metadata["chunk_id"] for d in db.get_by_item_id("a")] == [1, 3, 5]
+    assert client.payloads == [True, True], "A single item should be returned with the full payload"
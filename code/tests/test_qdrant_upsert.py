@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.vector_stores.qdrant import QdrantDatabase
+
+
+class FakeClient:
+    """Client recording upserts and payload updates, upserts are slow to let them run in parallel."""
+
+    def __init__(self) -> None:
+        self.upserts: list[list[str]] = []
+        self.payload_updates: list[tuple[dict, bool]] = []
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def upsert(self, collection_name: str, points: list, wait: bool = True) -> None:  # noqa: ARG002, FBT001, FBT002
+        assert not wait, "Upserts should not wait until they are applied"
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.02)
+        with self.lock:
+            self.running -= 1
+            self.upserts.append([p.id for p in points])
+
+    def set_payload(self, collection_name: str, payload: dict, points: Any, wait: bool = True) -> None:  # noqa: ARG002, FBT001, FBT002
+        self.payload_updates.append((payload, wait))
+
+
+def test_add_documents_upserts_in_parallel_and_flushes() -> None:
+    db = QdrantDatabase.__new__(QdrantDatabase)
+    client = FakeClient()
+    db.__dict__.update(
+        client=client,
+        _client=client,
+        collection_name="test",
+        embeddings=DeterministicFakeEmbedding(size=4),
+        _embeddings=DeterministicFakeEmbedding(size=4),
+        content_payload_key="page_content",
+        metadata_payload_key="metadata",
+        vector_name=None,
+    )
+    db.upsert_batch_size, db.upsert_parallelism, db._unflushed_writes = 2, 2, False
+    ids = [f"00000000-0000-0000-0000-00000000000{i}" for i in range(5)]
+    docs = [Document(page_content=f"text {i}", metadata={"item_id": f"item{i}"}) for i in range(5)]
+
+    db.flush()
+    assert not client.payload_updates, "Nothing to flush"
+
+    assert db.add_documents(docs, ids=ids) == ids
+    assert sorted(_id for batch in client.upserts for _id in batch) == ids
+    assert sorted(len(batch) for batch in client.upserts) == [1, 2, 2]
+    assert client.max_running == 2
+
+    db.flush()
+    assert client.payload_updates == [({}, True)], "Flush should wait for an empty write sent to all shards"
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING, Any, ClassVar
+
+import pytest
+from langchain_core.documents import Document
+
+from src.bloom import ItemIdsBloomFilter
+from src.constants import DAY_IN_SECONDS
+from src.liveness import SeenItemsStore
+from src.manifest import DeltaManifest, ManifestEntry
+from src.vcs import (
+    acompare_crawled_data_with_db,
+    aget_bloom_filter_from_db,
+    aget_items_ids_from_db,
+    aupdate_db_with_crawled_data,
+    aupdate_db_with_manifest,
+    delete_unseen_items,
+    migrate_manifest_to_id_prefix,
+    should_scan_database,
+    upsert_db_with_crawled_data,
+)
+
+from .test_manifest import FakeKeyValueStore
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+class FakeVectorDb:
+    """In-memory stand-in for a database recording the requested changes."""
+
+    get_by_item_ids_batch_size = 2
+    pipeline_concurrency: ClassVar[dict[str, int]] = {"delete": 1, "add": 2, "touch": 1}
+    use_async_client = False
+    write_batch_sizes: ClassVar[dict[str, int]] = {"add": 2, "delete": 10, "touch": 10}
+
+    def __init__(self, documents: list[Document], fail_on: str | None = None, delay: float = 0) -> None:
+        self.documents = documents
+        self.fail_on = fail_on
+        self.delay = delay
+        self.batches: list[list[str]] = []
+        self.added: list[str] = []
+        self.deleted: list[str] = []
+        self.updated: list[str] = []
+        self.deleted_item_ids: list[list[str]] = []
+
+    async def aget_by_item_ids(self, item_ids: list[str]) -> list[Document]:
+        self.batches.append(item_ids)
+        await asyncio.sleep(self.delay)
+        if self.fail_on in item_ids:
+            raise RuntimeError("lookup failed")
+        return [d for d in self.documents if d.metadata["item_id"] in item_ids]
+
+    def add_documents(self, documents: list[Document], ids: list[str]) -> None:
+        self.documents.extend(documents)
+        self.added.extend(ids)
+
+    def delete(self, ids: list[str]) -> None:
+        self.documents = [d for d in self.documents if d.metadata["chunk_id"] not in ids]
+        self.deleted.extend(ids)
+
+    def update_last_seen_at(self, ids: list[str]) -> None:
+        self.updated.extend(ids)
+
+    def delete_by_item_ids(self, item_ids: list[str]) -> None:
+        self.documents = [d for d in self.documents if d.metadata["item_id"] not in item_ids]
+        self.deleted_item_ids.append(item_ids)
+
+    def count_expired(self, expired_ts: int) -> int | None:  # noqa: ARG002
+        return None
+
+
+class FakeScannableVectorDb(FakeVectorDb):
+    """Database with count and metadata export, used to compare crawled data by a full scan."""
+
+    def count(self) -> int:
+        return len(self.documents)
+
+    def iter_metadata(self, batch_size: int = 2) -> Iterator[list[Document]]:
+        for i in range(0, len(self.documents), batch_size):
+            yield self.documents[i : i + batch_size]
+
+
+def _doc(item_id: str, chunk_id: str, checksum: str) -> Document:
+    return Document(page_content="", metadata={"item_id": item_id, "chunk_id": chunk_id, "checksum": checksum, "last_seen_at": 1})
+
+
+DB_DOCUMENTS = [_doc("a", "a1", "1"), _doc("b", "b1", "1"), _doc("b", "b2", "1"), _doc("c", "c1", "1")]
+
+
+async def test_aget_items_ids_from_db() -> None:
+    db: Any = FakeVectorDb(DB_DOCUMENTS)
+    data = [_doc("a", "x", "1"), _doc("b", "x", "1"), _doc("c", "x", "1"), _doc("a", "y", "1")]
+
+    res = await aget_items_ids_from_db(db, data, concurrency=1)
+
+    assert db.batches == [["a", "b"], ["c"]]
+    assert {k: [d.metadata["chunk_id"] for d in v] for k, v in res.items()} == {"a": ["a1"], "b": ["b1", "b2"], "c": ["c1"]}
+
+
+async def test_acompare_crawled_data_with_db() -> None:
+    db: Any = FakeVectorDb(DB_DOCUMENTS)
+    data = [_doc("a", "a1", "1"), _doc("b", "b3", "2"), _doc("d", "d1", "1")]
+
+    changes = await acompare_crawled_data_with_db(db, data)
+
+    assert [d.metadata["chunk_id"] for d in changes.data_add] == ["b3", "d1"]
+    assert changes.ids_update_last_seen == ["a1"]
+    assert changes.ids_delete == {"b": ["b1", "b2"]}
+
+
+async def test_acompare_crawled_data_with_db_uses_bloom_filter() -> None:
+    db: Any = FakeVectorDb(DB_DOCUMENTS)
+    bloom_filter = ItemIdsBloomFilter()
+    bloom_filter.add_many(["a", "b", "c"])
+    data = [_doc("a", "a1", "1"), _doc("b", "b3", "2"), _doc("d", "d1", "1"), _doc("e", "e1", "1")]
+
+    changes = await acompare_crawled_data_with_db(db, data, bloom_filter=bloom_filter)
+
+    assert [b for b in db.batches if "d" in b or "e" in b] == [], "New item_ids should not be looked up"
+    assert [d.metadata["chunk_id"] for d in changes.data_add] == ["b3", "d1", "e1"]
+    assert changes.ids_update_last_seen == ["a1"]
+    assert changes.ids_delete == {"b": ["b1", "b2"]}
+
+
+def test_should_scan_database() -> None:
+    data = [_doc("a", "a1", "1"), _doc("a", "a2", "1"), _doc("b", "b1", "1")]
+
+    assert should_scan_database(4, data), "Crawled items cover most of the database"
+    assert not should_scan_database(100, data)
+    assert not should_scan_database(100, [])
+
+
+async def test_acompare_crawled_data_with_db_by_scan() -> None:
+    db: Any = FakeScannableVectorDb([*DB_DOCUMENTS, _doc("z", "z1", "1")])
+    data = [_doc("a", "a1", "1"), _doc("b", "b3", "2"), _doc("d", "d1", "1")]
+
+    changes = await acompare_crawled_data_with_db(db, data)
+
+    assert not db.batches, "Item_ids should not be looked up"
+    assert [d.metadata["chunk_id"] for d in changes.data_add] == ["b3", "d1"]
+    assert changes.ids_update_last_seen == ["a1"]
+    assert changes.ids_delete == {"b": ["b1", "b2"]}
+
+
+async def test_aget_bloom_filter_from_db() -> None:
+    db: Any = FakeScannableVectorDb(DB_DOCUMENTS)
+
+    bloom_filter = await aget_bloom_filter_from_db(db)
+
+    assert len(bloom_filter) == 3
+    assert bloom_filter.contains_many(["a", "b", "c"]).all()
+
+
+async def test_aupdate_db_with_crawled_data_without_touch() -> None:
+    db: Any = FakeVectorDb(list(DB_DOCUMENTS))
+
+    await aupdate_db_with_crawled_data(db, [_doc("a", "a1", "1"), _doc("b", "b3", "2")], touch=False)
+
+    assert not db.updated, "Unchanged objects should not be updated"
+    assert db.added == ["b3"]
+    assert sorted(db.deleted) == ["b1", "b2"]
+
+
+async def test_aupdate_db_with_crawled_data_calls_before_write_before_writes() -> None:
+    db: Any = FakeVectorDb(list(DB_DOCUMENTS))
+    written_before: list[list[str]] = []
+
+    async def before_write() -> None:
+        written_before.append(db.added + db.deleted + db.updated)
+
+    await aupdate_db_with_crawled_data(db, [_doc("a", "a1", "1"), _doc("b", "b3", "2")], before_write=before_write)
+
+    assert written_before == [[]], "before_write should be called once before any write"
+    assert db.added == ["b3"]
+
+
+async def test_delete_unseen_items() -> None:
+    db: Any = FakeScannableVectorDb(list(DB_DOCUMENTS))
+    seen_items = SeenItemsStore(FakeKeyValueStore())
+    await seen_items.record(["a"], 0)
+    await seen_items.record(["b"], 2 * DAY_IN_SECONDS)
+
+    # Generations do not cover the period, nothing is deleted
+    await delete_unseen_items(db, seen_items, -DAY_IN_SECONDS)
+    assert not db.deleted_item_ids
+
+    await delete_unseen_items(db, seen_items, DAY_IN_SECONDS)
+    assert db.deleted_item_ids == [["a", "c"]]
+    assert seen_items.generations == [2 * DAY_IN_SECONDS]
+
+
+async def test_aget_items_ids_from_db_raises_on_error() -> None:
+    db: Any = FakeVectorDb(DB_DOCUMENTS, fail_on="c")
+
+    with pytest.raises(RuntimeError, match="lookup failed"):
+        await aget_items_ids_from_db(db, [_doc("a", "x", "1"), _doc("b", "x", "1"), _doc("c", "x", "1")])
+
+
+async def test_aget_items_ids_from_db_timeout() -> None:
+    db: Any = FakeVectorDb(DB_DOCUMENTS, delay=1)
+
+    with pytest.raises(TimeoutError, match="timed out"):
+        await aget_items_ids_from_db(db, [_doc("a", "x", "1")], timeout_secs=0.01)
+
+
+async def test_aupdate_db_with_manifest() -> None:
+    db: Any = FakeVectorDb(list(DB_DOCUMENTS))
+    manifest = DeltaManifest(FakeKeyValueStore())
+    await manifest.load_meta()
+
+    # The first run reconciles the new manifest with the database
+    await aupdate_db_with_manifest(db, [_doc("a", "x1", "1"), _doc("b", "x2", "2")], manifest)
+    assert db.batches == [["a", "b"]]
+    assert db.added == ["x2"]
+    assert sorted(db.deleted) == ["b1", "b2"]
+    assert db.updated == ["a1"]
+    assert await manifest.get("a") == ManifestEntry("1", ["a1"], 1)
+    assert await manifest.get("b") == ManifestEntry("2", ["x2"], 1)
+    assert manifest.reconciled_at
+
+    # The next run uses only the manifest
+    db.batches.clear()
+    db.added.clear()
+    db.deleted.clear()
+    db.updated.clear()
+    await aupdate_db_with_manifest(db, [_doc("a", "y1", "3"), _doc("b", "y2", "2"), _doc("e", "y3", "1")], manifest)
+    assert not db.batches, "Database should not be queried"
+    assert db.added == ["y1", "y3"]
+    assert db.deleted == ["a1"]
+    assert db.updated == ["x2"]
+    assert await manifest.get("a") == ManifestEntry("3", ["y1"], 1)
+    assert await manifest.get("e") == ManifestEntry("1", ["y3"], 1)
+
+
+def test_upsert_db_with_crawled_data_deletes_distinct_item_ids() -> None:
+    db: Any = FakeVectorDb(list(DB_DOCUMENTS))
+    data = [_doc("a", "x1", "2"), _doc("a", "x2", "2"), _doc("b", "x3", "2"), _doc("d", "x4", "1")]
+
+    upsert_db_with_crawled_data(db, data)
+
+    assert sorted(db.deleted_item_ids) == [["a", "b"], ["d"]]
+    assert db.added == ["x1", "x2", "x3", "x4"]
+    assert sorted(d.metadata["chunk_id"] for d in db.documents) == ["c1", "x1", "x2", "x3", "x4"]
+
+
+async def test_migrate_manifest_to_id_prefix() -> None:
+    kv_store = FakeKeyValueStore()
+    manifest = DeltaManifest(kv_store)
+    await manifest.load_meta()
+    await manifest.set("a", ManifestEntry("1", ["a1", "a#a2"], 1))
+    await manifest.set("b", ManifestEntry("1", ["b#b1"], 1))
+    await manifest.save()
+
+    manifest = DeltaManifest(kv_store)
+    await manifest.load_meta()
+    assert await migrate_manifest_to_id_prefix(manifest) == 1
+    manifest = DeltaManifest(kv_store)
+    await manifest.load_meta()
+    assert await manifest.get("a") == ManifestEntry("1", ["a#a1", "a#a2"], 1)
+    assert await manifest.get("b") == ManifestEntry("1", ["b#b1"], 1)
+    assert await migrate_manifest_to_id_prefix(manifest) == 0, "Migrated entries should be skipped"
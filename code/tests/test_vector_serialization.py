@@ -0,0 +1,65 @@
+"""Vectors of OpenAIBase64Embeddings are float32 NumPy arrays, the client of each database must serialise them as float vectors."""
+
+from __future__ import annotations
+
+import base64
+import json
+import struct
+
+import numpy as np
+from chromadb.api.types import normalize_embeddings, validate_embeddings
+from opensearchpy.serializer import JSONSerializer
+from pgvector.sqlalchemy import Vector  # type: ignore
+from pinecone.data.vector_factory import VectorFactory  # type: ignore
+from pymilvus import DataType  # type: ignore
+from pymilvus.client.prepare import Prepare  # type: ignore
+from qdrant_client.http.models import PointStruct
+from sqlalchemy.dialects import postgresql
+from weaviate.collections.grpc.shared import _is_1d_vector, _Pack
+
+from src.emb import decode_base64_embedding
+
+VALUES = [0.5, -1.0, 2.0]
+
+
+def _vector() -> np.ndarray:
+    """Return a read-only float32 view over bytes, the same as decoded base64 embeddings."""
+    return decode_base64_embedding(base64.b64encode(np.asarray(VALUES, dtype="<f4").tobytes()).decode())
+
+
+def test_qdrant_point_vector() -> None:
+    point = PointStruct(id=1, vector=_vector(), payload={})  # type: ignore[arg-type]
+    assert json.loads(point.model_dump_json())["vector"] == VALUES
+
+
+def test_pinecone_upsert_vector() -> None:
+    assert VectorFactory.build(("a", _vector(), {}))["values"] == VALUES
+
+
+def test_milvus_insert_vector() -> None:
+    fields_info = [
+        {"name": "pk", "type": DataType.VARCHAR, "is_primary": True, "auto_id": False, "params": {"max_length": 64}},
+        {"name": "vector", "type": DataType.FLOAT_VECTOR, "params": {"dim": len(VALUES)}},
+    ]
+    request = Prepare.row_insert_param("c", [{"pk": "a", "vector": _vector()}], "", fields_info)
+    field = next(f for f in request.fields_data if f.field_name == "vector")
+    assert list(field.vectors.float_vector.data) == VALUES
+
+
+def test_weaviate_batch_vector() -> None:
+    assert _is_1d_vector(_vector())
+    assert _Pack.single(_vector()) == struct.pack("<3f", *VALUES)  # type: ignore[arg-type]
+
+
+def test_pgvector_bind_vector() -> None:
+    bind = Vector(len(VALUES)).bind_processor(postgresql.psycopg.dialect())  # type: ignore[no-untyped-call]
+    assert bind(_vector()) == "[0.5,-1.0,2.0]"
+
+
+def test_opensearch_bulk_vector() -> None:
+    assert json.loads(JSONSerializer().dumps({"vector_field": _vector()}))["vector_field"] == VALUES
+
+
+def test_chroma_upsert_vectors() -> None:
+    embeddings = validate_embeddings(normalize_embeddings([_vector(), _vector()]))  # type: ignore[arg-type]
+    assert [e.tolist() for e in embeddings] == [VALUES, VALUES]
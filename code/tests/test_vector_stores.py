@@ -2,17 +2,19 @@ from __future__ import annotations
 
 import time
 from datetime import datetime, timezone
+from types import SimpleNamespace
 from typing import TYPE_CHECKING
 
 import pytest
+from langchain_core.documents import Document
 
 from src.vcs import compare_crawled_data_with_db, delete_expired_objects, update_db_with_crawled_data
+from src.vector_stores.base import VectorDbBase
 
 from .conftest import DATABASE_FIXTURES, ID1, ID3, ID4A, ID4B, ID4C, ID5A, ID5B, ID5C, ID6, ITEM_ID1, ITEM_ID4
 
 if TYPE_CHECKING:
     from _pytest.fixtures import FixtureRequest
-    from langchain_core.documents import Document
 
     from src._types import VectorDb
 
@@ -92,6 +94,69 @@ def test_get_by_item_id(input_db: str, request: FixtureRequest) -> None:
     assert not res, "Expected [] to be returned"
 
 
+@pytest.mark.integration()
+@pytest.mark.parametrize("input_db", DATABASE_FIXTURES)
+def test_get_by_item_ids(input_db: str, request: FixtureRequest) -> None:
+    db: VectorDb = request.getfixturevalue(input_db)
+
+    res = db.get_by_item_ids([ITEM_ID1, ITEM_ID4, "idX"])
+
+    ids = [r.metadata["chunk_id"] for r in res]
+    assert len(res) == 3, "Expected 3 objects to be returned"
+    assert get_expected_id(db, "id1", ID1) in ids
+    assert get_expected_id(db, "id4", ID4A) in ids
+    assert get_expected_id(db, "id4", ID4B) in ids
+
+    res = db.get_by_item_ids(["idX", ""])
+    assert not res, "Expected [] to be returned"
+
+
+def test_get_by_item_ids_within_limit() -> None:
+    chunks = {"a": 2, "b": 1, "c": 2, "d": 1}
+    calls: list[list[str]] = []
+
+    def _get(item_ids: list[str]) -> list[Document]:
+        calls.append(item_ids)
+        docs = [Document(page_content="", metadata={"item_id": i}) for i in item_ids for _ in range(chunks[i])]
+        return docs[:4]
+
+    res = VectorDbBase.get_by_item_ids_within_limit(list(chunks), _get, limit=4)
+
+    assert sorted(r.metadata["item_id"] for r in res) == ["a", "a", "b", "c", "c", "d"]
+    assert calls == [["a", "b", "c", "d"], ["a", "b"], ["c", "d"]]
+
+
+def test_run_concurrently() -> None:
+    db = SimpleNamespace(touch_concurrency=4)
+    done: list[int] = []
+
+    VectorDbBase.run_concurrently(db, done.append, list(range(10)))  # type: ignore[arg-type]
+    assert sorted(done) == list(range(10))
+    assert VectorDbBase.run_concurrently(db, lambda i: i * 2, list(range(10)), max_workers=3) == [i * 2 for i in range(10)]  # type: ignore[arg-type]
+
+    def _fail(i: int) -> None:
+        if i == 3:
+            raise RuntimeError("update failed")
+
+    with pytest.raises(RuntimeError, match="update failed"):
+        VectorDbBase.run_concurrently(db, _fail, list(range(10)))  # type: ignore[arg-type]
+
+
+@pytest.mark.integration()
+@pytest.mark.parametrize("input_db", DATABASE_FIXTURES)
+def test_count_and_iter_metadata(input_db: str, request: FixtureRequest) -> None:
+    db: VectorDb = request.getfixturevalue(input_db)
+
+    assert db.count() == 6, "Expected 6 initial objects in the database"
+
+    batches = list(db.iter_metadata(batch_size=4))
+    documents = [d for b in batches for d in b]
+    assert len(documents) == 6, "Expected metadata of all 6 objects"
+    assert all(len(b) <= 4 for b in batches)
+    assert {d.metadata["item_id"] for d in documents} == {ITEM_ID1, "id2", "id3", ITEM_ID4, "id5"}
+    assert all(d.metadata.get("checksum") for d in documents)
+
+
 @pytest.mark.integration()
 @pytest.mark.parametrize("input_db", DATABASE_FIXTURES)
 def test_update_metadata_last_seen_at(input_db: str, crawl_2: list[Document], request: FixtureRequest) -> None:
@@ -251,3 +316,19 @@ def test_delete_by_item_id(input_db: str, request: FixtureRequest) -> None:
     wait_for_db(db.unit_test_wait_for_index)
     res = db.get_by_item_id("idX")
     assert not res, "Expected None to be returned"
+
+
+@pytest.mark.integration()
+@pytest.mark.parametrize("input_db", DATABASE_FIXTURES)
+def test_delete_by_item_ids(input_db: str, request: FixtureRequest) -> None:
+    db: VectorDb = request.getfixturevalue(input_db)
+
+    res = db.search_by_vector(db.dummy_vector, k=10)
+    assert len(res) == 6, "Expected 6 initial objects in the database"
+
+    db.delete_by_item_ids([ITEM_ID1, ITEM_ID4, "idX"])
+    wait_for_db(db.unit_test_wait_for_index)
+
+    assert not db.get_by_item_ids([ITEM_ID1, ITEM_ID4]), "Expected None to be returned"
+    res = db.search_by_vector(db.dummy_vector, k=10)
+    assert len(res) == 3, "Expected 3 objects in the database after deletion"